@@ -1,5 +1,13 @@
 import os
-from openai import OpenAI
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
 import psycopg2
@@ -7,23 +15,281 @@ from urllib.parse import urlparse
 
 
 #load_dotenv("venv/.env") # Loads environment variables from .env
-token = os.getenv("GITHUB_TOKEN")
-endpoint = "https://models.github.ai/inference"
-model="openai/gpt-4o"
+token = os.getenv("LLM_API_KEY") or os.getenv("GITHUB_TOKEN")
+# LLM_ENDPOINT can point at any OpenAI-compatible server (e.g. a local stub)
+endpoint = os.getenv("LLM_ENDPOINT", "https://models.github.ai/inference")
+model = os.getenv("LLM_MODEL", "openai/gpt-4o")
+
+# Max completions in flight per process; further callers wait up to
+# LLM_QUEUE_TIMEOUT seconds for a free slot before LLMBusyError is raised
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 60))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 120))
+
+# Response cache: in-process LRU, plus Redis when LLM_CACHE_REDIS_URL is set.
+# TTLs (seconds) per calling endpoint; override with LLM_CACHE_TTL_<NAME>.
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512))
+CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL")
+CACHE_TTLS = {
+    "default": 3600,
+    "ppt_outline": 24 * 3600,
+    "mindmap": 24 * 3600,
+    "grade_analysis": 6 * 3600,
+}
+for _name in CACHE_TTLS:
+    CACHE_TTLS[_name] = int(os.getenv(f"LLM_CACHE_TTL_{_name.upper()}", CACHE_TTLS[_name]))
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_async_slots = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+
+class LLMBusyError(RuntimeError):
+    """Raised when no LLM slot frees up within QUEUE_TIMEOUT seconds."""
+
+
+class LLMResponseCache:
+    """Content-addressed cache of completions keyed by model, messages and sampling parameters.
+
+    Lookups hit the in-process LRU first, then Redis (if configured); Redis
+    hits are copied into the LRU. Entries expire after the TTL of the
+    endpoint that stored them.
+    """
+
+    def __init__(self, max_entries=512, redis_url=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+            except Exception as e:
+                print(f"LLM cache: Redis tier disabled ({e})")
+        self._stats = {}
+
+    @staticmethod
+    def make_key(model, messages, temperature, top_p):
+        """Hash everything that determines the completion into a cache key."""
+        payload = json.dumps(
+            {"model": model, "messages": messages, "temperature": temperature, "top_p": top_p},
+            sort_keys=True, ensure_ascii=False
+        )
+        return "llm:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, endpoint, field):
+        counters = self._stats.setdefault(endpoint, {"hits": 0, "redis_hits": 0, "misses": 0, "bypassed": 0})
+        counters[field] += 1
+
+    def get(self, key, endpoint="default"):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._count(endpoint, "hits")
+                return entry[1]
+            if entry:
+                del self._entries[key]
+
+        if self._redis is not None:
+            try:
+                value = self._redis.get(key)
+                ttl = self._redis.ttl(key) if value is not None else -1
+            except Exception:
+                value = None
+            if value is not None:
+                self._store_local(key, value, max(ttl, 1))
+                with self._lock:
+                    self._count(endpoint, "redis_hits")
+                return value
+
+        with self._lock:
+            self._count(endpoint, "misses")
+        return None
+
+    def set(self, key, value, ttl):
+        self._store_local(key, value, ttl)
+        if self._redis is not None:
+            try:
+                self._redis.setex(key, ttl, value)
+            except Exception as e:
+                print(f"LLM cache: Redis write failed ({e})")
+
+    def record_bypass(self, endpoint="default"):
+        with self._lock:
+            self._count(endpoint, "bypassed")
+
+    def _store_local(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            endpoints = {name: dict(counters) for name, counters in self._stats.items()}
+            size = len(self._entries)
+        for counters in endpoints.values():
+            lookups = counters["hits"] + counters["redis_hits"] + counters["misses"]
+            counters["hit_ratio"] = round((counters["hits"] + counters["redis_hits"]) / lookups, 4) if lookups else 0.0
+        return {"entries": size, "max_entries": self.max_entries, "redis": self._redis is not None, "endpoints": endpoints}
+
+
+response_cache = LLMResponseCache(CACHE_MAX_ENTRIES, CACHE_REDIS_URL)
+
+
+def get_client():
+    """Return the process-wide OpenAI client, reusing its HTTP connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(base_url=endpoint, api_key=token, timeout=REQUEST_TIMEOUT)
+    return _client
+
+
+def get_async_client():
+    """Return the process-wide AsyncOpenAI client."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncOpenAI(base_url=endpoint, api_key=token, timeout=REQUEST_TIMEOUT)
+    return _async_client
+
+
+@contextmanager
+def _llm_slot():
+    """Hold one of the MAX_CONCURRENCY slots for the duration of a call."""
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        raise LLMBusyError(f"LLM is busy: no free slot within {QUEUE_TIMEOUT:.0f}s.")
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+@asynccontextmanager
+async def _async_llm_slot():
+    """asyncio counterpart of _llm_slot, with one semaphore per event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _async_slots.get(loop)
+    if semaphore is None:
+        semaphore = _async_slots[loop] = asyncio.Semaphore(MAX_CONCURRENCY)
+    try:
+        await asyncio.wait_for(semaphore.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise LLMBusyError(f"LLM is busy: no free slot within {QUEUE_TIMEOUT:.0f}s.")
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
 # A function to call an LLM model and return the response
-def call_llm_model(model, messages, temperature=1.0, top_p=1.0):
-    client = OpenAI(base_url=endpoint,api_key=token)
-    response = client.chat.completions.create(
-    messages=messages,
-    temperature=temperature, top_p=top_p, model=model)
+def call_llm_model(model, messages, temperature=1.0, top_p=1.0, cache_endpoint=None, bypass_cache=False):
+    """Return the completion for messages.
+
+    When cache_endpoint names an entry of CACHE_TTLS the response is served
+    from / stored in response_cache with that endpoint's TTL; bypass_cache
+    forces a fresh completion (which then replaces the cached one).
+    """
+    key = None
+    if cache_endpoint:
+        key = LLMResponseCache.make_key(model, messages, temperature, top_p)
+        if bypass_cache:
+            response_cache.record_bypass(cache_endpoint)
+        else:
+            cached = response_cache.get(key, cache_endpoint)
+            if cached is not None:
+                return cached
+
+    with _llm_slot():
+        response = get_client().chat.completions.create(
+            messages=messages,
+            temperature=temperature, top_p=top_p, model=model)
+    content = response.choices[0].message.content
+
+    if key and content is not None:
+        response_cache.set(key, content, CACHE_TTLS.get(cache_endpoint, CACHE_TTLS["default"]))
+    return content
+
+
+def stream_llm_model(model, messages, temperature=1.0, top_p=1.0):
+    """Yield the completion text chunk by chunk as the model produces it.
+
+    The concurrency slot is held until the stream is exhausted or the
+    generator is closed (e.g. the HTTP client disconnected), which also
+    closes the upstream connection.
+    """
+    with _llm_slot():
+        stream = get_client().chat.completions.create(
+            messages=messages,
+            temperature=temperature, top_p=top_p, model=model, stream=True)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+
+async def async_call_llm_model(model, messages, temperature=1.0, top_p=1.0):
+    """Async variant of call_llm_model for use inside an event loop."""
+    async with _async_llm_slot():
+        response = await get_async_client().chat.completions.create(
+            messages=messages,
+            temperature=temperature, top_p=top_p, model=model)
     return response.choices[0].message.content
+
+
+async def async_stream_llm_model(model, messages, temperature=1.0, top_p=1.0):
+    """Async variant of stream_llm_model."""
+    async with _async_llm_slot():
+        stream = await get_async_client().chat.completions.create(
+            messages=messages,
+            temperature=temperature, top_p=top_p, model=model, stream=True)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+
 # A function to translate to target language
-def ai_assistant(text):
+def ai_assistant(text, cache_endpoint=None, bypass_cache=False):
     prompt = f"{text}"
     messages = [
         {"role": "user", "content": prompt}
     ]
-    return call_llm_model(model, messages)
+    return call_llm_model(model, messages, cache_endpoint=cache_endpoint, bypass_cache=bypass_cache)
+
+
+def ai_assistant_stream(text):
+    """Streaming variant of ai_assistant: yields the reply in chunks."""
+    messages = [
+        {"role": "user", "content": f"{text}"}
+    ]
+    return stream_llm_model(model, messages)
+
+
+async def async_ai_assistant(text):
+    """Async variant of ai_assistant."""
+    messages = [
+        {"role": "user", "content": f"{text}"}
+    ]
+    return await async_call_llm_model(model, messages)
+
+
+def llm_cache_stats():
+    """Hit/miss counters of the response cache, per endpoint."""
+    return response_cache.stats()
 
 
 #main function
@@ -34,5 +300,8 @@ if __name__ == "__main__":
     answer = ai_assistant(text)
     print(f"Question Text: {text}")
     print(f"Answer Text: {answer}")
-    
-    
\ No newline at end of file
+
+    print("=== Testing Streaming ===")
+    for piece in ai_assistant_stream(text):
+        print(piece, end="", flush=True)
+    print()
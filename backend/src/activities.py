@@ -1,11 +1,18 @@
-import os
-import random
-import string
 import json
+import base64
+from datetime import datetime
 from flask import Flask, request, jsonify, url_for
 from flask_cors import CORS
 from src.db_connection import get_connection,release_connection
-from src.generate_qr_code import generate_qr_code
+from src.generate_qr_code import qr_code_url
+from src.activity_index import build_page_query, build_count_query, ACTIVITY_TYPES
+from src.bulk_write import insert_rows, transaction
+from src.id_generator import public_id
+from src.submission_buffer import answer_buffer, ANSWER_COLUMNS, ANSWER_ROW_TEMPLATE
+from src.grading_jobs import create_job, get_job, run_job, submit_job_run
+from src.leaderboard import DEFAULT_RANKING, RANKING_METHODS
+from src.live_leaderboard import live_leaderboard
+from src.live_events import publish_submission
 
 app = Flask(__name__)
 
@@ -13,8 +20,38 @@ app = Flask(__name__)
 CORS(app)
 
 def generate_activity_id():
-    """Generate a unique activity ID."""
-    return ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+    """Generate a unique, time-ordered activity ID that cannot be guessed from another one."""
+    return public_id()
+
+def _question_row(classroom_quiz_id, q):
+    """Build the questions table row for one question of a classroom quiz."""
+    question_id = q.get('id')
+    question_text = q.get('text')
+    question_type = q.get('type')
+    options = q.get('options')  # 可能为 None（如简答题）
+    true_answer = q.get('correctAnswer')  # 新增字段
+    points = q.get('points', 0)  # 默认值为 0
+
+    # 如果 options 是列表，转为 JSON 字符串存入（或直接存 list，根据你的字段类型）
+    options_json = None
+    if options and isinstance(options, list):
+        options_json = json.dumps(options)  # 或者用 json.dumps(options) 更规范
+
+    # Validate and convert true_answer to JSON if necessary
+    true_answer_json = None
+    if true_answer is not None:
+        if isinstance(true_answer, (dict, list)):
+            true_answer_json = json.dumps(true_answer)
+        elif isinstance(true_answer, str):
+            try:
+                # Attempt to parse the string as JSON
+                json.loads(true_answer)
+                true_answer_json = true_answer
+            except json.JSONDecodeError:
+                # If parsing fails, treat it as a plain string
+                true_answer_json = json.dumps(true_answer)
+
+    return (classroom_quiz_id, question_id, question_text, question_type, options_json, true_answer_json, points)
 
 @app.route('/api/classroom_quiz', methods=['POST', 'OPTIONS'])
 def create_activity():
@@ -34,65 +71,41 @@ def create_activity():
     uid = data.get('uid', '1')  # Default to '1' if not provided
 
     questions_data = data.get('questions', [])  # List of questions with their details
+    connection = None
     try:
         # Save the activity details to the database
         connection = get_connection()
         if connection:
-            with connection.cursor() as cursor:
+            with connection.cursor() as cursor, transaction(connection):
                 query = "INSERT INTO class_quizzes (quiz_id, title, type, activity_type, uid) VALUES (%s, %s, %s, %s, %s)"
-                query2 = "INSERT INTO questions (quiz_id, question_id, question_text, question_type, options, true_answer, points) VALUES (%s, %s, %s, %s, %s, %s, %s)"
                 cursor.execute(query, (classroom_quiz_id, title, classroom_quiz_type, classroom_quiz_category, uid))
 
-
-                for q in questions_data:
-                    question_id = q.get('id')
-                    question_text = q.get('text')
-                    question_type = q.get('type')
-                    options = q.get('options')  # 可能为 None（如简答题）
-                    true_answer = q.get('correctAnswer')  # 新增字段
-                    points = q.get('points', 0)  # 默认值为 0
-
-                    # 如果 options 是列表，转为 JSON 字符串存入（或直接存 list，根据你的字段类型）
-                    options_json = None
-                    if options and isinstance(options, list):
-                        options_json = json.dumps(options)  # 或者用 json.dumps(options) 更规范
-
-                    # Validate and convert true_answer to JSON if necessary
-                    true_answer_json = None
-                    if true_answer is not None:
-                        if isinstance(true_answer, (dict, list)):
-                            true_answer_json = json.dumps(true_answer)
-                        elif isinstance(true_answer, str):
-                            try:
-                                # Attempt to parse the string as JSON
-                                json.loads(true_answer)
-                                true_answer_json = true_answer
-                            except json.JSONDecodeError:
-                                # If parsing fails, treat it as a plain string
-                                true_answer_json = json.dumps(true_answer)
-
-                    cursor.execute(query2, (classroom_quiz_id, question_id, question_text, question_type, options_json, true_answer_json, points))
+                # Insert every question with one multi-row INSERT
+                insert_rows(
+                    cursor, "questions",
+                    ["quiz_id", "question_id", "question_text", "question_type", "options", "true_answer", "points"],
+                    [_question_row(classroom_quiz_id, q) for q in questions_data]
+                )
                 
                 # Update user_logs table
-                from datetime import datetime
                 query3 = """
                 INSERT INTO user_logs (uid, manipulate, quiz_id, upload_time)
                 VALUES (%s, %s, %s, %s)
                 """
                 cursor.execute(query3, (uid, 'create_activity', classroom_quiz_id, datetime.now()))
-                
-                connection.commit()
 
         # Generate the activity link
         activity_url = url_for('view_activity', activity_id=classroom_quiz_id, _external=True)
 
-        # Generate a QR code for the activity link
-        qr_code_path = os.path.join('static', f'{classroom_quiz_id}.png')
-        generate_qr_code(activity_url, qr_code_path)
+        # QR code is served (and cached) by /api/qr, rendered off the request path
+        qr_code_path = qr_code_url(activity_url)
 
         return jsonify({"success": True, "activity_id": classroom_quiz_id, "activity_url": activity_url, "qr_code": qr_code_path}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if connection:
+            release_connection(connection)
 
 @app.route('/api/classroom_quiz/<classroom_quiz_id>', methods=['GET'])
 def view_activity(classroom_quiz_id):
@@ -223,6 +236,9 @@ def delete_activity(classroom_quiz_id):
             #cursor.execute(query, (uid, 'delete_activity', classroom_quiz_id, datetime.now()))
             
             connection.commit()
+
+        if live_leaderboard:
+            live_leaderboard.invalidate(classroom_quiz_id)
         
         return jsonify({"message": "Activity deleted successfully.", "classroom_quiz_id": classroom_quiz_id}), 200
         
@@ -235,157 +251,78 @@ def delete_activity(classroom_quiz_id):
 @app.route('/api/classroom_quiz/<classroom_quiz_id>/grade', methods=['POST'])
 
 def grade_activity(classroom_quiz_id):
-    """Endpoint to grade user answers and store results."""
-    from LLM import ai_assistant
+    """Endpoint to grade user answers and store results.
+
+    Grading runs as a job (see src.grading_jobs). By default the request
+    waits for it and returns the leaderboard; with ?async=1 it returns 202
+    with a jobId to poll at /api/grading_jobs/<job_id>. ?ranking=dense ranks
+    ties 1, 2, 2, 3 instead of the default 1, 2, 2, 4.
+    """
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        connection = get_connection()
-        if not connection:
-            return jsonify({"error": "Database connection failed."}), 500
-        
-        with connection.cursor() as cursor:
-            # Get all answers with their corresponding questions for this quiz
-            cursor.execute("""
-                SELECT a.student_name, a.question_id, a.answer_content, a.question_type, 
-                       q.true_answer, q.points, q.question_text
-                FROM answers a
-                JOIN questions q ON a.quiz_id = q.quiz_id AND a.question_id = q.question_id
-                WHERE a.quiz_id = %s
-                ORDER BY a.student_name, a.question_id
-            """, (classroom_quiz_id,))
-            
-            all_answers = cursor.fetchall()
-            
-            if not all_answers:
-                return jsonify({"error": "No answers found for this quiz."}), 404
-            
-            # Group answers by user
-            user_results = {}
-            
-            for answer_row in all_answers:
-                uid = answer_row[0]
-                question_id = answer_row[1]
-                
-                user_answer = answer_row[2]
-                question_type = answer_row[3]
-                true_answer = answer_row[4]
-                points = answer_row[5]
-                question_text = answer_row[6]
-                
-                # Initialize user if not exists
-                if uid not in user_results:
-                    user_results[uid] = 0
-                
-                # Check answer based on question type
-                is_correct = False
-                
-                # Check answer based on question type
-                normalized_question_type = question_type.lower()
-
-                if normalized_question_type in ['true/false', 'multiplechoice', 'single choice', 'multiple choice']:
-                    # Direct comparison for true/false and multiple choice
-                    #true_answer_list = json.loads(true_answer)  # 例如：["0"]
-                    print(f"[DEBUG] user_answer = {user_answer}, type = {type(user_answer)}")
-                    print(f"[DEBUG] true_answer = {true_answer}, type = {type(true_answer)}")
-        # 2. 判断用户答案（字符串）是否在正确答案列表中
-                    #is_correct = str(user_answer).strip() in [str(x).strip() for x in true_answer_list]
-                    is_correct = (str(user_answer).strip().lower() == str(true_answer).strip().lower().strip("[]"))
-                    print (str(user_answer).strip().lower(), str(true_answer).strip().lower().strip("[]"))
-                    print(f"[DEBUG] is_correct = {is_correct}")
-                    if is_correct:
-                        user_results[uid] += int(points)
-                elif normalized_question_type in ['shortanswer', 'short answer', 'text']:
-                    # Combine all short answer questions for AI evaluation
-                    combined_prompt = ""
-                    for answer_row in all_answers:
-                        combined_prompt += f"题目是{answer_row[6]},学生作答{answer_row[2]}\n"
-                    combined_prompt += "请判断每个学生的答案是否正确，并返回一个JSON数组，每个元素包含学生ID、问题ID和是否正确（true/false）。"
-
-                    # Use AI to evaluate all answers at once
-                    ai_response = ai_assistant(combined_prompt).strip()
-                    try:
-                        evaluation_results = json.loads(ai_response)  # Parse AI response
-                        for result in evaluation_results:
-                            student_id = result['student_id']
-                            question_id = result['question_id']
-                            is_correct = result['is_correct']
-
-                            if is_correct:
-                                user_results[student_id] += int(points)
-                    except json.JSONDecodeError:
-                        print("AI response parsing failed:", ai_response)
-                
-                if is_correct:
-                    user_results[uid] += int(points)
-            
-            # Store results in class_room_result table
-            results = []
-            rank = 1
-
-            # Sort user_results by total_points in descending order
-            sorted_results = sorted(user_results.items(), key=lambda x: x[1], reverse=True)
-
-            #for student_name, total_points in sorted_results:
-            #    cursor.execute("""
-            #        INSERT INTO class_room_quiz_result (student_name, quiz_id, true_number)
-            #        VALUES (%s, %s, %s)
-            #        ON DUPLICATE KEY UPDATE true_number = %s
-            #    """, (student_name, classroom_quiz_id, total_points, total_points))
-#
-            #    results.append({
-            #        "student_name": student_name,
-            #        "score": total_points,
-            #        "rank": rank
-            #    })
-            #    rank += 1
-
-            # Calculate the percentage score for each student
-            for student_name, total_points in sorted_results:
-                # Fetch the total possible points for the quiz
-                cursor.execute("SELECT SUM(points) FROM questions WHERE quiz_id = %s", (classroom_quiz_id,))
-                max_points = cursor.fetchone()[0] or 0
-
-                if max_points > 0:
-                    percentage_score = f"{total_points}/{max_points} ({(total_points / max_points) * 100:.2f}%)"
-                else:
-                    percentage_score = "0/0 (0.00%)"
-
-                # Store the result in the database
-                cursor.execute(
-                    """
-                    INSERT INTO class_room_quiz_result (student_name, quiz_id, true_number, percentage_score)
-                    VALUES (%s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE true_number = %s, percentage_score = %s
-                    """,
-                    (student_name, classroom_quiz_id, total_points, percentage_score, total_points, percentage_score)
-                )
+        ranking = request.args.get('ranking', DEFAULT_RANKING)
+        if ranking not in RANKING_METHODS:
+            return jsonify({"error": f"ranking must be one of {', '.join(RANKING_METHODS)}."}), 400
 
-                results.append({
-                    "student_name": student_name,
-                    "score": total_points,
-                    "percentage": percentage_score,
-                    "rank": rank
-                })
-                rank += 1
+        job_id, created = create_job(classroom_quiz_id)
+        status_url = f"/api/grading_jobs/{job_id}"
+
+        if request.args.get('async') == '1' or not created:
+            # 后台评分；已有进行中的任务时直接返回该任务
+            if created:
+                submit_job_run(classroom_quiz_id, job_id, ranking)
+            return jsonify({"jobId": job_id, "status": "queued" if created else "running", "statusUrl": status_url}), 202
+
+        leaderboard = run_job(classroom_quiz_id, job_id, ranking)
+        if leaderboard is None:
+            return jsonify({"error": "No answers found for this quiz."}), 404
+
+        # Return leaderboard in the specified format
+        return jsonify({"leaderboard": leaderboard, "jobId": job_id}), 200
 
-            connection.commit()
-            
-            # Return leaderboard in the specified format
-            return jsonify({"leaderboard": results}), 200
-            
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if connection:
-            release_connection(connection)
+
+@app.route('/api/grading_jobs/<job_id>', methods=['GET'])
+def get_grading_job(job_id):
+    """Endpoint to read the status and progress of a grading job."""
+    try:
+        job = get_job(job_id)
+        if not job:
+            return jsonify({"error": "Grading job not found."}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
 
 
+def _encode_keyset_cursor(timestamp, item_id):
+    """Encode a (timestamp, id) keyset position as an opaque cursor."""
+    raw = json.dumps([timestamp.isoformat() if timestamp else None, item_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_keyset_cursor(cursor_value):
+    """Decode a cursor produced by _encode_keyset_cursor, raising ValueError if malformed."""
+    try:
+        timestamp, item_id = json.loads(base64.urlsafe_b64decode(cursor_value.encode('ascii')))
+        return (datetime.fromisoformat(timestamp) if timestamp else None), item_id
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
 
 @app.route('/api/all_activities', methods=['GET'])
 def get_all_activities():
-    """Endpoint to get all activities from multiple tables with pagination and search."""
+    """Endpoint to get all activities from multiple tables with pagination and search.
+
+    Sorting, searching and pagination run in the database through one
+    UNION ALL query over the activity tables (see src/activity_index.py).
+    Besides page/limit, an opaque cursor (returned as pagination.nextCursor)
+    can be passed for keyset pagination.
+    """
+    connection = None
     try:
         # Get query parameters
         uid = request.args.get('uid')
@@ -393,9 +330,12 @@ def get_all_activities():
         limit = int(request.args.get('limit', 20))
         activity_type = request.args.get('type', '')
         search_keyword = request.args.get('search', '')
+        cursor_value = request.args.get('cursor')
         
         if not uid:
             return jsonify({"error": "Missing required parameter: uid"}), 400
+        if activity_type and activity_type not in ACTIVITY_TYPES:
+            return jsonify({"success": False, "error": f"Invalid type. Expected one of: {', '.join(ACTIVITY_TYPES)}"}), 400
         
         if page < 1:
             page = 1
@@ -403,152 +343,43 @@ def get_all_activities():
             limit = 20
         
         offset = (page - 1) * limit
+
+        cursor_position = None
+        if cursor_value:
+            try:
+                cursor_position = _decode_keyset_cursor(cursor_value)
+            except ValueError as ve:
+                return jsonify({"success": False, "error": str(ve)}), 400
+            offset = 0
         
         connection = get_connection()
         if not connection:
             return jsonify({"error": "Database connection failed."}), 500
         
-        all_activities = []
-        
         with connection.cursor() as cursor:
-            # Query class_quizzes table
-            if not activity_type or activity_type == 'quiz':
-                query = """
-                    SELECT quiz_id as id, title, 'quiz' as activityType, created_at
-                    FROM class_quizzes
-                    WHERE uid = %s
-                """
-                params = [uid]
-                
-                if search_keyword:
-                    query += " AND title LIKE %s"
-                    params.append(f"%{search_keyword}%")
-                
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                for row in results:
-                    all_activities.append({
-                        "id": row[0],
-                        "title": row[1],
-                        "activityType": row[2],
-                        "edited": int(row[3].timestamp() * 1000) if row[3] else None,
-                        "questions": [],  # 默认空列表
-                        "timerMinutes": 0,  # 默认值
-                        "timerSeconds": 0  # 默认值
-                    })
-            
-            # Query openend_question_list table
-            if not activity_type or activity_type == 'openend':
-                query = """
-                    SELECT share_id as id, title, 'openend' as activityType, created_at
-                    FROM openend_question_list
-                    WHERE uid = %s
-                """
-                params = [uid]
-                
-                if search_keyword:
-                    query += " AND title LIKE %s"
-                    params.append(f"%{search_keyword}%")
-                
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                for row in results:
-                    all_activities.append({
-                        "id": row[0],
-                        "title": row[1],
-                        "activityType": row[2],
-                        "edited": int(row[3].timestamp() * 1000) if row[3] else None,
-                        "questions": [],  # 默认空列表
-                        "timerMinutes": 0,  # 默认值
-                        "timerSeconds": 0  # 默认值
-                    })
-            
-            # Query other tables (poll, mindmap, scale) similarly...
-        
+            query, params = build_page_query(uid, activity_type, search_keyword, limit, offset, cursor_position)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+            query, params = build_count_query(uid, activity_type, search_keyword)
+            cursor.execute(query, params)
+            total_count = int(cursor.fetchone()[0] or 0)
+
+        paginated_activities = [
+            {
+                "id": row[0],
+                "title": row[1],
+                "activityType": row[2],
+                "edited": int(row[3].timestamp() * 1000) if row[3] else None,
+                "questions": [],  # 默认空列表
+                "timerMinutes": 0,  # 默认值
+                "timerSeconds": 0  # 默认值
+            }
+            for row in rows
+        ]
 
-            if not activity_type or activity_type == 'poll':
-                query = """
-                    SELECT poll_id as id, title, 'poll' as activityType, created_at
-                    FROM student_poll
-                    WHERE uid = %s
-                """
-                params = [uid]
-                
-                if search_keyword:
-                    query += " AND title LIKE %s"
-                    params.append(f"%{search_keyword}%")
-                
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                for row in results:
-                    all_activities.append({
-                        "id": row[0],
-                        "title": row[1],
-                        "activityType": row[2],
-                        "edited": int(row[3].timestamp() * 1000) if row[3] else None,
-                        "questions": [],  # 默认空列表
-                        "timerMinutes": 0,  # 默认值
-                        "timerSeconds": 0  # 默认值
-                    })
-
-            if not activity_type or activity_type == 'mindmap':
-                query = """
-                    SELECT mind_map_id as id, title, 'mindmap' as activityType, updated_time
-                    FROM mind_map_result
-                    WHERE uid = %s
-                """
-                params = [uid]
-                
-                if search_keyword:
-                    query += " AND title LIKE %s"
-                    params.append(f"%{search_keyword}%")
-                
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                for row in results:
-                    all_activities.append({
-                        "id": row[0],
-                        "title": row[1],
-                        "activityType": row[2],
-                        "edited": int(row[3].timestamp() * 1000) if row[3] else None,
-                        "questions": [],  # 默认空列表
-                        "timerMinutes": 0,  # 默认值
-                        "timerSeconds": 0  # 默认值
-                    })
-
-            if not activity_type or activity_type == 'scale':
-                query = """
-                    SELECT scale_id as id, title, 'scale' as activityType, created_time
-                    FROM scale
-                    WHERE uid = %s
-                """
-                params = [uid]
-                
-                if search_keyword:
-                    query += " AND title LIKE %s"
-                    params.append(f"%{search_keyword}%")
-                
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                for row in results:
-                    all_activities.append({
-                        "id": row[0],
-                        "title": row[1],
-                        "activityType": row[2],
-                        "edited": int(row[3].timestamp() * 1000) if row[3] else None,
-                        "questions": [],  # 默认空列表
-                        "timerMinutes": 0,  # 默认值
-                        "timerSeconds": 0  # 默认值
-                    })
-        # Sort by edited (newest first)
-        all_activities.sort(key=lambda x: x['edited'] or 0, reverse=True)
-        
-        # Calculate total count and pagination
-        total_count = len(all_activities)
         total_pages = (total_count + limit - 1) // limit
-        
-        # Apply pagination
-        paginated_activities = all_activities[offset:offset + limit]
+        next_cursor = _encode_keyset_cursor(rows[-1][3], rows[-1][0]) if len(rows) == limit else None
         
         return jsonify({
             "success": True,
@@ -557,7 +388,8 @@ def get_all_activities():
                 "page": page,
                 "limit": limit,
                 "total": total_count,
-                "totalPages": total_pages
+                "totalPages": total_pages,
+                "nextCursor": next_cursor
             }
         }), 200
         
@@ -569,10 +401,15 @@ def get_all_activities():
 
 @app.route('/api/classroom_quiz/<classroom_quiz_id>/responses', methods=['POST'])
 def submit_responses(classroom_quiz_id):
-    """Endpoint to submit responses for a specific classroom quiz."""
-    connection = get_connection()
+    """Endpoint to submit responses for a specific classroom quiz.
+
+    All answers of a submission are written with one multi-row INSERT. When
+    SUBMISSION_BUFFER_ENABLED=1 the rows are queued instead and written in
+    periodic batches (see src/submission_buffer.py); the response is then 202.
+    """
     if request.method == 'OPTIONS':
         return '', 200
+    connection = None
     try:
         # Parse the JSON request body
         data = request.get_json()
@@ -589,18 +426,29 @@ def submit_responses(classroom_quiz_id):
         if not isinstance(answers, list) or not all('question_id' in ans and 'answer' in ans for ans in answers):
             return jsonify({"error": "Each answer must include 'question_id' and 'answer'."}), 400
 
+        rows = [
+            (quiz_id, answer['question_id'], student_name, answer['answer'], submitted_at // 1000, answer.get('question_type'))
+            for answer in answers
+        ]
+
+        def on_stored():
+            _update_live_leaderboard(quiz_id, student_name, answers)
+            publish_submission("quiz", quiz_id, {"student": student_name, "answers": len(answers)})
+
+        # Buffered mode: hand the rows to the batch writer and return immediately;
+        # the leaderboard and live results are updated once the rows are written
+        if answer_buffer and answer_buffer.submit(rows, on_written=on_stored):
+            return jsonify({"success": True, "buffered": True, "message": "Responses accepted."}), 202
+
         # Insert responses into the database
         connection = get_connection()
-        if connection:
-            with connection.cursor() as cursor:
-                query = """
-                INSERT INTO answers (quiz_id, question_id, student_name, answer_content, submitted_at,question_type)
-                VALUES (%s, %s, %s, %s, FROM_UNIXTIME(%s), %s)
-                """
-                for answer in answers:
-                    cursor.execute(query, (quiz_id, answer['question_id'], student_name, answer['answer'], submitted_at // 1000, answer.get('question_type')))
-                connection.commit()
+        if not connection:
+            return jsonify({"error": "Database connection failed."}), 500
 
+        with connection.cursor() as cursor, transaction(connection):
+            insert_rows(cursor, "answers", ANSWER_COLUMNS, rows, row_template=ANSWER_ROW_TEMPLATE)
+
+        on_stored()
         return jsonify({"success": True, "message": "Responses submitted successfully."}), 200
 
     except Exception as e:
@@ -609,6 +457,53 @@ def submit_responses(classroom_quiz_id):
         if connection:
             release_connection(connection)
 
+def _update_live_leaderboard(quiz_id, student_name, answers):
+    """Score a stored submission into the live leaderboard; never fails the submission."""
+    if not live_leaderboard:
+        return
+    try:
+        live_leaderboard.record_submission(quiz_id, student_name, [(ans['question_id'], ans['answer']) for ans in answers])
+    except Exception as e:
+        print(f"Live leaderboard update failed for quiz {quiz_id}: {e}")
+
+@app.route('/api/classroom_quiz/<classroom_quiz_id>/leaderboard', methods=['GET'])
+def get_live_leaderboard(classroom_quiz_id):
+    """Endpoint to read the live leaderboard kept up to date by submit_responses.
+
+    Scores cover objective questions (plus short answers judged by the last
+    grading run). Query params: limit (default 50), ranking, and student to
+    include that student's own standing.
+    """
+    if not live_leaderboard:
+        return jsonify({"error": "Live leaderboard is disabled (LEADERBOARD_REDIS_URL is not set)."}), 404
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        ranking = request.args.get('ranking', DEFAULT_RANKING)
+        if ranking not in RANKING_METHODS:
+            return jsonify({"error": f"ranking must be one of {', '.join(RANKING_METHODS)}."}), 400
+
+        leaderboard, max_points = live_leaderboard.standings(classroom_quiz_id, limit, ranking)
+        response = {
+            "leaderboard": leaderboard,
+            "maxPoints": max_points,
+            "participants": live_leaderboard.store.size(classroom_quiz_id),
+        }
+        student_name = request.args.get('student')
+        if student_name:
+            response["student"] = live_leaderboard.student_standing(classroom_quiz_id, student_name.strip())
+        return jsonify(response), 200
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/submissions/metrics', methods=['GET'])
+def get_submission_metrics():
+    """Endpoint to report the queue depth and flush counters of the submission buffer."""
+    if not answer_buffer:
+        return jsonify({"enabled": False, "queue_depth": 0}), 200
+    return jsonify({"enabled": True, **answer_buffer.get_metrics()}), 200
+
 @app.route('/api/classroom_quiz/<classroom_quiz_id>/results', methods=['GET'])
 def get_quiz_results(classroom_quiz_id):
     """Endpoint to fetch all responses for a specific classroom quiz."""
@@ -795,61 +690,106 @@ def update_classroom_quiz(classroom_quiz_id):
         if connection:
             release_connection(connection)
 
+QUESTION_BATCH_SIZE = 1000  # Max quiz ids per IN (...) lookup
+
+
+def _format_question(question):
+    """Format a questions row for the homepage payload."""
+    return {
+        "id": question[1],
+        "text": question[2],
+        "type": question[3],
+        "options": json.loads(question[4]) if question[4] else None,
+        "correctAnswer": question[5],
+        "points": question[6] if question[6] is not None else 10
+    }
+
+
+def load_questions_for_quizzes(cursor, quiz_ids):
+    """Fetch the questions of many quizzes at once and group them by quiz_id.
+
+    Issues one query per QUESTION_BATCH_SIZE quiz ids instead of one per quiz.
+    """
+    grouped = {quiz_id: [] for quiz_id in quiz_ids}
+    for i in range(0, len(quiz_ids), QUESTION_BATCH_SIZE):
+        batch = quiz_ids[i:i + QUESTION_BATCH_SIZE]
+        placeholders = ', '.join(['%s'] * len(batch))
+        cursor.execute(f"""
+            SELECT quiz_id, question_id, question_text, question_type, options, true_answer, points
+            FROM questions
+            WHERE quiz_id IN ({placeholders})
+            ORDER BY quiz_id, question_id
+        """, batch)
+        for question in cursor.fetchall():
+            grouped[question[0]].append(_format_question(question))
+    return grouped
+
+
 @app.route('/api/homepage_classroom_quiz', methods=['GET'])
 def get_homepage_classroom_quizzes():
-    """Endpoint to retrieve all classroom quizzes with their questions for homepage."""
+    """Endpoint to retrieve classroom quizzes with their questions for homepage.
+
+    Optional query parameters:
+        limit  - page size (1-100); when omitted every quiz is returned
+        cursor - opaque keyset cursor returned as nextCursor by the previous page
+    """
+    connection = None
     try:
+        limit = request.args.get('limit', type=int)
+        cursor_value = request.args.get('cursor')
+        if limit is not None and (limit < 1 or limit > 100):
+            limit = 20
+
+        query = "SELECT quiz_id, title, type, created_at FROM class_quizzes"
+        params = []
+        if cursor_value:
+            try:
+                last_created_at, last_quiz_id = _decode_keyset_cursor(cursor_value)
+            except ValueError as ve:
+                return jsonify({"error": str(ve)}), 400
+            # Keyset on (created_at DESC, quiz_id DESC); MySQL sorts NULL created_at last
+            if last_created_at is None:
+                query += " WHERE created_at IS NULL AND quiz_id < %s"
+                params = [last_quiz_id]
+            else:
+                query += " WHERE (created_at < %s OR (created_at = %s AND quiz_id < %s) OR created_at IS NULL)"
+                params = [last_created_at, last_created_at, last_quiz_id]
+        query += " ORDER BY created_at DESC, quiz_id DESC"
+        if limit is not None:
+            # Fetch one extra row to know whether another page exists
+            query += " LIMIT %s"
+            params.append(limit + 1)
+
         connection = get_connection()
         if not connection:
             return jsonify({"error": "Database connection failed."}), 500
 
         with connection.cursor() as cursor:
-            # Query to retrieve all classroom quizzes
-            cursor.execute("""
-                SELECT quiz_id, title, type
-                FROM class_quizzes
-                ORDER BY created_at DESC
-            """)
+            cursor.execute(query, params)
             quizzes = cursor.fetchall()
 
-            # Format the results
-            quizzes_list = []
-            for quiz in quizzes:
-                quiz_id = quiz[0]
-                quiz_title = quiz[1]
-                quiz_type = quiz[2]
+            has_more = limit is not None and len(quizzes) > limit
+            if has_more:
+                quizzes = quizzes[:limit]
 
-                # Fetch questions for this quiz
-                cursor.execute("""
-                    SELECT question_id, question_text, question_type, options, true_answer, points
-                    FROM questions
-                    WHERE quiz_id = %s
-                    ORDER BY question_id
-                """, (quiz_id,))
-                questions = cursor.fetchall()
-
-                # Format questions
-                formatted_questions = []
-                for question in questions:
-                    question_data = {
-                        "id": question[0],
-                        "text": question[1],
-                        "type": question[2],
-                        "options": json.loads(question[3]) if question[3] else None,
-                        "correctAnswer": question[4],
-                        "points": question[5] if question[5] is not None else 10
-                    }
-                    formatted_questions.append(question_data)
-
-                # Add quiz with questions to the list
-                quizzes_list.append({
-                    "id": quiz_id,
-                    "title": quiz_title,
-                    "type": quiz_type,
-                    "questions": formatted_questions
-                })
+            # Load the questions of every visible quiz in one batched query
+            questions_by_quiz = load_questions_for_quizzes(cursor, [quiz[0] for quiz in quizzes])
 
-        return jsonify({"quizzes": quizzes_list}), 200
+        quizzes_list = [
+            {
+                "id": quiz[0],
+                "title": quiz[1],
+                "type": quiz[2],
+                "questions": questions_by_quiz[quiz[0]]
+            }
+            for quiz in quizzes
+        ]
+
+        response = {"quizzes": quizzes_list}
+        if limit is not None:
+            last = quizzes[-1] if quizzes else None
+            response["nextCursor"] = _encode_keyset_cursor(last[3], last[0]) if has_more else None
+        return jsonify(response), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,117 @@
+from src.db_connection import get_connection, release_connection
+
+# Every activity table listed on /api/all_activities:
+# (activityType, table, id column, timestamp column used as "edited")
+ACTIVITY_SOURCES = [
+    ('quiz', 'class_quizzes', 'quiz_id', 'created_at'),
+    ('openend', 'openend_question_list', 'share_id', 'created_at'),
+    ('poll', 'student_poll', 'poll_id', 'created_at'),
+    ('mindmap', 'mind_map_result', 'mind_map_id', 'updated_time'),
+    ('scale', 'scale', 'scale_id', 'created_time'),
+]
+
+# Covering indexes so that each branch of the UNION ALL is answered by an
+# ordered index range scan on (uid, edited) and the title filter is checked
+# against the index entries instead of the rows.
+ACTIVITY_INDEX_DDL = [
+    f"CREATE INDEX idx_{table}_uid_edited ON {table} (uid, {time_col}, title)"
+    for _, table, _, time_col in ACTIVITY_SOURCES
+]
+
+
+ACTIVITY_TYPES = [activity for activity, _, _, _ in ACTIVITY_SOURCES]
+
+
+def _sources_for(activity_type):
+    """Return the sources matching the requested activity type ('' means all).
+
+    Raises ValueError for an unknown type, which would otherwise build an empty UNION.
+    """
+    if activity_type and activity_type not in ACTIVITY_TYPES:
+        raise ValueError(f"Unknown activity type: {activity_type}. Expected one of: {', '.join(ACTIVITY_TYPES)}")
+    return [source for source in ACTIVITY_SOURCES if not activity_type or source[0] == activity_type]
+
+
+def _branch_filter(time_col, id_col, uid, search_keyword, cursor_position):
+    """Build the WHERE clause shared by the page and count queries of one branch."""
+    clause = "uid = %s"
+    params = [uid]
+    if search_keyword:
+        clause += " AND title LIKE %s"
+        params.append(f"%{search_keyword}%")
+    if cursor_position:
+        last_edited, last_id = cursor_position
+        # MySQL sorts NULL timestamps last in DESC order
+        if last_edited is None:
+            clause += f" AND {time_col} IS NULL AND {id_col} < %s"
+            params.append(last_id)
+        else:
+            clause += f" AND ({time_col} < %s OR ({time_col} = %s AND {id_col} < %s) OR {time_col} IS NULL)"
+            params.extend([last_edited, last_edited, last_id])
+    return clause, params
+
+
+def build_page_query(uid, activity_type='', search_keyword='', limit=20, offset=0, cursor_position=None):
+    """Build one UNION ALL query returning a single page of activities.
+
+    Each branch is already ordered and cut to offset + limit rows, so the
+    database never reads more than one page worth of rows (plus the offset)
+    from any table, whatever the total number of activities.
+    """
+    branches = []
+    params = []
+    for activity, table, id_col, time_col in _sources_for(activity_type):
+        clause, branch_params = _branch_filter(time_col, id_col, uid, search_keyword, cursor_position)
+        branches.append(f"""
+            (SELECT {id_col} AS id, title, '{activity}' AS activityType, {time_col} AS edited
+             FROM {table}
+             WHERE {clause}
+             ORDER BY {time_col} DESC, {id_col} DESC
+             LIMIT %s)""")
+        params.extend(branch_params)
+        params.append(offset + limit)
+
+    query = f"""
+        SELECT id, title, activityType, edited
+        FROM ({' UNION ALL '.join(branches)}) AS activity_index
+        ORDER BY edited DESC, id DESC
+        LIMIT %s OFFSET %s
+    """
+    params.extend([limit, offset])
+    return query, params
+
+
+def build_count_query(uid, activity_type='', search_keyword=''):
+    """Build one query counting the matching activities across every table."""
+    branches = []
+    params = []
+    for _, table, id_col, time_col in _sources_for(activity_type):
+        clause, branch_params = _branch_filter(time_col, id_col, uid, search_keyword, None)
+        branches.append(f"SELECT COUNT(*) AS cnt FROM {table} WHERE {clause}")
+        params.extend(branch_params)
+
+    query = f"SELECT COALESCE(SUM(cnt), 0) FROM ({' UNION ALL '.join(branches)}) AS activity_counts"
+    return query, params
+
+
+def main():
+    """Create the indexes backing /api/all_activities (safe to re-run)."""
+    connection = get_connection()
+    if not connection:
+        return
+    try:
+        with connection.cursor() as cursor:
+            for ddl in ACTIVITY_INDEX_DDL:
+                try:
+                    cursor.execute(ddl)
+                    print(f"Created: {ddl}")
+                except Exception as e:
+                    # Duplicate key name: the index already exists
+                    print(f"Skipped: {ddl} ({e})")
+        connection.commit()
+    finally:
+        release_connection(connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import time
+from contextlib import contextmanager
+from src.db_connection import get_connection, release_connection
+
+# Rows per INSERT statement; keeps each statement well below max_allowed_packet
+DEFAULT_CHUNK_SIZE = 500
+
+
+def insert_rows(cursor, table, columns, rows, row_template=None, on_duplicate=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Insert many rows with multi-row INSERT ... VALUES statements.
+
+    One statement (one round trip) is sent per chunk_size rows instead of one
+    per row. row_template overrides the per-row placeholder group, e.g.
+    "(%s, %s, FROM_UNIXTIME(%s))"; on_duplicate is appended verbatim as an
+    ON DUPLICATE KEY UPDATE clause. Returns the number of affected rows.
+    """
+    rows = [tuple(row) for row in rows]
+    if not rows:
+        return 0
+
+    if row_template is None:
+        row_template = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    column_list = ", ".join(columns)
+
+    affected = 0
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        query = f"INSERT INTO {table} ({column_list}) VALUES " + ", ".join([row_template] * len(chunk))
+        if on_duplicate:
+            query += f" ON DUPLICATE KEY UPDATE {on_duplicate}"
+        params = [value for row in chunk for value in row]
+        affected += cursor.execute(query, params) or 0
+    return affected
+
+
+# table -> its AUTO_INCREMENT column, looked up once per process by row_sequence
+_sequence_columns = {}
+
+
+class SchemaNotMigrated(RuntimeError):
+    """A column the code relies on is missing: run python -m src.schema_migrations."""
+
+
+def _find_row_sequence(cursor, table):
+    cursor.execute(
+        """
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND EXTRA LIKE %s
+        """,
+        (table, "%auto_increment%")
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def row_sequence(cursor, table):
+    """Return the table's AUTO_INCREMENT column (a stable row order and per-row id).
+
+    Request paths only look it up; add_row_sequence (run by the schema
+    migration) creates it. Raises SchemaNotMigrated if it is missing.
+    """
+    column = _sequence_columns.get(table)
+    if column:
+        return column
+    column = _find_row_sequence(cursor, table)
+    if not column:
+        raise SchemaNotMigrated(f"{table} has no AUTO_INCREMENT column: run python -m src.schema_migrations")
+    _sequence_columns[table] = column
+    return column
+
+
+def add_row_sequence(cursor, table):
+    """Add `seq BIGINT AUTO_INCREMENT` to the table unless it has an AUTO_INCREMENT column.
+
+    Rebuilds the table, so it belongs in a migration, never in a request.
+    Returns (column, added).
+    """
+    column = _find_row_sequence(cursor, table)
+    if column:
+        return column, False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN seq BIGINT NOT NULL AUTO_INCREMENT UNIQUE")
+    return "seq", True
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """,
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+
+def index_exists(cursor, table, index):
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1
+        """,
+        (table, index)
+    )
+    return cursor.fetchone() is not None
+
+
+@contextmanager
+def transaction(connection):
+    """Run a block in one transaction: commit on success, roll back on error."""
+    try:
+        yield connection
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def main():
+    """Benchmark per-row inserts against insert_rows for a 50-question quiz."""
+    questions = 50
+    rounds = 20
+    rows = [(f"bench_{q}", f"Question {q}", "Single Choice", '["A", "B", "C", "D"]', '"A"', 1) for q in range(questions)]
+    columns = ["question_id", "question_text", "question_type", "options", "true_answer", "points"]
+
+    connection = get_connection()
+    if not connection:
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMPORARY TABLE bulk_write_benchmark (
+                    question_id VARCHAR(64), question_text TEXT, question_type VARCHAR(64),
+                    options TEXT, true_answer TEXT, points INT
+                )
+            """)
+
+            query = "INSERT INTO bulk_write_benchmark (question_id, question_text, question_type, options, true_answer, points) VALUES (%s, %s, %s, %s, %s, %s)"
+            start = time.perf_counter()
+            for _ in range(rounds):
+                with transaction(connection):
+                    for row in rows:
+                        cursor.execute(query, row)
+            per_row = (time.perf_counter() - start) / rounds
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                with transaction(connection):
+                    insert_rows(cursor, "bulk_write_benchmark", columns, rows)
+            batched = (time.perf_counter() - start) / rounds
+
+            cursor.execute("DROP TEMPORARY TABLE bulk_write_benchmark")
+
+        print(f"=== {questions} rows, average of {rounds} rounds ===")
+        print(f"per-row execute : {per_row * 1000:.2f} ms ({questions} round trips)")
+        print(f"insert_rows     : {batched * 1000:.2f} ms (1 round trip)")
+        print(f"speed-up        : {per_row / batched:.1f}x")
+    finally:
+        release_connection(connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import row_sequence, add_row_sequence, index_exists
+from src.LLM import ai_assistant
+
+# Prompt budget (estimated tokens) for summary + recent turns sent to the model
+TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", 3000))
+# Summarise once turns that no longer fit the window reach this many tokens
+SUMMARY_TRIGGER = int(os.getenv("CHAT_SUMMARY_TRIGGER", 1000))
+# Conversations kept in memory per process
+MAX_CACHED_CONVERSATIONS = int(os.getenv("CHAT_CACHE_SIZE", 256))
+
+# chat_history rows are ordered by an AUTO_INCREMENT column (chattime has
+# one-second resolution, so turns written in the same second would tie);
+# migrate_chat_history adds it, plus the index behind the per-read refresh
+CHAT_HISTORY_INDEX = "idx_chat_history_chat_seq"
+
+
+def chat_history_sequence(cursor):
+    """Return chat_history's AUTO_INCREMENT column (SchemaNotMigrated if there is none)."""
+    return row_sequence(cursor, "chat_history")
+
+
+def migrate_chat_history(cursor):
+    """Add the sequence column and the (chat_id, sequence) index if missing. Returns the changes made."""
+    changes = []
+    sequence, added = add_row_sequence(cursor, "chat_history")
+    if added:
+        changes.append(f"added chat_history.{sequence}")
+    if not index_exists(cursor, "chat_history", CHAT_HISTORY_INDEX):
+        cursor.execute(f"CREATE INDEX {CHAT_HISTORY_INDEX} ON chat_history (chat_id, {sequence})")
+        changes.append(f"added index {CHAT_HISTORY_INDEX}")
+    return changes
+
+
+def estimate_tokens(text):
+    """Cheap token estimate: ~4 ASCII characters per token, 1 token per CJK/other character."""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+class Conversation:
+    """One chat: the rolling summary plus the turns it does not cover yet."""
+
+    def __init__(self, chat_id, uid):
+        self.chat_id = chat_id
+        self.uid = uid
+        self.summary = ""
+        self.turns = []  # [{"id": chat_history row, "role": "user"|"assistant", "content": str}]
+        self.last_id = 0  # newest chat_history row applied to this object
+        self.lock = threading.Lock()
+
+
+class ConversationStore:
+    """Server-side chat history keyed by chat_id, persisted to chat_history.
+
+    Every turn is appended as one chat_history row whose chat_context holds
+    {"role", "content"} JSON (rows written before this store are plain text
+    and read back as assistant turns). Prompts are built from the latest
+    summary plus as many recent turns as fit TOKEN_BUDGET; older turns are
+    folded into a new summary row ({"role": "summary", "content", "through":
+    id of the last turn it covers}), so prompt size stays bounded however
+    long the session runs.
+
+    Conversations are cached per process, but chat_history is the source of
+    truth: every get() first applies the rows written since the cached copy
+    was last read (by this or any other worker), with one indexed query.
+    """
+
+    def __init__(self, max_conversations=MAX_CACHED_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, chat_id, uid, welcome_message=None):
+        """Register a new chat, optionally persisting a welcome message from the assistant."""
+        conversation = Conversation(chat_id, uid)
+        self._remember(conversation)
+        if welcome_message:
+            self.append(chat_id, uid, "assistant", welcome_message)
+        return conversation
+
+    def get(self, chat_id, uid=None):
+        """Return the conversation, brought up to date with chat_history."""
+        conversation = self._cached(chat_id)
+        if conversation is None:
+            conversation = Conversation(chat_id, uid)
+            self._refresh(conversation)
+            self._remember(conversation)
+        else:
+            self._refresh(conversation)
+        return conversation
+
+    def append(self, chat_id, uid, role, content):
+        """Append one turn as one chat_history row; the next get() reads it back."""
+        conversation = self._cached(chat_id)
+        self._persist((conversation.uid if conversation else None) or uid, chat_id, {"role": role, "content": content})
+
+    def build_messages(self, chat_id, user_message, system_prompt, uid=None):
+        """Build the chat messages for the next reply within TOKEN_BUDGET."""
+        conversation = self.get(chat_id, uid)
+        with conversation.lock:
+            budget = TOKEN_BUDGET - estimate_tokens(system_prompt) - estimate_tokens(user_message)
+            messages = [{"role": "system", "content": system_prompt}]
+            if conversation.summary:
+                messages.append({"role": "system", "content": f"Summary of the earlier conversation: {conversation.summary}"})
+                budget -= estimate_tokens(conversation.summary)
+
+            window = []
+            for turn in reversed(conversation.turns):
+                cost = estimate_tokens(turn["content"])
+                if cost > budget:
+                    break
+                window.append({"role": turn["role"], "content": turn["content"]})
+                budget -= cost
+            window.reverse()
+
+        messages.extend(window)
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def compact(self, chat_id):
+        """Fold turns that fell out of the window into the rolling summary.
+
+        Runs only when those turns add up to SUMMARY_TRIGGER tokens, so most
+        turns cost no extra LLM call. Best effort: if summarising fails the
+        turns stay as they are and the next exchange tries again.
+        """
+        conversation = self.get(chat_id)
+        with conversation.lock:
+            budget = TOKEN_BUDGET - estimate_tokens(conversation.summary)
+            keep = 0
+            for turn in reversed(conversation.turns):
+                cost = estimate_tokens(turn["content"])
+                if cost > budget:
+                    break
+                budget -= cost
+                keep += 1
+            overflow = conversation.turns[:len(conversation.turns) - keep]
+            if sum(estimate_tokens(turn["content"]) for turn in overflow) < SUMMARY_TRIGGER:
+                return
+            previous_summary = conversation.summary
+
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in overflow)
+        try:
+            summary = ai_assistant(
+                "Summarise the following teaching-assistant conversation in under 200 words, "
+                "keeping facts, decisions and open questions.\n"
+                f"Earlier summary: {previous_summary or '(none)'}\n"
+                f"New turns:\n{transcript}"
+            )
+            self._persist(conversation.uid, chat_id, {"role": "summary", "content": summary, "through": overflow[-1]["id"]})
+        except Exception as e:
+            print(f"Error compacting chat {chat_id}: {e}")
+        # The summary row is applied by the next get(), like rows from other workers
+
+    def record_exchange(self, chat_id, uid, user_message, reply):
+        """Persist one user message and its reply, then compact the history if needed (best effort)."""
+        self.append(chat_id, uid, "user", user_message)
+        self.append(chat_id, uid, "assistant", reply)
+        self.compact(chat_id)
+
+    def _cached(self, chat_id):
+        with self._lock:
+            conversation = self._conversations.get(chat_id)
+            if conversation:
+                self._conversations.move_to_end(chat_id)
+            return conversation
+
+    def _remember(self, conversation):
+        with self._lock:
+            self._conversations[conversation.chat_id] = conversation
+            self._conversations.move_to_end(conversation.chat_id)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+
+    def _refresh(self, conversation):
+        """Apply the chat_history rows newer than conversation.last_id, in row order."""
+        connection = get_connection()
+        if not connection:
+            raise ConnectionError("Failed to connect to the database.")
+        try:
+            with connection.cursor() as cursor:
+                sequence = chat_history_sequence(cursor)
+                cursor.execute(
+                    f"SELECT {sequence}, uid, chat_context FROM chat_history "
+                    f"WHERE chat_id = %s AND {sequence} > %s ORDER BY {sequence}",
+                    (conversation.chat_id, conversation.last_id)
+                )
+                rows = cursor.fetchall()
+        finally:
+            release_connection(connection)
+
+        with conversation.lock:
+            for row_id, row_uid, chat_context in rows:
+                if row_id <= conversation.last_id:
+                    continue  # applied by a concurrent refresh
+                conversation.last_id = row_id
+                conversation.uid = conversation.uid or row_uid
+                try:
+                    turn = json.loads(chat_context)
+                    if not isinstance(turn, dict) or "role" not in turn:
+                        raise ValueError
+                except (ValueError, TypeError):
+                    turn = {"role": "assistant", "content": chat_context or ""}
+                if turn["role"] == "summary":
+                    # Summaries without "through" predate it and cover every turn stored before them
+                    conversation.summary = turn.get("content", "")
+                    through = turn.get("through", row_id)
+                    conversation.turns = [t for t in conversation.turns if t["id"] > through]
+                else:
+                    conversation.turns.append({"id": row_id, "role": turn["role"], "content": turn.get("content", "")})
+
+    def _persist(self, uid, chat_id, turn):
+        """Insert one chat_history row and return its sequence id."""
+        connection = get_connection()
+        if not connection:
+            raise ConnectionError("Failed to connect to the database.")
+        try:
+            with connection.cursor() as cursor:
+                chat_history_sequence(cursor)
+                cursor.execute(
+                    """
+                    INSERT INTO chat_history (uid, chat_id, chat_context, chattime)
+                    VALUES (%s, %s, %s, %s)
+                    """,
+                    (uid, chat_id, json.dumps(turn, ensure_ascii=False), datetime.now())
+                )
+                turn_id = cursor.lastrowid
+            connection.commit()
+            return turn_id
+        finally:
+            release_connection(connection)
+
+
+conversation_store = ConversationStore()
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from src.db_connection import get_connection, release_connection
+from src.enrollment import ensure_enrollment_table, list_students, list_groups
+
+# Course lists, rosters and group lists change rarely (not during a lecture),
+# so reads go through this cache. With COURSE_CACHE_REDIS_URL set it is Redis,
+# shared by all workers, so invalidate_course reaches every worker and
+# entries can live for COURSE_CACHE_TTL. Otherwise it is an in-process LRU:
+# invalidation only clears the worker that handled the write, so entries
+# expire after COURSE_CACHE_LOCAL_TTL seconds to bound how long other
+# workers serve stale rosters.
+COURSE_CACHE_REDIS_URL = os.getenv("COURSE_CACHE_REDIS_URL")
+COURSE_CACHE_TTL = int(os.getenv("COURSE_CACHE_TTL", 300))
+COURSE_CACHE_LOCAL_TTL = int(os.getenv("COURSE_CACHE_LOCAL_TTL", 5))
+COURSE_CACHE_MAX_ENTRIES = int(os.getenv("COURSE_CACHE_MAX_ENTRIES", 2048))
+
+_MISSING = object()
+
+
+class LruBackend:
+    def __init__(self, max_entries=COURSE_CACHE_MAX_ENTRIES, ttl=COURSE_CACHE_LOCAL_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    PREFIX = "course_cache:"
+
+    def __init__(self, redis_url, ttl=COURSE_CACHE_TTL):
+        import redis
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    def get(self, key):
+        raw = self._redis.get(self.PREFIX + key)
+        return _MISSING if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        self._redis.set(self.PREFIX + key, json.dumps(value, ensure_ascii=False, default=str), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self._redis.delete(*[self.PREFIX + key for key in keys])
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(self.PREFIX + "*"))
+        if keys:
+            self._redis.delete(*keys)
+
+
+def _query(load):
+    """Run load(cursor) on a pooled connection."""
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError("Database connection failed.")
+    try:
+        with connection.cursor() as cursor:
+            return load(cursor)
+    finally:
+        release_connection(connection)
+
+
+def _load_courses(cursor):
+    cursor.execute(
+        """
+        SELECT cid, cid AS code, cname AS title, schedule, studentNumber AS students, year, semester,
+               weekday, class_time AS classTime, capacity, status
+        FROM course
+        """
+    )
+    return [list(row) for row in cursor.fetchall()]
+
+
+def _load_students(cursor, cid):
+    ensure_enrollment_table(cursor)
+    return [list(row) for row in list_students(cursor, cid)]
+
+
+def _load_groups(cursor, cid):
+    """Groups of a course, or None if the course does not exist (cached too)."""
+    ensure_enrollment_table(cursor)
+    cursor.execute("SELECT cid FROM course WHERE cid = %s", (cid,))
+    if not cursor.fetchone():
+        return None
+    return list_groups(cursor, cid)
+
+
+def roster_version(names):
+    """Content hash of a roster's usernames; changes whenever the roster does."""
+    return format(zlib.crc32("\x1f".join(names).encode("utf-8")), "08x")
+
+
+class CourseCache:
+    """Read-through cache of course rows, rosters and groups with hit-ratio counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.metrics[name] += 1
+
+    def get(self, key, loader):
+        """Cached value of key, calling loader() and storing its result on a miss (None is cached too)."""
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Course cache: read of {key} failed ({e})")
+            value = _MISSING
+        if value is not _MISSING:
+            self._count("hits")
+            return value
+        self._count("misses")
+        value = loader()
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            print(f"Course cache: write of {key} failed ({e})")
+        return value
+
+    def courses(self):
+        """Rows of the course table: [cid, code, title, schedule, students, year, semester, weekday, classTime, capacity, status]."""
+        return self.get("courses", lambda: _query(_load_courses))
+
+    def students(self, cid):
+        """[[username, uid, group]] of one course."""
+        return self.get(f"students:{cid}", lambda: _query(lambda cursor: _load_students(cursor, cid)))
+
+    def roster_version(self, cid):
+        """Version of students(cid), cached and invalidated with it, so callers can keep derived data."""
+        return self.get(f"roster_version:{cid}", lambda: roster_version([student[0] for student in self.students(cid)]))
+
+    def groups(self, cid):
+        """Non-empty groups of one course, or None if the course does not exist."""
+        return self.get(f"groups:{cid}", lambda: _query(lambda cursor: _load_groups(cursor, cid)))
+
+    def add_invalidation_listener(self, listener):
+        """listener(cid) is called on every invalidation (cid None means everything)."""
+        self._listeners.append(listener)
+
+    def invalidate_course(self, *cids):
+        """Drop the course list and the roster/groups of each cid; call after the change is committed.
+
+        With the LRU backend this only reaches the current worker (see COURSE_CACHE_LOCAL_TTL).
+        """
+        keys = ["courses"]
+        for cid in cids:
+            keys += [f"students:{cid}", f"roster_version:{cid}", f"groups:{cid}"]
+        self._invalidate(lambda: self.backend.delete(*keys), cids)
+
+    def invalidate_all(self):
+        """Drop everything, e.g. after a bulk import touching many courses."""
+        self._invalidate(self.backend.clear, [None])
+
+    def _invalidate(self, drop, cids):
+        self._count("invalidations")
+        try:
+            drop()
+        except Exception as e:
+            print(f"Course cache: invalidation failed ({e})")
+        for listener in self._listeners:
+            for cid in cids:
+                listener(cid)
+
+    def get_metrics(self):
+        with self._lock:
+            snapshot = dict(self.metrics)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        snapshot["backend"] = "redis" if isinstance(self.backend, RedisBackend) else "lru"
+        return snapshot
+
+
+course_cache = CourseCache(RedisBackend(COURSE_CACHE_REDIS_URL) if COURSE_CACHE_REDIS_URL else LruBackend())
@@ -2,6 +2,11 @@ from flask import Blueprint, request, jsonify
 from src.db_connection import get_connection, release_connection
 from datetime import datetime
 from src.auth_decorator import login_required
+from src.course_cache import course_cache
+from src.enrollment import (
+    ensure_enrollment_table, enroll_students, replace_students, rename_course,
+    delete_course_students
+)
 
 course_routes = Blueprint('course_routes', __name__)
 
@@ -34,6 +39,7 @@ def create_course():
         # Get database connection
         connection = get_connection()
         cursor = connection.cursor()
+        ensure_enrollment_table(cursor)
 
         # Insert course into the database
         cursor.execute(
@@ -44,37 +50,13 @@ def create_course():
             (course_code, course_title, schedule, students, year, semester, weekday, class_time, capacity, status, datetime.now())
         )
 
-        # Create a new table for the course's student list
-        student_list_table = f"student_list_{course_code}"
-        create_table_query = f"""
-            CREATE TABLE IF NOT EXISTS {student_list_table} (
-                uid VARCHAR(255) NOT NULL,
-                username VARCHAR(255) NOT NULL,
-                grade FLOAT DEFAULT NULL,
-                cname VARCHAR(255) NOT NULL,
-                cid VARCHAR(255) NOT NULL,
-                `group` VARCHAR(255) DEFAULT NULL,
-                PRIMARY KEY (uid)
-            )
-        """
-        cursor.execute(create_table_query)
-
-        # Insert student list if provided
+        # Insert student list if provided (one bulk insert into enrollment)
         if student_list:
-            insert_student_query = f"""
-                INSERT INTO {student_list_table} (uid, username, cname, cid, `group`)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            for student in student_list:
-                student_id = student.get('student_id')
-                student_name = student.get('name')
-                student_group = student.get('group', None)
-                
-                if student_id and student_name:
-                    cursor.execute(insert_student_query, (student_id, student_name, course_title, course_code, student_group))
+            enroll_students(cursor, course_code, course_title, student_list)
 
         # Commit the transaction
         connection.commit()
+        course_cache.invalidate_course(course_code)
 
         # Respond with success
         return jsonify({
@@ -113,6 +95,7 @@ def delete_course(id):
         # Get database connection
         connection = get_connection()
         cursor = connection.cursor()
+        ensure_enrollment_table(cursor)
 
         # Delete the course from the database
         cursor.execute("DELETE FROM course WHERE cid = %s", (id,))
@@ -121,8 +104,12 @@ def delete_course(id):
         if cursor.rowcount == 0:
             return jsonify({"success": False, "message": "Course not found."}), 404
 
+        # Delete the course's roster
+        delete_course_students(cursor, id)
+
         # Commit the transaction
         connection.commit()
+        course_cache.invalidate_course(id)
 
         # Respond with success
         return jsonify({"success": True, "message": "Course deleted successfully"}), 200
@@ -166,6 +153,7 @@ def update_course(editingId):
         # Get database connection
         connection = get_connection()
         cursor = connection.cursor()
+        ensure_enrollment_table(cursor)
 
         # Update the course in the database
         cursor.execute(
@@ -182,56 +170,16 @@ def update_course(editingId):
         if cursor.rowcount == 0:
             return jsonify({"success": False, "message": "Course not found."}), 404
 
-        # If course code changed, rename the student list table
-        if new_course_code != editingId:
-            old_student_list_table = f"student_list_{editingId}"
-            new_student_list_table = f"student_list_{new_course_code}"
-            
-            # Check if old table exists
-            cursor.execute(f"SHOW TABLES LIKE '{old_student_list_table}'")
-            if cursor.fetchone():
-                cursor.execute(f"RENAME TABLE {old_student_list_table} TO {new_student_list_table}")
-                
-                # Update cid in the student list table
-                cursor.execute(f"UPDATE {new_student_list_table} SET cid = %s, cname = %s WHERE cid = %s", 
-                             (new_course_code, course_title, editingId))
+        # Move the roster to the new course code / title
+        rename_course(cursor, editingId, new_course_code, course_title)
         
-        # Update student list if provided
+        # Replace the student list if provided
         if student_list:
-            student_list_table = f"student_list_{new_course_code}"
-            
-            # Create table if it doesn't exist
-            create_table_query = f"""
-                CREATE TABLE IF NOT EXISTS {student_list_table} (
-                    uid VARCHAR(255) NOT NULL,
-                    username VARCHAR(255) NOT NULL,
-                    grade FLOAT DEFAULT NULL,
-                    cname VARCHAR(255) NOT NULL,
-                    cid VARCHAR(255) NOT NULL,
-                    `group` VARCHAR(255) DEFAULT NULL,
-                    PRIMARY KEY (uid)
-                )
-            """
-            cursor.execute(create_table_query)
-            
-            # Clear existing students
-            cursor.execute(f"DELETE FROM {student_list_table}")
-            
-            # Insert updated student list
-            insert_student_query = f"""
-                INSERT INTO {student_list_table} (uid, username, cname, cid, `group`)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            for student in student_list:
-                student_id = student.get('student_id')
-                student_name = student.get('name')
-                student_group = student.get('group', None)
-                
-                if student_id and student_name:
-                    cursor.execute(insert_student_query, (student_id, student_name, course_title, new_course_code, student_group))
+            replace_students(cursor, new_course_code, course_title, student_list)
 
         # Commit the transaction
         connection.commit()
+        course_cache.invalidate_course(editingId, new_course_code)
 
         # Respond with success
         return jsonify({
@@ -271,20 +219,8 @@ def get_courses():
     #user_id = request.user_id  # 从装饰器中获取
     #role = request.role
     try:
-        # Get database connection
-        connection = get_connection()
-        cursor = connection.cursor()
-
-        # Query all courses from the database
-        cursor.execute(
-            """
-            SELECT cid, cid AS code, cname AS title, schedule, studentNumber AS students, year, semester, 
-                   weekday, class_time AS classTime, capacity, status
-            FROM course 
-            """
-            #where uid = %s
-        )
-        courses = cursor.fetchall()
+        # Course rows come from the read-through cache
+        courses = course_cache.courses()
 
         # Format the courses into a list of dictionaries
         course_list = []
@@ -318,29 +254,13 @@ def get_courses():
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            release_connection(connection)
-
 @course_routes.route('/api/courses/<courseId>/students', methods=['GET'])
 #@login_required
 def get_course_students(courseId):
     """Endpoint to fetch the student list for a specific course."""
     try:
-        # Get database connection
-        connection = get_connection()
-        cursor = connection.cursor()
-
-        # Query students from the course-specific student list table
-        student_list_table = f"student_list_{courseId}"
-        query = f"""
-            SELECT username, uid, `group`
-            FROM {student_list_table}
-        """
-        cursor.execute(query)
-        students = cursor.fetchall()
+        # The course's students, read through the roster cache
+        students = course_cache.students(courseId)
 
         # Format the students into a list of dictionaries
         student_list = []
@@ -362,12 +282,6 @@ def get_course_students(courseId):
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            release_connection(connection)
-
 @course_routes.route('/api/courses/<courseId>/students/create', methods=['POST'])
 #@login_required
 def add_course_student(courseId):
@@ -391,6 +305,7 @@ def add_course_student(courseId):
         # Get database connection
         connection = get_connection()
         cursor = connection.cursor()
+        ensure_enrollment_table(cursor)
         
         # Get course details
         cursor.execute("SELECT cname FROM course WHERE cid = %s", (course_id,))
@@ -401,32 +316,15 @@ def add_course_student(courseId):
         
         course_name = course_result[0]
         
-        # Insert student into the course's student list table
-        student_list_table = f"student_list_{course_id}"
-        
-        # Create table if it doesn't exist
-        create_table_query = f"""
-            CREATE TABLE IF NOT EXISTS {student_list_table} (
-                uid VARCHAR(255) NOT NULL,
-                username VARCHAR(255) NOT NULL,
-                grade FLOAT DEFAULT NULL,
-                cname VARCHAR(255) NOT NULL,
-                cid VARCHAR(255) NOT NULL,
-                `group` VARCHAR(255) DEFAULT NULL,
-                PRIMARY KEY (uid)
-            )
-        """
-        cursor.execute(create_table_query)
-        
-        # Insert the student
-        insert_query = f"""
-            INSERT INTO {student_list_table} (uid, username, cname, cid, `group`)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        cursor.execute(insert_query, (student_id, student_name, course_name, course_id, student_group))
+        # Insert the student into enrollment
+        cursor.execute(
+            "INSERT INTO enrollment (cid, uid, username, cname, `group`) VALUES (%s, %s, %s, %s, %s)",
+            (course_id, student_id, student_name, course_name, student_group)
+        )
         
         # Commit the transaction
         connection.commit()
+        course_cache.invalidate_course(course_id)
         
         # Respond with success
         return jsonify({
@@ -458,23 +356,15 @@ def delete_course_student(courseId, studentId):
         # Get database connection
         connection = get_connection()
         cursor = connection.cursor()
+        ensure_enrollment_table(cursor)
         
         # Verify course exists
         cursor.execute("SELECT cid FROM course WHERE cid = %s", (courseId,))
         if not cursor.fetchone():
             return jsonify({"success": False, "message": "Course not found."}), 404
         
-        # Delete student from the course's student list table
-        student_list_table = f"student_list_{courseId}"
-        
-        # Check if the table exists
-        cursor.execute(f"SHOW TABLES LIKE '{student_list_table}'")
-        if not cursor.fetchone():
-            return jsonify({"success": False, "message": "Student list table not found."}), 404
-        
-        # Delete the student
-        delete_query = f"DELETE FROM {student_list_table} WHERE uid = %s"
-        cursor.execute(delete_query, (studentId,))
+        # Delete the student's enrollment
+        cursor.execute("DELETE FROM enrollment WHERE cid = %s AND uid = %s", (courseId, studentId))
         
         # Check if any row was deleted
         if cursor.rowcount == 0:
@@ -482,6 +372,7 @@ def delete_course_student(courseId, studentId):
         
         # Commit the transaction
         connection.commit()
+        course_cache.invalidate_course(courseId)
         
         # Respond with success
         return jsonify({
@@ -505,40 +396,18 @@ def delete_course_student(courseId, studentId):
 def get_course_groups(courseId):
     """Endpoint to fetch all unique groups for a specific course."""
     try:
-        # Get database connection
-        connection = get_connection()
-        cursor = connection.cursor()
-        
-        # Verify course exists
-        cursor.execute("SELECT cid FROM course WHERE cid = %s", (courseId,))
-        if not cursor.fetchone():
+        # Distinct groups, read through the cache (None: the course does not exist)
+        groups = course_cache.groups(courseId)
+        if groups is None:
             return jsonify({"success": False, "message": "Course not found."}), 404
         
-        # Query unique groups from the course's student list table
-        student_list_table = f"student_list_{courseId}"
-        
-        # Check if the table exists
-        cursor.execute(f"SHOW TABLES LIKE '{student_list_table}'")
-        if not cursor.fetchone():
-            return jsonify({"success": True, "groups": []}), 200
-        
-        # Get distinct groups
-        query = f"""
-            SELECT DISTINCT `group`
-            FROM {student_list_table}
-            WHERE `group` IS NOT NULL AND `group` != ''
-            ORDER BY `group`
-        """
-        cursor.execute(query)
-        groups_data = cursor.fetchall()
-        
         # Format the groups into a list of dictionaries
         groups_list = [
             {
-                "id": group[0],
-                "name": group[0]
+                "id": group,
+                "name": group
             }
-            for group in groups_data
+            for group in groups
         ]
         
         # Respond with the groups list
@@ -546,9 +415,8 @@ def get_course_groups(courseId):
         
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
-    
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            release_connection(connection)
\ No newline at end of file
+
+@course_routes.route('/api/courses/cache/metrics', methods=['GET'])
+def get_course_cache_metrics():
+    """Endpoint to report course/roster cache hit ratio."""
+    return jsonify(course_cache.get_metrics()), 200
@@ -1,10 +1,12 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import datetime
-import random
-import string
 from src.db_connection import get_connection, release_connection
-import json
+from src.bulk_write import transaction
+from src.id_generator import new_id
+from src.discussion_store import (
+    ensure_discussion_tables, toggle_like, insert_reply, fetch_replies, fetch_feed, DEFAULT_REPLY_PAGE, DEFAULT_FEED_PAGE
+)
 
 app = Flask(__name__)
 
@@ -12,8 +14,8 @@ app = Flask(__name__)
 CORS(app)
 
 def generate_post_id():
-    """Generate a unique post ID."""
-    return 'post_' + ''.join(random.choices(string.digits, k=3))
+    """Generate a unique, time-ordered post ID."""
+    return new_id("post")
 
 @app.route('/api/discussions/create', methods=['POST'])
 def create_discussion():
@@ -77,50 +79,47 @@ def create_discussion():
 
 @app.route('/api/discussions/<post_id>/like', methods=['PUT'])
 def like_discussion(post_id):
-    """Endpoint to like a discussion post."""
+    """Endpoint to like (or unlike, if already liked) a discussion post.
+
+    likedBy in the response only lists the requesting user when they now
+    like the post; the full list of likers is no longer returned.
+    """
+    return _toggle_like(post_id, '')
+
+@app.route('/api/discussions/<post_id>/replies/<reply_id>/like', methods=['PUT'])
+def like_reply(post_id, reply_id):
+    """Endpoint to like (or unlike, if already liked) a reply."""
+    return _toggle_like(post_id, reply_id)
+
+def _toggle_like(post_id, reply_id):
     data = request.get_json()
 
     # Validate input
     if not data or 'userId' not in data:
         return jsonify({"success": False, "message": "Invalid input. Please provide 'userId'."}), 400
 
-    user_id = data['userId']
+    user_id = str(data['userId'])
 
+    connection = None
     try:
         connection = get_connection()
-        if connection:
-            with connection.cursor() as cursor:
-                # Fetch current likes and likedBy
-                query = "SELECT likes, likeBy FROM discussions WHERE diss_id = %s"
-                cursor.execute(query, (post_id,))
-                result = cursor.fetchone()
-
-                if not result:
-                    return jsonify({"success": False, "message": "Post not found."}), 404
-
-                likes, liked_by = result
-                liked_by = json.loads(liked_by) if liked_by else []
-
-                # Check if user already liked the post
-                if user_id in liked_by:
-                    # Unlike the post
-                    liked_by.remove(user_id)
-                    likes -= 1
-                else:
-                    # Like the post
-                    liked_by.append(user_id)
-                    likes += 1
-
-                # Update likes and likedBy
-                update_query = "UPDATE discussions SET likes = %s, likeBy = %s WHERE diss_id = %s"
-                cursor.execute(update_query, (likes, json.dumps(liked_by), post_id))
-                connection.commit()
+        if not connection:
+            return jsonify({"success": False, "message": "Database connection failed."}), 500
+        with connection.cursor() as cursor:
+            ensure_discussion_tables(cursor)
+            # 唯一约束 + 原子计数，并发点赞不会丢失
+            with transaction(connection):
+                result = toggle_like(cursor, post_id, user_id, reply_id)
+
+        if result is None:
+            return jsonify({"success": False, "message": "Reply not found." if reply_id else "Post not found."}), 404
+        likes, liked = result
 
-        # Return updated likes and likedBy
         return jsonify({
             "success": True,
             "likes": likes,
-            "likedBy": liked_by
+            "liked": liked,
+            "likedBy": [user_id] if liked else []
         }), 200
 
     except Exception as e:
@@ -140,44 +139,19 @@ def add_reply(post_id):
     if not data or not all(field in data for field in required_fields):
         return jsonify({"success": False, "message": "Invalid input. Please provide all required fields."}), 400
 
-    # Generate reply ID and timestamp
-    reply_id = 'reply_' + ''.join(random.choices(string.digits, k=3))
-    created_at = datetime.datetime.utcnow().isoformat() + 'Z'
-
+    connection = None
     try:
         connection = get_connection()
-        if connection:
-            with connection.cursor() as cursor:
-                # Fetch current replies
-                query = "SELECT replies FROM discussions WHERE diss_id = %s"
-                cursor.execute(query, (post_id,))
-                result = cursor.fetchone()
-
-                if not result:
-                    return jsonify({"success": False, "message": "Post not found."}), 404
-
-                replies = json.loads(result[0]) if result[0] else []
-
-                # Create the new reply
-                reply = {
-                    "id": reply_id,
-                    "authorName": data["authorName"],
-                    "authorId": data["authorId"],
-                    "userRole": data["userRole"],
-                    "isAnonymous": data["isAnonymous"],
-                    "content": data["content"],
-                    "createdAt": created_at,
-                    "likes": 0,
-                    "likedBy": []
-                }
-
-                # Append the new reply to the list
-                replies.append(reply)
-
-                # Update the database
-                update_query = "UPDATE discussions SET replies = %s WHERE diss_id = %s"
-                cursor.execute(update_query, (json.dumps(replies), post_id))
-                connection.commit()
+        if not connection:
+            return jsonify({"success": False, "message": "Database connection failed."}), 500
+        with connection.cursor() as cursor:
+            ensure_discussion_tables(cursor)
+            # 只插入一行回复，不再重写整个 replies JSON
+            with transaction(connection):
+                reply = insert_reply(cursor, post_id, data)
+
+        if reply is None:
+            return jsonify({"success": False, "message": "Post not found."}), 404
 
         # Return the new reply
         return jsonify({
@@ -192,69 +166,77 @@ def add_reply(post_id):
         if connection:
             release_connection(connection)
 
-@app.route('/api/discussions', methods=['GET'])
-def get_discussions():
-    """Endpoint to fetch all discussions and questions."""
+@app.route('/api/discussions/<post_id>/replies', methods=['GET'])
+def get_replies(post_id):
+    """Endpoint to fetch one page of a post's replies, oldest first.
+
+    Query params: limit (default 50, max 200), cursor (nextCursor of the
+    previous page) and userId (marks the replies that user liked).
+    """
+    connection = None
     try:
+        limit = int(request.args.get('limit', DEFAULT_REPLY_PAGE))
         connection = get_connection()
+        if not connection:
+            return jsonify({"success": False, "message": "Database connection failed."}), 500
+        with connection.cursor() as cursor:
+            ensure_discussion_tables(cursor)
+            replies, next_cursor = fetch_replies(
+                cursor, post_id, limit, request.args.get('cursor'), request.args.get('userId')
+            )
+
+        return jsonify({
+            "success": True,
+            "replies": replies,
+            "nextCursor": next_cursor
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+    finally:
         if connection:
-            with connection.cursor() as cursor:
-                # Fetch public discussions
-                cursor.execute("SELECT diss_id, title, authorName, authorId, createAt, type, likes, replies FROM discussions WHERE type = 'discussion'")
-                discussions = cursor.fetchall()
-
-                public_discussions = []
-                for discussion in discussions:
-                    diss_id, title, author_name, author_id, created_at, diss_type, likes, replies = discussion
-                    replies = json.loads(replies) if replies else []
-
-                    formatted_replies = [
-                        {
-                            "id": reply["id"],
-                            "authorName": reply["authorName"],
-                            "content": reply["content"],
-                            "createdAt": reply["createdAt"]
-                        }
-                        for reply in replies
-                    ]
-
-                    public_discussions.append({
-                        "id": diss_id,
-                        "title": title,
-                        "authorName": author_name,
-                        "authorId": author_id,
-                        "createdAt": created_at,
-                        "type": diss_type,
-                        "likes": likes,
-                        "replies": formatted_replies
-                    })
-
-                # Fetch questions
-                cursor.execute("SELECT diss_id, title, authorName, authorId, createAt, type, content, likes, replies FROM discussions ")
-                questions = cursor.fetchall()
-
-                formatted_questions = [
-                    {
-                        "id": question[0],
-                        "title": question[1],
-                        "authorName": question[2],
-                        "authorId": question[3],
-                        "createdAt": question[4],
-                        "type": question[5],
-                        "content": question[6],
-                        "likes": question[7],
-                        "replies": []
-                    }
-                    for question in questions
-                ]
+            release_connection(connection)
 
+@app.route('/api/discussions', methods=['GET'])
+def get_discussions():
+    """Endpoint to fetch one page of the discussion feed, newest first.
+
+    Query params: type (comma separated, e.g. "public,question"), limit
+    (default 20, max 100), cursor (nextCursor of the previous page),
+    include_replies (first N replies per post, default 0, max 10) and
+    userId (marks what that user liked). Every post carries replyCount;
+    the rest of a thread is read from /api/discussions/<post_id>/replies.
+    """
+    connection = None
+    try:
+        types = [t.strip() for t in request.args.get('type', '').split(',') if t.strip()]
+        limit = int(request.args.get('limit', DEFAULT_FEED_PAGE))
+        include_replies = int(request.args.get('include_replies', 0))
+
+        connection = get_connection()
+        if not connection:
+            return jsonify({"success": False, "message": "Database connection failed."}), 500
+        with connection.cursor() as cursor:
+            ensure_discussion_tables(cursor)
+            posts, next_cursor = fetch_feed(
+                cursor, types, limit, request.args.get('cursor'), include_replies, request.args.get('userId')
+            )
+
+        # publicDiscussions / questions 保留给旧前端，内容与 posts 相同
         return jsonify({
             "success": True,
             "message": "Discussions fetched successfully",
-            "publicDiscussions": public_discussions,
-            "questions": formatted_questions
+            "posts": posts,
+            "nextCursor": next_cursor,
+            "publicDiscussions": [post for post in posts if post["type"] != "question"],
+            "questions": [post for post in posts if post["type"] == "question"]
         }), 200
 
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
@@ -0,0 +1,403 @@
+import sys
+import json
+import base64
+import datetime
+import threading
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import insert_rows, transaction
+from src.id_generator import new_id
+
+# Likes and replies live in child tables instead of the discussions.likeBy /
+# discussions.replies JSON columns, so a like or reply touches one row.
+DISCUSSION_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS discussion_reply (
+        diss_id VARCHAR(64) NOT NULL,
+        reply_id VARCHAR(64) NOT NULL,
+        authorId VARCHAR(64),
+        authorName VARCHAR(255),
+        userRole VARCHAR(32),
+        isAnonymous TINYINT(1) NOT NULL DEFAULT 0,
+        content TEXT,
+        createAt DATETIME(6) NOT NULL,
+        likes INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (diss_id, reply_id),
+        KEY idx_discussion_reply_page (diss_id, createAt, reply_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS discussion_like (
+        diss_id VARCHAR(64) NOT NULL,
+        reply_id VARCHAR(64) NOT NULL DEFAULT '',
+        user_id VARCHAR(64) NOT NULL,
+        createAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (diss_id, reply_id, user_id)
+    )
+    """,
+]
+REPLY_COLUMNS = ["diss_id", "reply_id", "authorId", "authorName", "userRole", "isAnonymous", "content", "createAt", "likes"]
+LIKE_COLUMNS = ["diss_id", "reply_id", "user_id"]
+
+DEFAULT_REPLY_PAGE = 50
+MAX_REPLY_PAGE = 200
+DEFAULT_FEED_PAGE = 20
+MAX_FEED_PAGE = 100
+MAX_REPLY_PREVIEW = 10
+
+# Serves the feed's WHERE type IN (...) ORDER BY createAt DESC, diss_id DESC
+FEED_INDEX = "idx_discussions_feed"
+FEED_INDEX_DDL = f"ALTER TABLE discussions ADD INDEX {FEED_INDEX} (type, createAt, diss_id)"
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+
+def ensure_discussion_tables(cursor):
+    """Create discussion_reply and discussion_like once per process (before the transaction's first write)."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if not _tables_ready:
+            for ddl in DISCUSSION_DDL:
+                cursor.execute(ddl)
+            _tables_ready = True
+
+
+def new_reply_id():
+    return new_id("reply")
+
+
+def format_timestamp(value):
+    """Reply timestamps are returned as ISO strings with a trailing Z, as the JSON column stored them."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat() + 'Z'
+    return value
+
+
+def parse_timestamp(value):
+    """Parse a createdAt from the old JSON replies (ISO string, 'Z' suffix optional)."""
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).rstrip('Z'))
+        return parsed.replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return datetime.datetime(1970, 1, 1)
+
+
+def toggle_like(cursor, post_id, user_id, reply_id=''):
+    """Like, or unlike if already liked, a post (reply_id '') or one of its replies.
+
+    The (post, reply, user) primary key makes the like row unique and the
+    counter moves with an atomic increment, so concurrent clicks are never
+    lost. Returns (likes, liked), or None if the post or reply does not exist.
+    """
+    if reply_id:
+        table, where, params = "discussion_reply", "diss_id = %s AND reply_id = %s", (post_id, reply_id)
+    else:
+        table, where, params = "discussions", "diss_id = %s", (post_id,)
+
+    cursor.execute(f"SELECT 1 FROM {table} WHERE {where}", params)
+    if not cursor.fetchone():
+        return None
+
+    if cursor.execute(
+        "INSERT IGNORE INTO discussion_like (diss_id, reply_id, user_id) VALUES (%s, %s, %s)",
+        (post_id, reply_id, user_id)
+    ):
+        liked = True
+        cursor.execute(f"UPDATE {table} SET likes = likes + 1 WHERE {where}", params)
+    else:
+        liked = False
+        if cursor.execute(
+            "DELETE FROM discussion_like WHERE diss_id = %s AND reply_id = %s AND user_id = %s",
+            (post_id, reply_id, user_id)
+        ):
+            cursor.execute(f"UPDATE {table} SET likes = GREATEST(likes - 1, 0) WHERE {where}", params)
+
+    cursor.execute(f"SELECT likes FROM {table} WHERE {where}", params)
+    return cursor.fetchone()[0], liked
+
+
+def insert_reply(cursor, post_id, data):
+    """Store one reply row. Returns the reply in API format, or None if the post does not exist."""
+    cursor.execute("SELECT 1 FROM discussions WHERE diss_id = %s", (post_id,))
+    if not cursor.fetchone():
+        return None
+
+    reply_id = new_reply_id()
+    created_at = datetime.datetime.utcnow()
+    cursor.execute(
+        f"INSERT INTO discussion_reply ({', '.join(REPLY_COLUMNS)}) VALUES ({', '.join(['%s'] * len(REPLY_COLUMNS))})",
+        (post_id, reply_id, data["authorId"], data["authorName"], data["userRole"], bool(data["isAnonymous"]),
+         data["content"], created_at, 0)
+    )
+    return {
+        "id": reply_id,
+        "authorName": data["authorName"],
+        "authorId": data["authorId"],
+        "userRole": data["userRole"],
+        "isAnonymous": data["isAnonymous"],
+        "content": data["content"],
+        "createdAt": format_timestamp(created_at),
+        "likes": 0,
+        "likedBy": []
+    }
+
+
+def liked_by_viewer(cursor, post_id, reply_ids, user_id):
+    """The subset of reply_ids ('' for the post itself) that user_id has liked."""
+    if not user_id or not reply_ids:
+        return set()
+    placeholders = ", ".join(["%s"] * len(reply_ids))
+    cursor.execute(
+        f"SELECT reply_id FROM discussion_like WHERE diss_id = %s AND user_id = %s AND reply_id IN ({placeholders})",
+        (post_id, user_id, *reply_ids)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def encode_cursor(created_at, item_id):
+    """Opaque keyset cursor for a (createAt, id) position."""
+    raw = f"{created_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor."""
+    try:
+        created_at, item_id = base64.urlsafe_b64decode(value.encode()).decode().split("|", 1)
+        return datetime.datetime.fromisoformat(created_at), item_id
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+def fetch_replies(cursor, post_id, limit=DEFAULT_REPLY_PAGE, after=None, viewer_id=None):
+    """One page of a post's replies, oldest first, using keyset pagination.
+
+    after is the nextCursor of the previous page. likedBy of each reply only
+    lists viewer_id (when they liked it) rather than every liker. Returns
+    (replies, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_REPLY_PAGE))
+    query = """
+    SELECT reply_id, authorId, authorName, userRole, isAnonymous, content, createAt, likes
+    FROM discussion_reply WHERE diss_id = %s
+    """
+    params = [post_id]
+    if after:
+        created_at, reply_id = decode_cursor(after)
+        query += " AND (createAt > %s OR (createAt = %s AND reply_id > %s))"
+        params += [created_at, created_at, reply_id]
+    query += " ORDER BY createAt, reply_id LIMIT %s"
+    params.append(limit + 1)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+
+    next_cursor = encode_cursor(rows[limit - 1][6], rows[limit - 1][0]) if len(rows) > limit else None
+    rows = rows[:limit]
+    liked = liked_by_viewer(cursor, post_id, [row[0] for row in rows], viewer_id)
+    replies = [
+        {
+            "id": reply_id,
+            "authorId": author_id,
+            "authorName": author_name,
+            "userRole": user_role,
+            "isAnonymous": bool(is_anonymous),
+            "content": content,
+            "createdAt": format_timestamp(created_at),
+            "likes": likes,
+            "likedBy": [viewer_id] if reply_id in liked else []
+        }
+        for reply_id, author_id, author_name, user_role, is_anonymous, content, created_at, likes in rows
+    ]
+    return replies, next_cursor
+
+
+def _reply_previews(cursor, post_ids, count):
+    """The first count replies of each post in one round trip (one index range per post)."""
+    if not post_ids or count <= 0:
+        return {}
+    part = (
+        "(SELECT diss_id, reply_id, authorId, authorName, userRole, isAnonymous, content, createAt, likes "
+        "FROM discussion_reply WHERE diss_id = %s ORDER BY createAt, reply_id LIMIT %s)"
+    )
+    params = []
+    for post_id in post_ids:
+        params += [post_id, count]
+    cursor.execute(" UNION ALL ".join([part] * len(post_ids)), params)
+    previews = {}
+    for post_id, reply_id, author_id, author_name, user_role, is_anonymous, content, created_at, likes in cursor.fetchall():
+        previews.setdefault(post_id, []).append({
+            "id": reply_id,
+            "authorId": author_id,
+            "authorName": author_name,
+            "userRole": user_role,
+            "isAnonymous": bool(is_anonymous),
+            "content": content,
+            "createdAt": format_timestamp(created_at),
+            "likes": likes,
+            "likedBy": []
+        })
+    return previews
+
+
+def fetch_feed(cursor, types=None, limit=DEFAULT_FEED_PAGE, after=None, include_replies=0, viewer_id=None):
+    """One page of discussion posts, newest first, using keyset pagination.
+
+    types filters on discussions.type in SQL. Each post carries replyCount
+    and, when include_replies > 0, its first include_replies replies under
+    "replies". likedBy only lists viewer_id (when they liked the post or
+    reply). Returns (posts, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_FEED_PAGE))
+    include_replies = max(0, min(int(include_replies), MAX_REPLY_PREVIEW))
+
+    query = """
+    SELECT diss_id, type, title, content, isAnonymous, authorId, authorName, userRole, createAt, likes
+    FROM discussions WHERE 1 = 1
+    """
+    params = []
+    if types:
+        query += f" AND type IN ({', '.join(['%s'] * len(types))})"
+        params += list(types)
+    if after:
+        created_at, post_id = decode_cursor(after)
+        query += " AND (createAt < %s OR (createAt = %s AND diss_id < %s))"
+        params += [created_at, created_at, post_id]
+    query += " ORDER BY createAt DESC, diss_id DESC LIMIT %s"
+    params.append(limit + 1)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+
+    next_cursor = encode_cursor(rows[limit - 1][8], rows[limit - 1][0]) if len(rows) > limit else None
+    rows = rows[:limit]
+    post_ids = [row[0] for row in rows]
+    if not post_ids:
+        return [], next_cursor
+    placeholders = ", ".join(["%s"] * len(post_ids))
+
+    cursor.execute(
+        f"SELECT diss_id, COUNT(*) FROM discussion_reply WHERE diss_id IN ({placeholders}) GROUP BY diss_id",
+        post_ids
+    )
+    reply_counts = dict(cursor.fetchall())
+    previews = _reply_previews(cursor, [post_id for post_id in post_ids if reply_counts.get(post_id)], include_replies)
+
+    liked = set()
+    if viewer_id:
+        cursor.execute(
+            f"SELECT diss_id, reply_id FROM discussion_like WHERE user_id = %s AND diss_id IN ({placeholders})",
+            (viewer_id, *post_ids)
+        )
+        liked = set(cursor.fetchall())
+        for post_id, replies in previews.items():
+            for reply in replies:
+                if (post_id, reply["id"]) in liked:
+                    reply["likedBy"] = [viewer_id]
+
+    return [
+        {
+            "id": post_id,
+            "type": post_type,
+            "title": title,
+            "content": content,
+            "isAnonymous": bool(is_anonymous),
+            "authorId": author_id,
+            "authorName": author_name,
+            "userRole": user_role,
+            "createdAt": created_at,
+            "likes": likes,
+            "likedBy": [viewer_id] if (post_id, '') in liked else [],
+            "replyCount": reply_counts.get(post_id, 0),
+            "replies": previews.get(post_id, [])
+        }
+        for post_id, post_type, title, content, is_anonymous, author_id, author_name, user_role, created_at, likes in rows
+    ], next_cursor
+
+
+def ensure_feed_index(cursor):
+    """Add the feed index to discussions unless it exists. Returns True if it was added."""
+    cursor.execute(
+        "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+        "AND table_name = 'discussions' AND index_name = %s LIMIT 1",
+        (FEED_INDEX,)
+    )
+    if cursor.fetchone():
+        return False
+    cursor.execute(FEED_INDEX_DDL)
+    return True
+
+
+def migrate_json_columns(cursor, post_id=None):
+    """Copy discussions.likeBy / discussions.replies JSON into the child tables.
+
+    Safe to re-run: rows that already exist are left alone. Reply ids that
+    repeat within one post (the old ids were three random digits) get a
+    suffix. Post like counters are reset to the number of distinct likers.
+    Returns (replies, likes) rows written.
+    """
+    ensure_discussion_tables(cursor)
+    query = "SELECT diss_id, likeBy, replies FROM discussions"
+    params = ()
+    if post_id is not None:
+        query += " WHERE diss_id = %s"
+        params = (post_id,)
+    cursor.execute(query, params)
+
+    reply_rows, like_rows = [], []
+    for diss_id, like_by, replies in cursor.fetchall():
+        likers = {str(user) for user in (json.loads(like_by) if like_by else [])}
+        like_rows.extend((diss_id, '', user) for user in likers)
+
+        seen = set()
+        for reply in json.loads(replies) if replies else []:
+            reply_id = str(reply.get("id") or new_reply_id())
+            if reply_id in seen:
+                reply_id = f"{reply_id}_{len(seen)}"
+            seen.add(reply_id)
+            reply_likers = {str(user) for user in reply.get("likedBy") or []}
+            reply_rows.append((
+                diss_id, reply_id, reply.get("authorId"), reply.get("authorName"), reply.get("userRole"),
+                bool(reply.get("isAnonymous")), reply.get("content"), parse_timestamp(reply.get("createdAt")),
+                len(reply_likers)
+            ))
+            like_rows.extend((diss_id, reply_id, user) for user in reply_likers)
+
+    written_replies = insert_rows(cursor, "discussion_reply", REPLY_COLUMNS, reply_rows, on_duplicate="diss_id = diss_id")
+    written_likes = insert_rows(cursor, "discussion_like", LIKE_COLUMNS, like_rows, on_duplicate="diss_id = diss_id")
+
+    # 点赞计数以明细表为准
+    count_query = """
+    UPDATE discussions d
+    SET likes = (SELECT COUNT(*) FROM discussion_like l WHERE l.diss_id = d.diss_id AND l.reply_id = '')
+    """
+    if post_id is not None:
+        cursor.execute(count_query + " WHERE d.diss_id = %s", (post_id,))
+    else:
+        cursor.execute(count_query)
+    return written_replies, written_likes
+
+
+def main():
+    """Add the feed index and move likes/replies out of the JSON columns: python -m src.discussion_store [post_id]"""
+    post_id = sys.argv[1] if len(sys.argv) > 1 else None
+    connection = get_connection()
+    if not connection:
+        print("Database connection failed.")
+        return
+    try:
+        with connection.cursor() as cursor:
+            ensure_discussion_tables(cursor)
+            if ensure_feed_index(cursor):
+                print(f"Added index {FEED_INDEX} on discussions.")
+            with transaction(connection):
+                replies, likes = migrate_json_columns(cursor, post_id)
+        print(f"Migrated {replies} reply rows and {likes} like rows for {'post ' + post_id if post_id else 'all discussions'}.")
+    finally:
+        release_connection(connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import sys
+import threading
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import insert_rows, transaction
+
+# One table for every course's roster instead of a student_list_<cid> table per course
+ENROLLMENT_DDL = """
+CREATE TABLE IF NOT EXISTS enrollment (
+    cid VARCHAR(255) NOT NULL,
+    uid VARCHAR(255) NOT NULL,
+    username VARCHAR(255) NOT NULL,
+    cname VARCHAR(255) NOT NULL,
+    grade FLOAT DEFAULT NULL,
+    `group` VARCHAR(255) DEFAULT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (cid, uid),
+    KEY idx_enrollment_group (cid, `group`),
+    KEY idx_enrollment_uid (uid)
+)
+"""
+ENROLLMENT_COLUMNS = ["cid", "uid", "username", "cname", "`group`"]
+UPSERT_CLAUSE = "username = VALUES(username), cname = VALUES(cname), `group` = VALUES(`group`)"
+
+LEGACY_TABLE_PATTERN = "student\\_list\\_%"
+MIGRATION_BATCH_SIZE = 1000
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+
+def ensure_enrollment_table(cursor):
+    """Create the enrollment table once per process (before the transaction's first write)."""
+    global _table_ready
+    if _table_ready:
+        return
+    with _table_lock:
+        if not _table_ready:
+            cursor.execute(ENROLLMENT_DDL)
+            _table_ready = True
+
+
+def student_rows(cid, cname, students):
+    """enrollment rows from the API's student dicts ({"student_id", "name", "group"}); incomplete entries are skipped."""
+    rows = []
+    for student in students:
+        student_id = student.get('student_id')
+        student_name = student.get('name')
+        if student_id and student_name:
+            rows.append((cid, student_id, student_name, cname, student.get('group', None)))
+    return rows
+
+
+def enroll_students(cursor, cid, cname, students):
+    """Add (or update) students of one course with one bulk upsert. Returns affected rows."""
+    return insert_rows(cursor, "enrollment", ENROLLMENT_COLUMNS, student_rows(cid, cname, students), on_duplicate=UPSERT_CLAUSE)
+
+
+def replace_students(cursor, cid, cname, students):
+    """Replace the whole roster of one course."""
+    cursor.execute("DELETE FROM enrollment WHERE cid = %s", (cid,))
+    return enroll_students(cursor, cid, cname, students)
+
+
+def rename_course(cursor, old_cid, new_cid, cname):
+    """Move a roster to a new course code / title."""
+    cursor.execute("UPDATE enrollment SET cid = %s, cname = %s WHERE cid = %s", (new_cid, cname, old_cid))
+
+
+def delete_course_students(cursor, cid):
+    cursor.execute("DELETE FROM enrollment WHERE cid = %s", (cid,))
+
+
+def list_students(cursor, cid):
+    """[(username, uid, group)] of one course."""
+    cursor.execute("SELECT username, uid, `group` FROM enrollment WHERE cid = %s ORDER BY uid", (cid,))
+    return cursor.fetchall()
+
+
+def list_groups(cursor, cid):
+    """Distinct non-empty groups of one course, served from the (cid, group) index."""
+    cursor.execute(
+        "SELECT DISTINCT `group` FROM enrollment WHERE cid = %s AND `group` IS NOT NULL AND `group` != '' ORDER BY `group`",
+        (cid,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def legacy_tables(cursor):
+    """Names of the old per-course student_list_<cid> / student_list_c<cid> tables."""
+    cursor.execute("SHOW TABLES LIKE %s", (LEGACY_TABLE_PATTERN,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def migrate_legacy_table(read_connection, write_connection, table, batch_size=MIGRATION_BATCH_SIZE):
+    """Stream one student_list table into enrollment in batches. Returns rows copied.
+
+    Rows are read with an unbuffered cursor on read_connection, so a large
+    roster is never held in memory, and upserted through write_connection.
+    The cid stored in each row wins over the one in the table name.
+    """
+    import pymysql
+
+    fallback_cid = table[len("student_list_"):]
+    copied = 0
+    with read_connection.cursor(pymysql.cursors.SSCursor) as reader, write_connection.cursor() as writer:
+        reader.execute(f"SELECT cid, uid, username, cname, `group` FROM `{table}`")
+        while True:
+            batch = reader.fetchmany(batch_size)
+            if not batch:
+                break
+            rows = [(cid or fallback_cid, uid, username, cname or '', group) for cid, uid, username, cname, group in batch]
+            with transaction(write_connection):
+                insert_rows(writer, "enrollment", ENROLLMENT_COLUMNS, rows, on_duplicate=UPSERT_CLAUSE)
+            copied += len(rows)
+    return copied
+
+
+def main():
+    """Copy student_list_* tables into enrollment: python -m src.enrollment [--drop]
+
+    Safe to re-run (rows are upserted). With --drop each legacy table is
+    dropped after it has been copied.
+    """
+    drop = "--drop" in sys.argv[1:]
+    read_connection = get_connection()
+    write_connection = get_connection()
+    if not read_connection or not write_connection:
+        print("Database connection failed.")
+        return
+    try:
+        with write_connection.cursor() as cursor:
+            ensure_enrollment_table(cursor)
+            tables = legacy_tables(cursor)
+        total = 0
+        for table in tables:
+            copied = migrate_legacy_table(read_connection, write_connection, table)
+            total += copied
+            print(f"{table}: {copied} rows")
+            if drop:
+                with write_connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE `{table}`")
+        print(f"Migrated {total} rows from {len(tables)} tables{' (dropped)' if drop else ''}.")
+    finally:
+        release_connection(read_connection)
+        release_connection(write_connection)
+
+
+if __name__ == "__main__":
+    main()
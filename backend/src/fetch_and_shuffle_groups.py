@@ -1,28 +1,10 @@
-from src.db_connection import release_connection, get_connection
+from src.course_cache import course_cache
 import random
 
 def fetch_and_shuffle_groups(course_id):
-    """Fetch unique groups from the course table, shuffle them, and return."""
-    connection = get_connection()
+    """Fetch unique groups of a course (through the course cache), shuffle them, and return."""
+    # Copy before shuffling: the cached list is shared
+    groups = list(course_cache.groups(course_id) or [])
+    random.shuffle(groups)
 
-    if not connection:
-        raise Exception("Failed to connect to the database.")
-
-    try:
-        cursor = connection.cursor()
-
-        # Construct the table name dynamically
-        table_name = f"student_list_c{course_id}"
-
-        # Fetch all groups from the table
-        cursor.execute(f"SELECT DISTINCT `group` FROM {table_name}")
-        rows = cursor.fetchall()
-
-        # Extract groups from the query result and shuffle them
-        groups = [row[0] for row in rows]
-        random.shuffle(groups)
-
-        return groups
-
-    finally:
-        release_connection(connection)
\ No newline at end of file
+    return groups
@@ -1,28 +1,32 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from src.LLM import ai_assistant
+from src.LLM import ai_assistant, ai_assistant_stream, llm_cache_stats, call_llm_model, stream_llm_model, model
+from src.conversation_store import conversation_store
+from src.sse import stream_reply, stream_metrics
+from src.live_events import stream_live_results, get_live_event_metrics
+from src.generate_qr_code import get_qr_code, get_qr_metrics
 from src.db_connection import release_connection, get_connection    
 from src.fetch_and_shuffle_groups import fetch_and_shuffle_groups
-from src.random_student_selector import fetch_random_usernames
+from src.random_student_selector import fetch_random_usernames, reset_session
 from src.student_importer import StudentImporter
 from src.file_processor import FileProcessor
 from src.share_link import get_open_question_results, submit_open_question_response, delete_open_question, get_all_open_questions, get_open_question, create_open_question, update_open_question, share_open_question
-from src.activities import get_all_classroom_quizzes, create_activity, view_activity, submit_answers, get_all_activities, delete_activity, grade_activity, submit_responses,get_quiz_results, update_classroom_quiz, get_classroom_quiz_responses, get_homepage_classroom_quizzes
+from src.activities import get_all_classroom_quizzes, create_activity, view_activity, submit_answers, get_all_activities, delete_activity, grade_activity, submit_responses,get_quiz_results, update_classroom_quiz, get_classroom_quiz_responses, get_homepage_classroom_quizzes, get_submission_metrics, get_grading_job, get_live_leaderboard
 
 from src.grade_statistics import upload_grades, get_grades_statistics, analyze_grades_with_ai, update_ai_analysis, delete_quiz_analysis
 from src.poll_results import get_poll_results, get_text_poll_results
-from src.discussion_api import create_discussion, like_discussion, add_reply, get_discussions
+from src.discussion_api import create_discussion, like_discussion, like_reply, add_reply, get_replies, get_discussions
 
 from src.studentpoll import submit_poll_response, create_student_poll, view_student_poll, submit_poll_answers,get_polls,update_student_poll,delete_poll
 from src.mindmap_generator import generate_mindmap
 from src.course_routes import course_routes
 from src.file_upload import upload_content, upload_assignment, upload_quiz, download_file, delete_file, list_files
-import uuid
+from src.id_generator import new_id
 from datetime import datetime
 from src.mindmap_api import mindmap_bp
 from src.scales_question import scales_question_bp
 import time
-from src.new_topic import create_new_topic, ai_assistant_chat
+from src.new_topic import create_new_topic, ai_assistant_chat, ai_assistant_chat_stream
 
 app = Flask(__name__)
 CORS(app)  # 允许所有来源的跨域请求s
@@ -30,6 +34,22 @@ CORS(app)  # 允许所有来源的跨域请求s
 student_importer = StudentImporter()
 file_processor = FileProcessor()
 
+CHAT_SYSTEM_PROMPT = "you are a teaching assistant. "
+
+def build_chat_prompt(user_input, conversation_history):
+    """Build the teaching-assistant prompt from the chat history and the new message."""
+    prompt = CHAT_SYSTEM_PROMPT
+
+    # 将历史记录加入上下文
+    if conversation_history:
+        prompt += "\n\n历史对话记录:\n"
+        for i, hist in enumerate(conversation_history, 1):
+            role = "用户" if hist['role'] == 'user' else "AI"
+            prompt += f"{i}. {role}: {hist['content']}\n"
+
+    prompt += f"\n当前用户输入: {user_input}"
+    return prompt
+
 @app.route('/api/ai/chat', methods=['POST'])
 def process_text():
     """Endpoint to process user input text and return AI response with chat history."""
@@ -46,21 +66,20 @@ def process_text():
         context = data['context']
         conversation_history = data.get('conversationHistory', [])  # Allow conversationHistory to be optional
 
-        # 构建完整的对话上下文
-        prompt = "you are a teaching assistant. "
-
-        # 将历史记录加入上下文
-        if conversation_history:
-            prompt += "\n\n历史对话记录:\n"
-            for i, hist in enumerate(conversation_history, 1):
-                role = "用户" if hist['role'] == 'user' else "AI"
-                prompt += f"{i}. {role}: {hist['content']}\n"
-
-        prompt += f"\n当前用户输入: {user_input}"
-
-        # 调用 AI 助手生成回复
-        #time.sleep(1)
-        answer = ai_assistant(prompt)
+        chat_id = data.get('chatId')
+        if chat_id:
+            # 服务端保存的对话: only the new message is sent, history comes from the store
+            uid = data.get('uid', '1')
+            messages = conversation_store.build_messages(chat_id, user_input, CHAT_SYSTEM_PROMPT, uid)
+            answer = call_llm_model(model, messages)
+            conversation_store.record_exchange(chat_id, uid, user_input, answer)
+        else:
+            # 构建完整的对话上下文
+            prompt = build_chat_prompt(user_input, conversation_history)
+
+            # 调用 AI 助手生成回复
+            #time.sleep(1)
+            answer = ai_assistant(prompt)
 
         # 返回响应
         response = {
@@ -80,6 +99,33 @@ def process_text():
             release_connection(connection)
     
 
+@app.route('/api/ai/chat/stream', methods=['POST'])
+def process_text_stream():
+    """Streaming variant of /api/ai/chat: sends the reply as Server-Sent Events."""
+    started_at = time.perf_counter()
+    data = request.get_json()
+    if not data or 'message' not in data or 'context' not in data:
+        return jsonify({"success": False, "error": "Invalid input. Please provide 'message' and 'context' in JSON body."}), 400
+
+    user_input = data['message']
+    chat_id = data.get('chatId')
+    if chat_id:
+        uid = data.get('uid', '1')
+        messages = conversation_store.build_messages(chat_id, user_input, CHAT_SYSTEM_PROMPT, uid)
+        return stream_reply(
+            "ai_chat", stream_llm_model(model, messages),
+            on_complete=lambda reply: conversation_store.record_exchange(chat_id, uid, user_input, reply),
+            started_at=started_at
+        )
+
+    prompt = build_chat_prompt(user_input, data.get('conversationHistory', []))
+    return stream_reply("ai_chat", ai_assistant_stream(prompt), started_at=started_at)
+
+@app.route('/api/ai/stream/metrics', methods=['GET'])
+def ai_stream_metrics():
+    """Endpoint to report time-to-first-token and completion/disconnect counters of streamed chats."""
+    return jsonify(stream_metrics.snapshot()), 200
+
 @app.route('/ppt_assistant', methods=['POST'])
 def ppt_process_text():
     """Endpoint to process user input text and return AI response."""
@@ -97,8 +143,9 @@ def ppt_process_text():
     text = f"{prompt}{user_input}"
 
     try:
-        # Call the AI assistant with the constructed text
-        answer = ai_assistant(text)
+        # Call the AI assistant with the constructed text; identical outlines are cached,
+        # ?refresh=1 forces a new one
+        answer = ai_assistant(text, cache_endpoint="ppt_outline", bypass_cache=request.args.get('refresh') == '1')
         return jsonify({
         "user_input": user_input,
         "content": answer,  # 推荐字段名与前端保持一致
@@ -110,22 +157,35 @@ def ppt_process_text():
 
     
 
+@app.route('/api/ai/cache/stats', methods=['GET'])
+def ai_cache_stats():
+    """Endpoint to report LLM response cache hit/miss counters."""
+    return jsonify(llm_cache_stats()), 200
+
 @app.route('/random_student_selection', methods=['POST'])
 def random_student_selection():
-    """Endpoint to shuffle groups from a course."""
+    """Endpoint to pick random students from a course.
+
+    Optional JSON fields: num_students (default 1), session_id (no repeats
+    until everyone was picked), reset (start the session's round over) and
+    weights ({username: weight}).
+    """
     data = request.get_json()
     if not data or 'course_id' not in data:
         return jsonify({"error": "Invalid input. Please provide 'course_id' in JSON body."}), 400
 
     course_id = data['course_id']
     num_students = data.get('num_students')  # Default to 1 if not provided
+    session_id = data.get('session_id')
 
     try:
-        # Fetch and shuffle groups using the shared utility function
-        name = fetch_random_usernames(course_id, num_students)
-
+        if session_id and data.get('reset'):
+            reset_session(course_id, session_id)
+        name = fetch_random_usernames(course_id, num_students, session_id=session_id, weights=data.get('weights'))
 
         return jsonify({"students": name})
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -157,8 +217,8 @@ def import_students():
         return jsonify({"error": "No file selected"}), 400
 
     try:
-        student_importer.import_students(file)
-        return jsonify({"message": "Student data imported successfully"}), 200
+        report = student_importer.import_students(file)
+        return jsonify({"message": "Student data imported successfully", **report}), 200
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
     except ConnectionError as ce:
@@ -184,7 +244,7 @@ def upload_course_material():
         # Generate PPT outline using the LLM
         prompt = "You are a PPT AI assistant plugin designed to help teachers generate courseware PPTs and related content. Now, you are given a piece of text, and your task is to generate a PPT outline. You must clearly label the content of each page and strictly adhere to the original text, Only generate the PPT outline, with no extra content. and use English."
         text = f"{prompt}\n{extracted_text}"
-        ppt_outline = ai_assistant(text)
+        ppt_outline = ai_assistant(text, cache_endpoint="ppt_outline", bypass_cache=request.args.get('refresh') == '1')
 
         return jsonify({"ppt_outline": ppt_outline}), 200
     except ValueError as ve:
@@ -197,25 +257,12 @@ def create_new_topic():
     """Endpoint to create a new topic with a generated chatId."""
     # Default user identifier for single-user input
     uid = "1"
-    chat_id = str(uuid.uuid4())  # Generate a new chatId
+    chat_id = new_id("chat")  # Generate a new chatId
     welcome_message = "Welcome to your new topic!"  # Optional welcome message
 
     try:
-        # Get database connection
-        connection = get_connection()
-        cursor = connection.cursor()
-
-        # Insert the welcome message into chat_history
-        cursor.execute(
-            """
-            INSERT INTO chat_history (uid, chat_id, chat_context, chattime)
-            VALUES (%s, %s, %s, %s)
-            """,
-            (uid, chat_id, welcome_message, datetime.now())
-        )
-
-        # Commit the transaction
-        connection.commit()
+        # Persist the welcome message into chat_history as the first turn
+        conversation_store.start(chat_id, uid, welcome_message)
 
         return jsonify({
             "chatId": chat_id,
@@ -223,16 +270,8 @@ def create_new_topic():
         }), 201
 
     except Exception as e:
-        if connection:
-            connection.rollback()
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            release_connection(connection)
-
 # Register the share link endpoints
 app.add_url_rule('/api/open-questions/create', view_func=create_open_question, methods=['POST'])
 app.add_url_rule('/api/open-questions/<share_id>', view_func=get_open_question, methods=['GET'])
@@ -258,8 +297,20 @@ app.add_url_rule('/api/classroom_quiz/<classroom_quiz_id>', view_func=view_activ
 app.add_url_rule('/api/classroom_quiz/<classroom_quiz_id>', view_func=submit_answers, methods=['POST'])
 app.add_url_rule('/api/classroom_quiz/<classroom_quiz_id>', view_func=delete_activity, methods=['DELETE'])
 app.add_url_rule('/api/classroom_quiz/<classroom_quiz_id>/grade', view_func=grade_activity, methods=['POST'])
+app.add_url_rule('/api/grading_jobs/<job_id>', view_func=get_grading_job, methods=['GET'])
+app.add_url_rule('/api/classroom_quiz/<classroom_quiz_id>/leaderboard', view_func=get_live_leaderboard, methods=['GET'])
+
+# Live results pushed over SSE (kind: poll, open_question, scales, quiz)
+app.add_url_rule('/api/live/<kind>/<activity_id>/events', view_func=stream_live_results, methods=['GET'])
+app.add_url_rule('/api/live/metrics', view_func=get_live_event_metrics, methods=['GET'])
+
+# QR codes, rendered lazily and cached
+app.add_url_rule('/api/qr', view_func=get_qr_code, methods=['GET'])
+app.add_url_rule('/api/qr/metrics', view_func=get_qr_metrics, methods=['GET'])
+
 app.add_url_rule('/api/classroom_quiz/<classroom_quiz_id>/responses', view_func=submit_responses, methods=['POST'])
 app.add_url_rule('/api/classroom_quiz/<classroom_quiz_id>/results', view_func=get_quiz_results, methods=['GET'])
+app.add_url_rule('/api/submissions/metrics', view_func=get_submission_metrics, methods=['GET'])
 app.add_url_rule('/api/classroom_quiz', view_func=get_all_classroom_quizzes, methods=['GET'])
 app.add_url_rule('/api/classroom_quiz/<quizId>/responses', view_func=get_classroom_quiz_responses, methods=['GET'])
 
@@ -315,6 +366,8 @@ app.add_url_rule('/api/polls/delete/<poll_id>', view_func=delete_poll, methods=[
 app.add_url_rule('/api/discussions/create', view_func=create_discussion, methods=['POST'])
 app.add_url_rule('/api/discussions/<post_id>/like', view_func=like_discussion, methods=['PUT'])
 app.add_url_rule('/api/discussions/<post_id>/replies', view_func=add_reply, methods=['POST'])
+app.add_url_rule('/api/discussions/<post_id>/replies', view_func=get_replies, methods=['GET'])
+app.add_url_rule('/api/discussions/<post_id>/replies/<reply_id>/like', view_func=like_reply, methods=['PUT'])
 app.add_url_rule('/api/discussions', view_func=get_discussions, methods=['GET'])
 
 # Register the mindmap blueprint
@@ -326,6 +379,7 @@ app.register_blueprint(scales_question_bp)
 # Register the new topic and AI assistant chat endpoints
 app.add_url_rule('/api/ass_topic/new', view_func=create_new_topic, methods=['POST'])
 app.add_url_rule('/api/ai_ass/chat', view_func=ai_assistant_chat, methods=['POST'])
+app.add_url_rule('/api/ai_ass/chat/stream', view_func=ai_assistant_chat_stream, methods=['POST'])
 
 if __name__ == '__main__':
     app.run("0.0.0.0", port=3000, debug=True)
\ No newline at end of file
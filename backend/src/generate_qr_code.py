@@ -1,28 +1,169 @@
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from flask import Response, request, jsonify, url_for
 import qrcode
+import qrcode.image.svg
 
-def generate_qr_code(url, output_file):
-    """Generate a QR code for the given URL and save it as an image file."""
-    try:
-        # Create a QR code object
-        qr = qrcode.QRCode(
-            version=10,  # Controls the size of the QR Code
-            error_correction=qrcode.constants.ERROR_CORRECT_L,  # Error correction level
-            box_size=10,  # Size of each box in the QR code grid
-            border=4,  # Thickness of the border (minimum is 4)
-        )
-
-        # Add the URL to the QR code
-        qr.add_data(url)
-        qr.make(fit=True)
-
-        # Create an image of the QR code
+# Rendered codes are kept in memory (LRU, bounded in bytes) and served with
+# immutable HTTP caching: the image for a given URL never changes, so the
+# browser/CDN asks once and nothing is written to static/.
+QR_CACHE_MAX_BYTES = int(os.getenv("QR_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+# Render in a background thread as soon as a link is created, so the first scan is a cache hit
+QR_PRERENDER = os.getenv("QR_PRERENDER", "1") == "1"
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+DEFAULT_BOX_SIZE = 10
+MAX_URL_LENGTH = 2048
+# Hosts (besides this server's own) whose URLs may be encoded, comma separated
+QR_ALLOWED_HOSTS = {host.strip() for host in os.getenv("QR_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+
+def render_qr(url, fmt="png", box_size=DEFAULT_BOX_SIZE):
+    """Encode url as a QR code and return the image bytes.
+
+    The version (grid size) is picked automatically as the smallest that
+    fits the URL, instead of always using version 10.
+    """
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    qr = qrcode.QRCode(
+        version=None,  # 自动选择最小的版本
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=box_size,
+        border=4,  # Thickness of the border (minimum is 4)
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+
+    if fmt == "svg":
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+    else:
         img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer)
+    return buffer.getvalue()
+
+
+def qr_key(url, fmt="png", box_size=DEFAULT_BOX_SIZE):
+    """Cache key and ETag of one rendering: a hash of everything that affects the bytes."""
+    return hashlib.sha256(f"{fmt}|{box_size}|{url}".encode("utf-8")).hexdigest()[:32]
+
+
+class QrCache:
+    """LRU of rendered QR images, evicting the least recently used once max_bytes is exceeded."""
+
+    def __init__(self, max_bytes=QR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.metrics["misses"] += 1
+                return None
+            self._images.move_to_end(key)
+            self.metrics["hits"] += 1
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            if key in self._images:
+                self._size -= len(self._images.pop(key))
+            self._images[key] = image
+            self._size += len(image)
+            while self._size > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._size -= len(evicted)
+                self.metrics["evictions"] += 1
+
+    def get_metrics(self):
+        with self._lock:
+            return {**self.metrics, "entries": len(self._images), "bytes": self._size}
+
+
+qr_cache = QrCache()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="qr")
+
+
+def get_or_render(url, fmt="png", box_size=DEFAULT_BOX_SIZE):
+    """Return (key, image bytes), rendering and caching on a miss."""
+    key = qr_key(url, fmt, box_size)
+    image = qr_cache.get(key)
+    if image is None:
+        image = render_qr(url, fmt, box_size)
+        qr_cache.put(key, image)
+    return key, image
+
 
-        # Save the image to the specified file
-        img.save(output_file)
-        print(f"QR code generated and saved as {output_file}")
+def _prerender(url):
+    try:
+        get_or_render(url)
+    except Exception as e:
+        print(f"QR prerender failed for {url}: {e}")
+
+
+def qr_code_url(url, fmt="png"):
+    """Path of the QR endpoint for url; with QR_PRERENDER the PNG is rendered in the background right away."""
+    if QR_PRERENDER:
+        _executor.submit(_prerender, url)
+    return url_for('get_qr_code', url=url, format=fmt)
+
+
+def _is_allowed(url):
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or len(url) > MAX_URL_LENGTH:
+        return False
+    return parsed.netloc == request.host or parsed.netloc in QR_ALLOWED_HOSTS
+
+
+def get_qr_code():
+    """Endpoint: QR image for ?url=..., as png (default) or svg (?format=svg), optional ?size= box size.
+
+    Responses carry an ETag and Cache-Control immutable; a matching
+    If-None-Match is answered 304 without rendering.
+    """
+    url = request.args.get('url', '')
+    fmt = request.args.get('format', 'png').lower()
+    try:
+        box_size = max(1, min(int(request.args.get('size', DEFAULT_BOX_SIZE)), 40))
+    except ValueError:
+        return jsonify({"error": "size must be an integer."}), 400
+    if fmt not in QR_FORMATS:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+    if not _is_allowed(url):
+        return jsonify({"error": "url must be an http(s) link to this site."}), 400
+
+    key = qr_key(url, fmt, box_size)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.if_none_match.contains(key):
+        return Response(status=304, headers=headers)
+
+    try:
+        _, image = get_or_render(url, fmt, box_size)
     except Exception as e:
-        print(f"Error generating QR code: {e}")
+        return jsonify({"error": str(e)}), 500
+    return Response(image, mimetype=QR_FORMATS[fmt], headers=headers)
+
+
+def get_qr_metrics():
+    """Endpoint: QR cache hit/miss/eviction counters."""
+    return jsonify(qr_cache.get_metrics()), 200
+
+
+def generate_qr_code(url, output_file):
+    """Generate a QR code for the given URL and save it as an image file (png or svg by extension)."""
+    fmt = "svg" if output_file.lower().endswith(".svg") else "png"
+    with open(output_file, "wb") as f:
+        f.write(render_qr(url, fmt))
+    print(f"QR code generated and saved as {output_file}")
 
 def main():
     # Input URL from the user
@@ -33,4 +174,4 @@ def main():
     generate_qr_code(url, output_file)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,8 +1,8 @@
-import os
 import pandas as pd
 from flask import Flask, request, jsonify
 from werkzeug.utils import secure_filename
-import uuid
+from src.id_generator import new_id
+from src.upload_reader import read_numeric_columns, SUPPORTED_EXTENSIONS
 from flask_caching import Cache
 from src.db_connection import get_connection, release_connection
 import json
@@ -11,11 +11,7 @@ from decimal import Decimal
 
 app = Flask(__name__)
 
-UPLOAD_FOLDER = './uploads'
-ALLOWED_EXTENSIONS = {'xlsx'}
-
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+ALLOWED_EXTENSIONS = SUPPORTED_EXTENSIONS
 
 def allowed_file(filename):
     """Check if the file is allowed."""
@@ -83,21 +79,19 @@ def upload_grades():
         return jsonify({"error": "No file selected"}), 400
 
     if not allowed_file(file.filename):
-        return jsonify({"error": "Invalid file type. Only .xlsx files are allowed."}), 400
+        return jsonify({"error": "Invalid file type. Only .xlsx and .csv files are allowed."}), 400
 
     filename = secure_filename(file.filename)
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
 
     try:
-        # Read the Excel file
-        df = pd.read_excel(filepath)
+        # Parse the upload from the request stream, keeping only the score columns
+        df = read_numeric_columns(file, lambda name: name == 'total_score' or name.startswith('question_'))
 
         # Calculate statistics
         stats = calculate_statistics(df)
 
         # Generate a unique quiz analysis ID
-        quiz_anal_id = str(uuid.uuid4())
+        quiz_anal_id = new_id("qa")
 
         # Cache the statistics with the generated ID
         #cache.set(quiz_anal_id, stats)
@@ -157,9 +151,6 @@ def upload_grades():
         return jsonify({"error": str(ve)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        # Remove the uploaded file
-        os.remove(filepath)
 
 @app.route('/upload_grades/<quiz_anal_id>', methods=['GET'])
 def get_grades_statistics(quiz_anal_id):
@@ -294,8 +285,8 @@ def analyze_grades_with_ai(quiz_anal_id):
             f"{json.dumps(stats, ensure_ascii=False)}"
         )
 
-        # Call AI model for analysis
-        ai_analysis = ai_assistant(prompt)
+        # Call AI model for analysis; unchanged statistics reuse the cached analysis (?refresh=1 bypasses it)
+        ai_analysis = ai_assistant(prompt, cache_endpoint="grade_analysis", bypass_cache=request.args.get('refresh') == '1')
 
         # Update the database with AI analysis
         with connection.cursor() as cursor:
@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import time
+import random
+import numpy as np
+import pandas as pd
+
+# Partial credit for questions with more than one correct option:
+#   none              - full points only for the exact set
+#   proportional      - points * correct picks / correct options, nothing if any wrong pick
+#   right_minus_wrong - points * (correct picks - wrong picks) / correct options, floored at 0
+PARTIAL_CREDIT = os.getenv("GRADING_PARTIAL_CREDIT", "none")
+PARTIAL_CREDIT_RULES = ("none", "proportional", "right_minus_wrong")
+
+OBJECTIVE_TYPES = ['true/false', 'truefalse', 'true-false', 'multiplechoice', 'multiple-choice',
+                   'single choice', 'single-choice', 'multiple choice']
+SHORT_ANSWER_TYPES = ['shortanswer', 'short answer', 'short-answer', 'text']
+
+# Bit 63 stands for "a choice that is not in the key or the options", i.e. always wrong
+OTHER_BIT = 63
+MAX_CHOICES = 63
+
+
+def _normalise(value):
+    return str(value).strip().lower()
+
+
+def _position(token):
+    """The option position a token names ("2", or "2.0" from a JSON number), else None."""
+    try:
+        value = float(token)
+    except ValueError:
+        return None
+    return int(value) if value.is_integer() else None
+
+
+def parse_choices(raw, unique=True):
+    """Split a stored answer into normalised choice tokens.
+
+    Accepts JSON scalars and arrays ('"A"', '[0, 2]'), Python-style tuples
+    and plain comma separated text, as answers and keys are stored in all of
+    these forms.
+    """
+    if raw is None:
+        return []
+    value = raw
+    if isinstance(raw, (bytes, bytearray)):
+        value = raw.decode("utf-8")
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = json.loads(text)
+        except ValueError:
+            value = [part for part in text.strip("[]()").split(",")]
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    tokens = []
+    for item in value:
+        token = _normalise(item).strip("'\"")
+        if token and not (unique and token in tokens):
+            tokens.append(token)
+    return tokens
+
+
+def popcount64(values):
+    """Number of set bits of every element of a uint64 array."""
+    as_bytes = np.ascontiguousarray(values, dtype=np.uint64).view(np.uint8)
+    return np.unpackbits(as_bytes).reshape(-1, 64).sum(axis=1, dtype=np.int64)
+
+
+class AnswerKey:
+    """A quiz's objective answer key, loaded once and used to score answers in bulk.
+
+    Each choice of a question gets one bit, so an answer (single value or a
+    multi-select set) becomes a uint64 mask and a whole quiz's submissions
+    are scored with a few array operations instead of per-row string
+    comparisons.
+    """
+
+    def __init__(self, questions, partial_credit=PARTIAL_CREDIT):
+        """questions: iterable of (question_id, question_type, options, true_answer, points)."""
+        if partial_credit not in PARTIAL_CREDIT_RULES:
+            raise ValueError(f"Unknown partial credit rule: {partial_credit}")
+        self.partial_credit = partial_credit
+        self.question_index = {}
+        self.question_ids = []
+        self._modes = []
+        self._vocab = []
+        correct, points = [], []
+
+        for question_id, question_type, options, true_answer, question_points in questions:
+            if _normalise(question_type or "") in SHORT_ANSWER_TYPES:
+                continue
+            mode, vocab = self._choice_vocab(parse_choices(options, unique=False)[:MAX_CHOICES], parse_choices(true_answer))
+            mask = 0
+            for token in parse_choices(true_answer):
+                if mode == "index":
+                    token = str(_position(token))
+                if token not in vocab:
+                    if mode == "index" or len(set(vocab.values())) >= MAX_CHOICES:
+                        continue
+                    vocab[token] = len(set(vocab.values()))
+                mask |= 1 << vocab[token]
+
+            self.question_index[str(question_id)] = len(correct)
+            self.question_ids.append(str(question_id))
+            self._modes.append(mode)
+            self._vocab.append(vocab)
+            correct.append(mask)
+            points.append(float(question_points or 0))
+
+        self.correct = np.array(correct, dtype=np.uint64)
+        self.points = np.array(points, dtype=np.float64)
+        self.correct_count = popcount64(self.correct) if len(correct) else np.zeros(0, dtype=np.int64)
+        self._encoded = {}
+
+    @staticmethod
+    def _choice_vocab(options, key_tokens):
+        """Decide once how a question's key and answers are read; return (mode, token -> option number).
+
+        "index": every key token is an option position ("0", "1", ...), so
+        answers are read as positions too. "text": tokens are option texts
+        (or, without options, the key's own tokens). A token never means both,
+        which matters when the option texts are themselves numbers.
+        """
+        positions = [_position(token) for token in key_tokens]
+        if options and positions and all(p is not None and 0 <= p < len(options) for p in positions):
+            return "index", {str(i): i for i in range(len(options))}
+        vocab = {}
+        for i, option in enumerate(options):
+            vocab.setdefault(option, i)
+        return "text", vocab
+
+    def __contains__(self, question_id):
+        return str(question_id) in self.question_index
+
+    @property
+    def max_points(self):
+        return float(self.points.sum())
+
+    def encode(self, question_id, raw_answer):
+        """Return (question index, answer bitmask) for one stored answer."""
+        q = self.question_index[str(question_id)]
+        cache_key = (q, raw_answer if isinstance(raw_answer, (str, int, float, type(None))) else repr(raw_answer))
+        mask = self._encoded.get(cache_key)
+        if mask is None:
+            vocab = self._vocab[q]
+            whole = _normalise(raw_answer).strip("'\"") if isinstance(raw_answer, str) else None
+            if self._modes[q] == "text" and whole in vocab:
+                # Option text that itself contains commas
+                mask = 1 << vocab[whole]
+            else:
+                mask = 0
+                for token in parse_choices(raw_answer):
+                    if self._modes[q] == "index":
+                        token = str(_position(token))
+                    mask |= 1 << vocab.get(token, OTHER_BIT)
+            self._encoded[cache_key] = mask
+        return q, mask
+
+    def score_masks(self, question_idx, answer_masks, partial_credit=None):
+        """Points earned by each (question index, answer mask) pair, as a float array."""
+        partial_credit = partial_credit or self.partial_credit
+        question_idx = np.asarray(question_idx, dtype=np.int64)
+        answers = np.asarray(answer_masks, dtype=np.uint64)
+        if not len(answers):
+            return np.zeros(0, dtype=np.float64)
+        correct = self.correct[question_idx]
+        points = self.points[question_idx]
+
+        exact = (answers == correct) & (correct != 0)
+        if partial_credit == "none":
+            return np.where(exact, points, 0.0)
+
+        needed = self.correct_count[question_idx]
+        hits = popcount64(answers & correct)
+        wrong = popcount64(answers & ~correct)
+        multi = needed > 1
+        if partial_credit == "proportional":
+            fraction = np.where(wrong == 0, hits / np.maximum(needed, 1), 0.0)
+        else:
+            fraction = np.clip((hits - wrong) / np.maximum(needed, 1), 0.0, 1.0)
+        return np.where(multi, points * fraction, np.where(exact, points, 0.0))
+
+    def encode_rows(self, student_names, question_ids, raw_answers):
+        """Encode parallel lists of answers into (student names, student codes, question indices, masks).
+
+        Rows are factorised into integer codes first, so each distinct
+        (question, answer) pair is parsed once however many students gave it.
+        Answers to questions not in the key are dropped; when a student
+        answered the same question more than once, only the last answer is kept.
+        """
+        students, names = pd.factorize(pd.Series(student_names, dtype=object))
+        empty = np.zeros(0, dtype=np.int64)
+        if not len(students):
+            return names, empty, empty, np.zeros(0, dtype=np.uint64)
+        question_codes, question_values = pd.factorize(pd.Series(question_ids, dtype=object))
+        answer_codes, answer_values = pd.factorize(pd.Series(raw_answers, dtype=object), use_na_sentinel=False)
+        pairs, pair_values = pd.factorize(question_codes * len(answer_values) + answer_codes)
+
+        pair_question = np.full(len(pair_values), -1, dtype=np.int64)
+        pair_mask = np.zeros(len(pair_values), dtype=np.uint64)
+        for code, value in enumerate(pair_values):
+            question_id = str(question_values[value // len(answer_values)])
+            if question_id in self.question_index:
+                pair_question[code], pair_mask[code] = self.encode(question_id, answer_values[value % len(answer_values)])
+
+        question_idx = pair_question[pairs]
+        rows = np.flatnonzero(question_idx >= 0)
+        # Keep the last row of each (student, question)
+        slot = pd.Series(students[rows] * len(self.points) + question_idx[rows])
+        rows = rows[~slot.duplicated(keep="last").to_numpy()]
+        return names, students[rows], question_idx[rows], pair_mask[pairs[rows]]
+
+    def score_encoded(self, encoded, partial_credit=None):
+        """Total points per student for the output of encode_rows."""
+        names, students, question_idx, masks = encoded
+        scores = self.score_masks(question_idx, masks, partial_credit)
+        sums = np.bincount(students, weights=scores, minlength=len(names))
+        totals = {}
+        for name, total in zip(names, sums):
+            total = round(float(total), 2)
+            totals[name] = int(total) if total.is_integer() else total
+        return totals
+
+    def answer_points(self, question_ids, raw_answers):
+        """Points for each answer of one submission as {question_id: points}; unknown questions are skipped."""
+        pairs = [(str(q), raw) for q, raw in zip(question_ids, raw_answers) if str(q) in self.question_index]
+        if not pairs:
+            return {}
+        encoded = [self.encode(q, raw) for q, raw in pairs]
+        scores = self.score_masks([q for q, _ in encoded], np.array([mask for _, mask in encoded], dtype=np.uint64))
+        return {q: float(points) for (q, _), points in zip(pairs, scores)}
+
+    def score(self, student_names, question_ids, raw_answers):
+        """Total objective points per student for parallel lists of answers."""
+        return self.score_encoded(self.encode_rows(student_names, question_ids, raw_answers))
+
+
+def load_answer_key(cursor, quiz_id, partial_credit=PARTIAL_CREDIT):
+    """Read a quiz's questions once and build its AnswerKey."""
+    cursor.execute(
+        "SELECT question_id, question_type, options, true_answer, points FROM questions WHERE quiz_id = %s",
+        (quiz_id,)
+    )
+    return AnswerKey(cursor.fetchall(), partial_credit)
+
+
+def self_test():
+    """Scoring checks, including option texts that look like option positions: python -m src.grading_engine test"""
+    numeric = '["1", "2", "3", "4"]'
+    # Key "1" is position 1 (option "2"): answers are positions too, so "0" is wrong
+    key = AnswerKey([("q", "MultipleChoice", numeric, "1", 5)])
+    assert key.score(["right", "wrong"], ["q", "q"], ["1", "0"]) == {"right": 5, "wrong": 0}
+    # Key "7" is not a position, so key and answers are option texts
+    key = AnswerKey([("q", "MultipleChoice", '["5", "6", "7"]', '"7"', 5)])
+    assert key.score(["right", "wrong"], ["q", "q"], ["7", "2"]) == {"right": 5, "wrong": 0}
+    # Multi-select by position, JSON numbers in either order
+    key = AnswerKey([("q", "MultipleChoice", numeric, "[0, 2]", 4)], partial_credit="proportional")
+    assert key.score(["all", "half", "wrong"], ["q", "q", "q"], ["[2.0, 0]", "[0]", "[0, 1]"]) == {"all": 4, "half": 2, "wrong": 0}
+    # Text keys without options (true/false)
+    key = AnswerKey([("t", "True/False", None, '"true"', 1)])
+    assert key.score(["right", "wrong"], ["t", "t"], [" True", "false"]) == {"right": 1, "wrong": 0}
+    print("AnswerKey self-test passed.")
+
+
+def main():
+    """Benchmark the per-row string comparison against AnswerKey on 10k synthetic submissions."""
+    if len(sys.argv) > 1 and sys.argv[1] == "test":
+        self_test()
+        return
+    submissions = 10000
+    questions = 20
+    rng = random.Random(5241)
+
+    key_rows = []
+    for q in range(questions):
+        if q % 4 == 3:
+            key_rows.append((q, "MultipleChoice", '["A", "B", "C", "D", "E"]', json.dumps(sorted(rng.sample(range(5), 2))), 2))
+        elif q % 4 == 2:
+            key_rows.append((q, "True/False", None, '"true"', 1))
+        else:
+            key_rows.append((q, "MultipleChoice", '["A", "B", "C", "D"]', str(rng.randrange(4)), 1))
+
+    students, question_ids, answers = [], [], []
+    for s in range(submissions):
+        for q, _, _, true_answer, _ in key_rows:
+            if q % 4 == 3:
+                answer = json.dumps(sorted(rng.sample(range(5), rng.choice([1, 2, 2, 3]))))
+            elif q % 4 == 2:
+                answer = rng.choice(["true", "false"])
+            else:
+                answer = str(rng.randrange(4))
+            students.append(f"student_{s}")
+            question_ids.append(q)
+            answers.append(answer)
+
+    truth = {q: true_answer for q, _, _, true_answer, _ in key_rows}
+    points = {q: p for q, _, _, _, p in key_rows}
+    start = time.perf_counter()
+    loop_totals = {}
+    for student, q, answer in zip(students, question_ids, answers):
+        loop_totals.setdefault(student, 0)
+        if str(answer).strip().lower() == str(truth[q]).strip().lower().strip("[]"):
+            loop_totals[student] += points[q]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    answer_key = AnswerKey(key_rows)
+    encoded = answer_key.encode_rows(students, question_ids, answers)
+    encode_seconds = time.perf_counter() - start
+
+    print(f"=== {submissions} submissions x {questions} questions ({len(answers)} answers) ===")
+    print(f"string loop (old)           : {loop_seconds * 1000:.1f} ms (mean score {sum(loop_totals.values()) / len(loop_totals):.2f}; quoted and multi-select keys never match)")
+    print(f"AnswerKey load + encode     : {encode_seconds * 1000:.1f} ms")
+    for rule in PARTIAL_CREDIT_RULES:
+        start = time.perf_counter()
+        totals = answer_key.score_encoded(encoded, rule)
+        seconds = time.perf_counter() - start
+        mean = sum(totals.values()) / len(totals)
+        print(f"score pass {rule:<17}: {seconds * 1000:.1f} ms (mean score {mean:.2f})")
+
+
+if __name__ == "__main__":
+    main()
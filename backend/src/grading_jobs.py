@@ -0,0 +1,300 @@
+import os
+import re
+import json
+from src.id_generator import new_id
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import insert_rows, transaction
+from src.LLM import call_llm_model, model
+from src.grading_engine import load_answer_key, OBJECTIVE_TYPES, SHORT_ANSWER_TYPES
+from src.leaderboard import store_leaderboard, quiz_max_points, DEFAULT_RANKING
+from src.live_leaderboard import live_leaderboard
+
+# Short answers sent to the LLM per evaluation call
+ANSWER_CHUNK_SIZE = int(os.getenv("GRADING_CHUNK_SIZE", 20))
+# Grading jobs run concurrently per process
+MAX_GRADING_WORKERS = int(os.getenv("GRADING_WORKERS", 2))
+# A queued/running job with no progress for this long is treated as dead (e.g. the worker restarted)
+JOB_STALE_SECONDS = int(os.getenv("GRADING_JOB_STALE_SECONDS", 1800))
+
+GRADING_TABLES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS grading_job (
+        job_id VARCHAR(64) PRIMARY KEY,
+        quiz_id VARCHAR(64) NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        total_answers INT NOT NULL DEFAULT 0,
+        graded_answers INT NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_grading_job_quiz (quiz_id, created_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS grading_answer_result (
+        quiz_id VARCHAR(64) NOT NULL,
+        student_name VARCHAR(255) NOT NULL,
+        question_id VARCHAR(64) NOT NULL,
+        answer_hash CHAR(64) NOT NULL,
+        is_correct TINYINT(1) NOT NULL,
+        job_id VARCHAR(64),
+        PRIMARY KEY (quiz_id, student_name, question_id)
+    )
+    """,
+]
+
+_executor = ThreadPoolExecutor(max_workers=MAX_GRADING_WORKERS, thread_name_prefix="grading")
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+
+def ensure_grading_tables(cursor):
+    """Create the job and per-answer result tables once per process."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if not _tables_ready:
+            for ddl in GRADING_TABLES_DDL:
+                cursor.execute(ddl)
+            _tables_ready = True
+
+
+def _answer_hash(question_text, true_answer, answer):
+    """Fingerprint of what the LLM judged, so a changed answer or key is re-graded."""
+    payload = json.dumps([question_text, true_answer, answer], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _parse_verdicts(ai_response, count):
+    """Read the LLM's JSON array of {"index", "correct"} into a list of booleans (None = missing)."""
+    text = (ai_response or "").strip()
+    # 去掉 ```json ... ``` 代码块包裹
+    match = re.search(r"\[.*\]", text, re.S)
+    if not match:
+        raise ValueError(f"AI response is not a JSON array: {text[:200]}")
+    verdicts = [None] * count
+    for item in json.loads(match.group(0)):
+        index = item.get("index")
+        if isinstance(index, int) and 0 <= index < count:
+            verdicts[index] = bool(item.get("correct"))
+    return verdicts
+
+
+def evaluate_short_answers(question_text, true_answer, answers):
+    """Judge a chunk of answers to one question with a single LLM call."""
+    numbered = "\n".join(f"{i}. {json.dumps(answer, ensure_ascii=False)}" for i, answer in enumerate(answers))
+    messages = [
+        {"role": "system", "content": "You grade short-answer quiz responses. Reply with JSON only."},
+        {"role": "user", "content": (
+            f"Question: {question_text}\n"
+            f"Reference answer: {true_answer}\n"
+            f"Student answers:\n{numbered}\n"
+            "Decide whether each numbered answer is correct. "
+            'Return a JSON array like [{"index": 0, "correct": true}] with one element per answer.'
+        )},
+    ]
+    return _parse_verdicts(call_llm_model(model, messages, temperature=0), len(answers))
+
+
+def _update_job(job_id, **fields):
+    connection = get_connection()
+    if not connection:
+        return
+    try:
+        with connection.cursor() as cursor:
+            assignments = ", ".join(f"{name} = %s" for name in fields)
+            cursor.execute(f"UPDATE grading_job SET {assignments} WHERE job_id = %s", (*fields.values(), job_id))
+        connection.commit()
+    finally:
+        release_connection(connection)
+
+
+def create_job(quiz_id):
+    """Register a grading job for the quiz, or return the one already queued/running."""
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError("Database connection failed.")
+    try:
+        with connection.cursor() as cursor, transaction(connection):
+            ensure_grading_tables(cursor)
+            cursor.execute(
+                "SELECT job_id FROM grading_job WHERE quiz_id = %s AND status IN ('queued', 'running') "
+                "AND updated_at > NOW() - INTERVAL %s SECOND ORDER BY created_at DESC LIMIT 1",
+                (quiz_id, JOB_STALE_SECONDS)
+            )
+            row = cursor.fetchone()
+            if row:
+                return row[0], False
+            job_id = new_id("job")
+            cursor.execute(
+                "INSERT INTO grading_job (job_id, quiz_id, status) VALUES (%s, %s, 'queued')",
+                (job_id, quiz_id)
+            )
+            return job_id, True
+    finally:
+        release_connection(connection)
+
+
+def get_job(job_id):
+    """Return the job status/progress dict, or None if it does not exist."""
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError("Database connection failed.")
+    try:
+        with connection.cursor() as cursor:
+            ensure_grading_tables(cursor)
+            cursor.execute(
+                """
+                SELECT job_id, quiz_id, status, total_answers, graded_answers, error, created_at, updated_at
+                FROM grading_job WHERE job_id = %s
+                """,
+                (job_id,)
+            )
+            row = cursor.fetchone()
+    finally:
+        release_connection(connection)
+    if not row:
+        return None
+    total, graded = row[3], row[4]
+    return {
+        "jobId": row[0],
+        "quizId": row[1],
+        "status": row[2],
+        "totalAnswers": total,
+        "gradedAnswers": graded,
+        "progress": round(graded / total, 4) if total else (1.0 if row[2] == "completed" else 0.0),
+        "error": row[5],
+        "createdAt": row[6].isoformat() if row[6] else None,
+        "updatedAt": row[7].isoformat() if row[7] else None,
+    }
+
+
+def grade_quiz(quiz_id, job_id, ranking=DEFAULT_RANKING):
+    """Grade every answer of the quiz, persist the leaderboard and return it.
+
+    Only each student's last answer to a question counts (resubmissions
+    replace earlier answers). Objective questions are scored in one pass by
+    the quiz's AnswerKey (src.grading_engine). Short answers are grouped by
+    question and judged ANSWER_CHUNK_SIZE at a time with one LLM call per
+    chunk; each chunk's verdicts are saved to grading_answer_result as soon
+    as they arrive, so re-running a failed job only re-asks the LLM for the
+    answers that were not graded yet (or whose text changed since).
+    Returns None when the quiz has no answers.
+    """
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError("Database connection failed.")
+    try:
+        with connection.cursor() as cursor:
+            ensure_grading_tables(cursor)
+            cursor.execute("""
+                SELECT a.student_name, a.question_id, a.answer_content, a.question_type,
+                       q.true_answer, q.points, q.question_text
+                FROM answers a
+                JOIN questions q ON a.quiz_id = q.quiz_id AND a.question_id = q.question_id
+                WHERE a.quiz_id = %s
+                ORDER BY a.student_name, a.question_id, a.submitted_at
+            """, (quiz_id,))
+            # Rows are ordered by submitted_at within (student, question): keep the last one
+            latest = {}
+            for row in cursor.fetchall():
+                latest[(row[0], row[1])] = row
+            all_answers = list(latest.values())
+            if not all_answers:
+                return None
+            answer_key = load_answer_key(cursor, quiz_id)
+            max_points = quiz_max_points(cursor, quiz_id)
+
+            cursor.execute(
+                "SELECT student_name, question_id, answer_hash, is_correct FROM grading_answer_result WHERE quiz_id = %s",
+                (quiz_id,)
+            )
+            stored = {(row[0], row[1]): (row[2], bool(row[3])) for row in cursor.fetchall()}
+        connection.commit()
+
+        user_results = {}
+        pending = {}  # question_id -> (question_text, true_answer, points, [(student, answer, hash)])
+        objective = ([], [], [])  # student names, question ids, answers
+        graded = 0
+        for student_name, question_id, user_answer, question_type, true_answer, points, question_text in all_answers:
+            user_results.setdefault(student_name, 0)
+            normalized_question_type = (question_type or "").lower()
+
+            if normalized_question_type in OBJECTIVE_TYPES:
+                objective[0].append(student_name)
+                objective[1].append(question_id)
+                objective[2].append(user_answer)
+                graded += 1
+            elif normalized_question_type in SHORT_ANSWER_TYPES:
+                answer_hash = _answer_hash(question_text, true_answer, user_answer)
+                previous = stored.get((student_name, question_id))
+                if previous and previous[0] == answer_hash:
+                    if previous[1]:
+                        user_results[student_name] += int(points)
+                    graded += 1
+                else:
+                    pending.setdefault(question_id, (question_text, true_answer, points, []))[3].append(
+                        (student_name, user_answer, answer_hash)
+                    )
+            else:
+                graded += 1
+
+        # 客观题一次性向量化评分
+        for student_name, points in answer_key.score(*objective).items():
+            user_results[student_name] += points
+
+        _update_job(job_id, status="running", total_answers=len(all_answers), graded_answers=graded)
+
+        for question_id, (question_text, true_answer, points, answers) in pending.items():
+            for i in range(0, len(answers), ANSWER_CHUNK_SIZE):
+                chunk = answers[i:i + ANSWER_CHUNK_SIZE]
+                verdicts = evaluate_short_answers(question_text, true_answer, [answer for _, answer, _ in chunk])
+
+                rows = []
+                for (student_name, _, answer_hash), is_correct in zip(chunk, verdicts):
+                    if is_correct is None:
+                        continue  # left ungraded; picked up again on retry
+                    rows.append((quiz_id, student_name, question_id, answer_hash, int(is_correct), job_id))
+                    if is_correct:
+                        user_results[student_name] += int(points)
+                with connection.cursor() as cursor, transaction(connection):
+                    insert_rows(
+                        cursor, "grading_answer_result",
+                        ["quiz_id", "student_name", "question_id", "answer_hash", "is_correct", "job_id"], rows,
+                        on_duplicate="answer_hash = VALUES(answer_hash), is_correct = VALUES(is_correct), job_id = VALUES(job_id)"
+                    )
+                graded += len(rows)
+                _update_job(job_id, graded_answers=graded)
+
+        with connection.cursor() as cursor, transaction(connection):
+            return store_leaderboard(cursor, quiz_id, user_results, max_points, ranking)
+    finally:
+        release_connection(connection)
+
+
+def run_job(quiz_id, job_id, ranking=DEFAULT_RANKING):
+    """Run grade_quiz for a registered job and record its final status."""
+    try:
+        _update_job(job_id, status="running")
+        leaderboard = grade_quiz(quiz_id, job_id, ranking)
+        if leaderboard is None:
+            _update_job(job_id, status="failed", error="No answers found for this quiz.")
+        else:
+            _update_job(job_id, status="completed", error=None)
+            if live_leaderboard:
+                # Re-seed with the new short-answer verdicts on next access
+                live_leaderboard.invalidate(quiz_id)
+        return leaderboard
+    except Exception as e:
+        print(f"Grading job {job_id} for quiz {quiz_id} failed: {e}")
+        _update_job(job_id, status="failed", error=str(e))
+        raise
+
+
+def submit_job_run(quiz_id, job_id, ranking=DEFAULT_RANKING):
+    """Run a job created with create_job on the background grading pool."""
+    return _executor.submit(run_job, quiz_id, job_id, ranking)
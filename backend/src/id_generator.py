@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import random
+import string
+import threading
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import insert_rows, transaction
+
+# ULID: 48-bit millisecond timestamp + 80 random bits, Crockford base32 (26 chars).
+# IDs sort by creation time, so new rows append to the right edge of an
+# InnoDB primary key instead of splitting pages at random positions.
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+TIME_CHARS = 10
+RANDOM_CHARS = 16
+RANDOM_BITS = 80
+ID_LENGTH = TIME_CHARS + RANDOM_CHARS
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class IdGenerator:
+    """Thread-safe, monotonic ULID generator.
+
+    Within one millisecond the random part is incremented instead of redrawn,
+    so IDs from one process are strictly increasing even under bursts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def ulid(self, timestamp_ms=None, monotonic=True):
+        """A new ULID; with monotonic=False the random part is always freshly drawn."""
+        if not monotonic:
+            now = int(time.time() * 1000) if timestamp_ms is None else timestamp_ms
+            return _encode(now, TIME_CHARS) + _encode(int.from_bytes(os.urandom(10), "big"), RANDOM_CHARS)
+        with self._lock:
+            now = int(time.time() * 1000) if timestamp_ms is None else timestamp_ms
+            if now <= self._last_ms:
+                # 同一毫秒（或时钟回拨）：沿用上一个时间戳，随机部分加一
+                now = self._last_ms
+                self._last_random = (self._last_random + 1) & ((1 << RANDOM_BITS) - 1)
+                if self._last_random == 0:
+                    now += 1
+            else:
+                self._last_random = int.from_bytes(os.urandom(10), "big")
+            self._last_ms = now
+            return _encode(now, TIME_CHARS) + _encode(self._last_random, RANDOM_CHARS)
+
+
+_generator = IdGenerator()
+
+
+def new_id(prefix=None):
+    """Time-ordered, URL-safe unique ID, e.g. new_id("post") -> "post_01JAB3K5Y8Q4T6W2ZC9M7N1R0D"."""
+    value = _generator.ulid()
+    return f"{prefix}_{value}" if prefix else value
+
+
+def public_id(prefix=None):
+    """Like new_id, but with 80 fresh random bits per ID, for IDs handed out in links.
+
+    new_id increments the random part within a millisecond, so an ID issued
+    in the same burst as a known one could be guessed from it. Share, poll
+    and quiz IDs are the only thing standing between a student and another
+    class's activity, so they are never derived from each other.
+    """
+    value = _generator.ulid(monotonic=False)
+    return f"{prefix}_{value}" if prefix else value
+
+
+def id_timestamp(value):
+    """Creation time (seconds since the epoch) encoded in an ID from new_id."""
+    encoded = value.rsplit("_", 1)[-1][:TIME_CHARS].upper()
+    ms = 0
+    for char in encoded:
+        ms = (ms << 5) | CROCKFORD.index(char)
+    return ms / 1000
+
+
+# ID columns and the length they need: 26 characters plus the longest prefix
+# (reply_), rounded up to the VARCHAR(64) the newer tables use. subid embeds
+# the scale id and the student name as well.
+ID_COLUMNS = {
+    "quiz_id": 64, "poll_id": 64, "share_id": 64, "diss_id": 64, "reply_id": 64,
+    "chat_id": 64, "quiz_anal_id": 64, "job_id": 64, "mind_map_id": 64, "scale_id": 64, "subid": 255,
+}
+
+
+def migrate_id_columns(cursor, dry_run=False):
+    """Widen every CHAR/VARCHAR ID column (see ID_COLUMNS) in this database that is too short.
+
+    Nullability, default, character set and collation are kept. Foreign key
+    checks are off while the columns change so that both ends of a key can be
+    widened one after the other. Returns the ALTER TABLE statements (run
+    unless dry_run). Non-text ID columns are reported and left alone.
+    """
+    cursor.execute(
+        "SELECT table_name, column_name, data_type, character_maximum_length, is_nullable, column_default, "
+        "character_set_name, collation_name FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND column_name IN (" + ", ".join(["%s"] * len(ID_COLUMNS)) + ") "
+        "ORDER BY table_name, column_name",
+        tuple(ID_COLUMNS)
+    )
+    statements = []
+    for table, column, data_type, length, nullable, default, charset, collation in cursor.fetchall():
+        needed = ID_COLUMNS[column]
+        if data_type.lower() not in ("char", "varchar"):
+            print(f"Skipped {table}.{column}: {data_type} cannot hold ULIDs, convert it by hand.")
+            continue
+        if length is not None and length >= needed:
+            continue
+        definition = f"VARCHAR({needed}) CHARACTER SET {charset} COLLATE {collation}"
+        definition += " NULL" if nullable == "YES" else " NOT NULL"
+        if default is not None:
+            definition += " DEFAULT " + cursor.connection.escape(default)
+        statements.append(f"ALTER TABLE `{table}` MODIFY `{column}` {definition}")
+    if dry_run or not statements:
+        return statements
+
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    try:
+        for statement in statements:
+            cursor.execute(statement)
+            print(statement)
+    finally:
+        cursor.execute("SET SESSION foreign_key_checks = 1")
+    return statements
+
+
+def _random_key():
+    """The old style of ID: 10 random letters and digits."""
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+
+
+def migrate():
+    """Widen the ID columns before deploying ULIDs: python -m src.id_generator migrate [--dry-run]"""
+    connection = get_connection()
+    if not connection:
+        print("Database connection failed.")
+        return
+    try:
+        with connection.cursor() as cursor:
+            statements = migrate_id_columns(cursor, dry_run="--dry-run" in sys.argv)
+        if "--dry-run" in sys.argv:
+            print("\n".join(statements) or "All ID columns are wide enough.")
+        else:
+            print(f"Widened {len(statements)} ID columns.")
+    finally:
+        release_connection(connection)
+
+
+def main():
+    """Benchmark inserts keyed by random IDs against ULIDs: python -m src.id_generator [rows]"""
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        migrate()
+        return
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    batch = 1000
+
+    start = time.perf_counter()
+    for _ in range(100000):
+        new_id()
+    print(f"new_id: {100000 / (time.perf_counter() - start):,.0f} ids/s")
+
+    connection = get_connection()
+    if not connection:
+        print("Database connection failed.")
+        return
+    try:
+        with connection.cursor() as cursor:
+            for label, make_key in (("random", _random_key), ("ulid", new_id)):
+                cursor.execute("DROP TABLE IF EXISTS id_benchmark")
+                cursor.execute("""
+                    CREATE TABLE id_benchmark (
+                        id VARCHAR(40) PRIMARY KEY,
+                        payload VARCHAR(255)
+                    ) ENGINE=InnoDB
+                """)
+                start = time.perf_counter()
+                for offset in range(0, rows, batch):
+                    with transaction(connection):
+                        insert_rows(cursor, "id_benchmark", ["id", "payload"],
+                                    [(make_key(), "x" * 200) for _ in range(min(batch, rows - offset))])
+                elapsed = time.perf_counter() - start
+                cursor.execute(
+                    "SELECT data_length + index_length FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = 'id_benchmark'"
+                )
+                size = cursor.fetchone()[0] or 0
+                print(f"{label:<7}: {rows / elapsed:,.0f} rows/s, {size / 1024 / 1024:.1f} MB on disk")
+            cursor.execute("DROP TABLE IF EXISTS id_benchmark")
+    finally:
+        release_connection(connection)
+
+
+if __name__ == "__main__":
+    main()
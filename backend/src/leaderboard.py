@@ -0,0 +1,73 @@
+import os
+from src.bulk_write import insert_rows
+
+# "competition" ranks ties 1, 2, 2, 4; "dense" ranks them 1, 2, 2, 3
+DEFAULT_RANKING = os.getenv("LEADERBOARD_RANKING", "competition")
+RANKING_METHODS = ("competition", "dense")
+
+RESULT_COLUMNS = ["student_name", "quiz_id", "true_number", "percentage_score"]
+
+
+def rank_scores(scores, method=DEFAULT_RANKING):
+    """Sort {student_name: score} once and return [(rank, student_name, score)].
+
+    Students with equal scores share a rank; ties are listed by name so the
+    order is stable between calls.
+    """
+    if method not in RANKING_METHODS:
+        raise ValueError(f"Unknown ranking method: {method}")
+    ranked = []
+    previous_score = None
+    rank = 0
+    for position, (student_name, score) in enumerate(sorted(scores.items(), key=lambda x: (-x[1], x[0])), start=1):
+        if score != previous_score:
+            rank = position if method == "competition" else rank + 1
+            previous_score = score
+        ranked.append((rank, student_name, score))
+    return ranked
+
+
+def format_percentage(total_points, max_points):
+    """Percentage string stored in class_room_quiz_result, e.g. "7/10 (70.00%)"."""
+    if max_points > 0:
+        return f"{total_points}/{max_points} ({(total_points / max_points) * 100:.2f}%)"
+    return "0/0 (0.00%)"
+
+
+def quiz_max_points(cursor, quiz_id):
+    """Total points available in the quiz."""
+    cursor.execute("SELECT SUM(points) FROM questions WHERE quiz_id = %s", (quiz_id,))
+    max_points = cursor.fetchone()[0] or 0
+    return int(max_points) if float(max_points).is_integer() else float(max_points)
+
+
+def leaderboard_entry(rank, student_name, total_points, max_points):
+    """One leaderboard row in the format the result viewer reads."""
+    return {
+        "student_id": student_name,
+        "student_name": student_name,
+        "score": total_points,
+        "percentage": format_percentage(total_points, max_points),
+        "rank": rank
+    }
+
+
+def upsert_results(cursor, quiz_id, scores, max_points):
+    """Write {student_name: score} to class_room_quiz_result with one bulk upsert."""
+    rows = [
+        (student_name, quiz_id, total_points, format_percentage(total_points, max_points))
+        for student_name, total_points in scores.items()
+    ]
+    return insert_rows(
+        cursor, "class_room_quiz_result", RESULT_COLUMNS, rows,
+        on_duplicate="true_number = VALUES(true_number), percentage_score = VALUES(percentage_score)"
+    )
+
+
+def store_leaderboard(cursor, quiz_id, scores, max_points, method=DEFAULT_RANKING):
+    """Upsert every student's result with one bulk statement and return the leaderboard rows."""
+    upsert_results(cursor, quiz_id, scores, max_points)
+    return [
+        leaderboard_entry(rank, student_name, total_points, max_points)
+        for rank, student_name, total_points in rank_scores(scores, method)
+    ]
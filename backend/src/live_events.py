@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import queue
+import threading
+from flask import Response, jsonify, stream_with_context
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import transaction
+from src.sse import sse_event
+from src.live_leaderboard import live_leaderboard
+from src.poll_counters import read_counters, ensure_counters, option_values, is_counted_type
+
+# Pub/sub across gunicorn workers goes through Redis when LIVE_EVENTS_REDIS_URL is set;
+# otherwise events only reach dashboards connected to the worker that handled the submission.
+LIVE_EVENTS_REDIS_URL = os.getenv("LIVE_EVENTS_REDIS_URL")
+# Open dashboard streams per process. Each stream holds one worker thread, so
+# gunicorn runs gthread workers (Jenkinsfile: --threads 32) and this stays
+# below the thread count to leave threads for ordinary API requests.
+MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", 24))
+# Events queued per slow subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LIVE_SUBSCRIBER_QUEUE", 256))
+HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", 15))
+# A stream ends after this long; EventSource reconnects after RECONNECT_MS and gets a fresh snapshot
+STREAM_MAX_SECONDS = float(os.getenv("LIVE_STREAM_MAX_SECONDS", 300))
+RECONNECT_MS = 1000
+
+REDIS_CHANNEL_PREFIX = "live:"
+
+
+class Subscription:
+    """One dashboard's queue of events for a channel."""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                # 慢客户端：丢弃最旧的事件
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        """Next event, or None after timeout seconds without one."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """In-process publish/subscribe of submission events, keyed by channel name."""
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._channels = {}
+        self._lock = threading.Lock()
+        self.metrics = {"published": 0, "delivered": 0, "rejected_subscribers": 0}
+
+    def subscribe(self, channel):
+        """Return a Subscription, or None when MAX_SUBSCRIBERS streams are already open."""
+        with self._lock:
+            if sum(len(subs) for subs in self._channels.values()) >= self.max_subscribers:
+                self.metrics["rejected_subscribers"] += 1
+                return None
+            subscription = Subscription(self, channel, self.queue_size)
+            self._channels.setdefault(channel, set()).add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+    def deliver(self, channel, event):
+        """Hand an event to every local subscriber of the channel."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            self.metrics["published"] += 1
+            self.metrics["delivered"] += len(subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def get_metrics(self):
+        with self._lock:
+            snapshot = dict(self.metrics)
+            snapshot["channels"] = len(self._channels)
+            snapshot["subscribers"] = sum(len(subs) for subs in self._channels.values())
+        return snapshot
+
+
+class RedisEventBroker(EventBroker):
+    """EventBroker whose publish goes through Redis pub/sub, so every worker's dashboards get it."""
+
+    def __init__(self, redis_url, **kwargs):
+        super().__init__(**kwargs)
+        import redis
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self._listener = threading.Thread(target=self._listen, name="live-events-redis", daemon=True)
+        self._listener.start()
+
+    def publish(self, channel, event):
+        try:
+            self._redis.publish(REDIS_CHANNEL_PREFIX + channel, json.dumps(event, ensure_ascii=False))
+        except Exception as e:
+            print(f"Live events: Redis publish failed ({e}), delivering locally")
+            self.deliver(channel, event)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(REDIS_CHANNEL_PREFIX + "*")
+                for message in pubsub.listen():
+                    channel = message["channel"][len(REDIS_CHANNEL_PREFIX):]
+                    self.deliver(channel, json.loads(message["data"]))
+            except Exception as e:
+                print(f"Live events: Redis listener restarting ({e})")
+                threading.Event().wait(1)
+
+
+broker = RedisEventBroker(LIVE_EVENTS_REDIS_URL) if LIVE_EVENTS_REDIS_URL else EventBroker()
+
+
+def channel_name(kind, activity_id):
+    return f"{kind}:{activity_id}"
+
+
+def publish_submission(kind, activity_id, delta):
+    """Publish one submission's delta to dashboards of the activity; never raises."""
+    try:
+        broker.publish(channel_name(kind, activity_id), {"kind": kind, "activityId": str(activity_id), "delta": delta})
+    except Exception as e:
+        print(f"Live events: publish to {kind}:{activity_id} failed ({e})")
+
+
+# ---- Aggregates: a snapshot read once per dashboard, then updated from deltas ----
+
+def _poll_snapshot(cursor, poll_id):
+    with transaction(cursor.connection):
+        ensure_counters(cursor, poll_id)
+    counters = read_counters(cursor, poll_id)
+    return {"counts": {str(question_id): entry["answer_counts"] for question_id, entry in counters.items()}}
+
+
+def _poll_apply(aggregate, delta):
+    for item in delta["answers"]:
+        if not is_counted_type(item.get("type")):
+            continue
+        answers = aggregate["counts"].setdefault(str(item["questionId"]), {})
+        for option in option_values(item["answer"], item.get("type")):
+            answers[option] = answers.get(option, 0) + 1
+
+
+def _open_question_snapshot(cursor, share_id):
+    cursor.execute(
+        "SELECT subid, COUNT(*) FROM openend_question_response WHERE share_id = %s GROUP BY subid",
+        (share_id,)
+    )
+    return {"counts": {str(subid): count for subid, count in cursor.fetchall()}, "latest": []}
+
+
+def _open_question_apply(aggregate, delta):
+    for item in delta["answers"]:
+        slide_id = str(item["slideId"])
+        aggregate["counts"][slide_id] = aggregate["counts"].get(slide_id, 0) + 1
+        aggregate["latest"] = (aggregate["latest"] + [{"slideId": slide_id, "text": item["answer"]}])[-20:]
+
+
+def _scales_snapshot(cursor, scale_id):
+    cursor.execute(
+        "SELECT subid, COUNT(*), SUM(value) FROM scale_response WHERE scale_id = %s GROUP BY subid",
+        (scale_id,)
+    )
+    slides = {str(subid): {"count": count, "sum": float(total or 0)} for subid, count, total in cursor.fetchall()}
+    return {"slides": slides}
+
+
+def _scales_apply(aggregate, delta):
+    for item in delta["answers"]:
+        slide = aggregate["slides"].setdefault(str(item["slideId"]), {"count": 0, "sum": 0.0})
+        slide["count"] += 1
+        slide["sum"] += float(item["value"])
+
+
+def _scales_view(aggregate):
+    return {"slides": {
+        slide_id: {"count": slide["count"], "average": round(slide["sum"] / slide["count"], 2) if slide["count"] else 0}
+        for slide_id, slide in aggregate["slides"].items()
+    }}
+
+
+def _quiz_snapshot(cursor, quiz_id):
+    cursor.execute("SELECT DISTINCT student_name FROM answers WHERE quiz_id = %s", (quiz_id,))
+    return {"students": {row[0] for row in cursor.fetchall()}}
+
+
+def _quiz_apply(aggregate, delta):
+    # 重复提交不重复计数：与快照一样按学生去重
+    aggregate["students"].add(delta["student"])
+
+
+def _quiz_view(aggregate, quiz_id):
+    view = {"submissions": len(aggregate["students"])}
+    if live_leaderboard:
+        view["leaderboard"], view["maxPoints"] = live_leaderboard.standings(quiz_id, limit=10)
+    return view
+
+
+AGGREGATES = {
+    "poll": (_poll_snapshot, _poll_apply, None),
+    "open_question": (_open_question_snapshot, _open_question_apply, None),
+    "scales": (_scales_snapshot, _scales_apply, lambda aggregate, _: _scales_view(aggregate)),
+    "quiz": (_quiz_snapshot, _quiz_apply, _quiz_view),
+}
+
+
+def stream_live_results(kind, activity_id):
+    """Endpoint: SSE stream of aggregate results for a poll, open question, scales question or quiz.
+
+    Sends a "snapshot" event read once from MySQL, then an "update" event
+    (aggregate plus the delta) for every submission published to the
+    activity, and a comment heartbeat every HEARTBEAT_SECONDS. The stream
+    ends after STREAM_MAX_SECONDS so it does not hold a worker thread
+    indefinitely; the browser's EventSource reconnects on its own.
+    """
+    if kind not in AGGREGATES:
+        return jsonify({"error": f"Unknown activity kind: {kind}"}), 404
+    snapshot, apply, view = AGGREGATES[kind]
+    view = view or (lambda aggregate, _: aggregate)
+
+    # Subscribe before reading the snapshot so no submission is missed (one that
+    # lands in between is counted twice until the dashboard reconnects)
+    subscription = broker.subscribe(channel_name(kind, activity_id))
+    if subscription is None:
+        return jsonify({"error": "Too many live dashboards are open, try again later."}), 503
+
+    connection = get_connection()
+    try:
+        if not connection:
+            raise ConnectionError("Database connection failed.")
+        with connection.cursor() as cursor:
+            aggregate = snapshot(cursor, activity_id)
+        first = view(aggregate, activity_id)
+    except Exception as e:
+        subscription.close()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if connection:
+            release_connection(connection)
+
+    def generate():
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        try:
+            yield f"retry: {RECONNECT_MS}\n" + sse_event(first, event="snapshot")
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                event = subscription.get(min(HEARTBEAT_SECONDS, remaining))
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                apply(aggregate, event["delta"])
+                yield sse_event({**view(aggregate, activity_id), "delta": event["delta"]}, event="update")
+        finally:
+            subscription.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def get_live_event_metrics():
+    """Endpoint: broker counters (published, delivered, open streams)."""
+    return jsonify({"redis": LIVE_EVENTS_REDIS_URL is not None, **broker.get_metrics()}), 200
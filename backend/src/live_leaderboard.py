@@ -0,0 +1,270 @@
+import os
+import time
+import atexit
+import threading
+import pymysql
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import transaction
+from src.grading_engine import load_answer_key
+from src.leaderboard import (
+    DEFAULT_RANKING, RANKING_METHODS, leaderboard_entry, quiz_max_points, upsert_results
+)
+
+# Scores are kept in Redis sorted sets shared by every gunicorn worker. The
+# live leaderboard is only enabled when LEADERBOARD_REDIS_URL is set: totals
+# held per process would diverge between workers, and the write-behind flush
+# must never write such partial totals back to class_room_quiz_result.
+LEADERBOARD_REDIS_URL = os.getenv("LEADERBOARD_REDIS_URL")
+# Seconds between write-behind flushes to class_room_quiz_result
+FLUSH_INTERVAL = float(os.getenv("LEADERBOARD_FLUSH_INTERVAL", 5.0))
+# Seconds an answer key is reused before it is re-read from questions
+ANSWER_KEY_TTL = int(os.getenv("LEADERBOARD_KEY_TTL", 300))
+# Seconds an idle board stays in Redis; it is re-seeded from MySQL on the next access
+BOARD_TTL = int(os.getenv("LEADERBOARD_BOARD_TTL", 24 * 3600))
+
+
+def _number(value):
+    value = round(float(value), 2)
+    return int(value) if value.is_integer() else value
+
+
+class RedisScoreStore:
+    """Per-quiz board in Redis: a sorted set of totals plus a hash of per-question points."""
+
+    # Replace one answer's points and shift the student's total by the difference, atomically
+    APPLY_SCRIPT = """
+    local old = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+    local total = redis.call('ZINCRBY', KEYS[1], tonumber(ARGV[3]) - old, ARGV[2])
+    for i = 1, 3 do redis.call('EXPIRE', KEYS[i], ARGV[4]) end
+    return total
+    """
+    # Seed an empty board from (field, student, points) triples; a no-op if another worker seeded it first
+    LOAD_SCRIPT = """
+    if redis.call('EXISTS', KEYS[3]) == 1 then return 0 end
+    redis.call('DEL', KEYS[1], KEYS[2])
+    for i = 2, #ARGV, 3 do
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+        redis.call('ZINCRBY', KEYS[1], ARGV[i + 2], ARGV[i + 1])
+    end
+    redis.call('SET', KEYS[3], 1)
+    for i = 1, 3 do redis.call('EXPIRE', KEYS[i], ARGV[1]) end
+    return 1
+    """
+
+    def __init__(self, redis_url, ttl=BOARD_TTL):
+        import redis
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self._apply = self._redis.register_script(self.APPLY_SCRIPT)
+        self._load = self._redis.register_script(self.LOAD_SCRIPT)
+
+    @staticmethod
+    def _keys(quiz_id):
+        return f"live_lb:{quiz_id}:scores", f"live_lb:{quiz_id}:answers", f"live_lb:{quiz_id}:seeded"
+
+    def exists(self, quiz_id):
+        return bool(self._redis.exists(self._keys(quiz_id)[2]))
+
+    def load(self, quiz_id, answer_points):
+        """Seed the quiz's board with {(student, question_id): points} unless it is already seeded."""
+        args = [self.ttl]
+        for (student_name, question_id), points in answer_points.items():
+            args += [f"{student_name}\x1f{question_id}", student_name, points]
+        self._load(keys=list(self._keys(quiz_id)), args=args)
+
+    def apply(self, quiz_id, student_name, question_points):
+        """Set the student's points per question and move them in the ranking by the difference."""
+        keys = list(self._keys(quiz_id))
+        new = None
+        for question_id, points in question_points.items():
+            new = self._apply(keys=keys, args=[f"{student_name}\x1f{question_id}", student_name, points, self.ttl])
+        return _number(new) if new is not None else self.score_of(quiz_id, student_name)
+
+    def top(self, quiz_id, limit):
+        rows = self._redis.zrevrange(self._keys(quiz_id)[0], 0, limit - 1, withscores=True)
+        return [(student_name, _number(score)) for student_name, score in rows]
+
+    def count_above(self, quiz_id, score):
+        return self._redis.zcount(self._keys(quiz_id)[0], f"({score}", "+inf")
+
+    def score_of(self, quiz_id, student_name):
+        score = self._redis.zscore(self._keys(quiz_id)[0], student_name)
+        return _number(score) if score is not None else None
+
+    def scores_of(self, quiz_id, student_names):
+        names = list(student_names)
+        if not names:
+            return {}
+        scores = self._redis.zmscore(self._keys(quiz_id)[0], names)
+        return {name: _number(score) for name, score in zip(names, scores) if score is not None}
+
+    def size(self, quiz_id):
+        return self._redis.zcard(self._keys(quiz_id)[0])
+
+    def reset(self, quiz_id):
+        self._redis.delete(*self._keys(quiz_id))
+
+
+class LiveLeaderboard:
+    """Per-quiz leaderboard updated as answers arrive instead of by a full re-grade.
+
+    Each submission's objective answers are scored against the quiz's cached
+    AnswerKey and applied as deltas to the shared Redis board; reads are a
+    ranked range query. The first touch of a quiz seeds the board from the
+    answers already stored (plus any short-answer verdicts from a previous
+    grading run). Changed totals are read back from Redis and written behind
+    to class_room_quiz_result every FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self, store, flush_interval=FLUSH_INTERVAL):
+        self.store = store
+        self.flush_interval = flush_interval
+        self._keys = {}  # quiz_id -> (expires_at, AnswerKey, max_points)
+        self._dirty = {}  # quiz_id -> set of student names
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the write-behind thread (idempotent)."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="live-leaderboard", daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _answer_key(self, cursor, quiz_id):
+        with self._lock:
+            cached = self._keys.get(quiz_id)
+        if cached and cached[0] > time.time():
+            return cached[1], cached[2]
+        answer_key = load_answer_key(cursor, quiz_id)
+        max_points = quiz_max_points(cursor, quiz_id)
+        now = time.time()
+        with self._lock:
+            # 顺便清理过期的答案缓存
+            for stale in [q for q, (expires_at, _, _) in self._keys.items() if expires_at <= now]:
+                del self._keys[stale]
+            self._keys[quiz_id] = (now + ANSWER_KEY_TTL, answer_key, max_points)
+        return answer_key, max_points
+
+    def _seed(self, cursor, quiz_id, answer_key):
+        cursor.execute(
+            "SELECT student_name, question_id, answer_content FROM answers WHERE quiz_id = %s ORDER BY submitted_at",
+            (quiz_id,)
+        )
+        rows = cursor.fetchall()
+        answer_points = {}
+        if rows:
+            names, students, question_idx, masks = answer_key.encode_rows(*zip(*rows))
+            for student, q, points in zip(students, question_idx, answer_key.score_masks(question_idx, masks)):
+                answer_points[(names[student], answer_key.question_ids[q])] = float(points)
+        try:
+            # 简答题沿用上次评分的结果
+            cursor.execute(
+                """
+                SELECT r.student_name, r.question_id, q.points
+                FROM grading_answer_result r
+                JOIN questions q ON q.quiz_id = r.quiz_id AND q.question_id = r.question_id
+                WHERE r.quiz_id = %s AND r.is_correct = 1
+                """,
+                (quiz_id,)
+            )
+            for student_name, question_id, points in cursor.fetchall():
+                answer_points[(student_name, str(question_id))] = float(points or 0)
+        except pymysql.err.ProgrammingError:
+            pass  # quiz never graded, grading_answer_result not created yet
+        self.store.load(quiz_id, answer_points)
+
+    def _prepare(self, quiz_id):
+        """Return (AnswerKey, max_points), seeding the board on first use."""
+        with self._lock:
+            cached = self._keys.get(quiz_id)
+        if cached and cached[0] > time.time() and self.store.exists(quiz_id):
+            return cached[1], cached[2]
+
+        connection = get_connection()
+        if not connection:
+            raise ConnectionError("Database connection failed.")
+        try:
+            with connection.cursor() as cursor:
+                answer_key, max_points = self._answer_key(cursor, quiz_id)
+                if not self.store.exists(quiz_id):
+                    self._seed(cursor, quiz_id, answer_key)
+            connection.commit()
+            return answer_key, max_points
+        finally:
+            release_connection(connection)
+
+    def record_submission(self, quiz_id, student_name, answers):
+        """Score one submission's objective answers [(question_id, answer)] and update the board."""
+        answer_key, _ = self._prepare(quiz_id)
+        question_points = answer_key.answer_points([q for q, _ in answers], [a for _, a in answers])
+        if not question_points:
+            return None
+        score = self.store.apply(quiz_id, student_name, question_points)
+        with self._lock:
+            self._dirty.setdefault(quiz_id, set()).add(student_name)
+        return score
+
+    def standings(self, quiz_id, limit=50, method=DEFAULT_RANKING):
+        """Top `limit` leaderboard rows, ranked with ties like rank_scores."""
+        if method not in RANKING_METHODS:
+            raise ValueError(f"Unknown ranking method: {method}")
+        _, max_points = self._prepare(quiz_id)
+        rows = []
+        previous_score = None
+        rank = 0
+        for position, (student_name, score) in enumerate(self.store.top(quiz_id, limit), start=1):
+            if score != previous_score:
+                rank = position if method == "competition" else rank + 1
+                previous_score = score
+            rows.append(leaderboard_entry(rank, student_name, score, max_points))
+        return rows, max_points
+
+    def student_standing(self, quiz_id, student_name):
+        """The student's competition rank and score, or None if they have not submitted."""
+        _, max_points = self._prepare(quiz_id)
+        score = self.store.score_of(quiz_id, student_name)
+        if score is None:
+            return None
+        return leaderboard_entry(self.store.count_above(quiz_id, score) + 1, student_name, score, max_points)
+
+    def invalidate(self, quiz_id):
+        """Drop the quiz's cached key and board; the next access re-seeds it from MySQL."""
+        with self._lock:
+            self._keys.pop(quiz_id, None)
+            self._dirty.pop(quiz_id, None)
+        self.store.reset(quiz_id)
+
+    def flush(self):
+        """Write the totals that changed since the last flush to class_room_quiz_result."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        for quiz_id, student_names in dirty.items():
+            connection = get_connection()
+            try:
+                if not connection:
+                    raise ConnectionError("Database connection failed.")
+                with connection.cursor() as cursor, transaction(connection):
+                    _, max_points = self._answer_key(cursor, quiz_id)
+                    upsert_results(cursor, quiz_id, self.store.scores_of(quiz_id, student_names), max_points)
+            except Exception as e:
+                print(f"Error flushing live leaderboard for quiz {quiz_id}: {e}")
+                with self._lock:
+                    self._dirty.setdefault(quiz_id, set()).update(student_names)
+            finally:
+                if connection:
+                    release_connection(connection)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+live_leaderboard = None
+if LEADERBOARD_REDIS_URL:
+    live_leaderboard = LiveLeaderboard(RedisScoreStore(LEADERBOARD_REDIS_URL))
+    live_leaderboard.start()
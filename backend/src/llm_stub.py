@@ -0,0 +1,198 @@
+import sys
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubLLMServer:
+    """Minimal OpenAI-compatible /chat/completions server for exercising src/LLM.py offline.
+
+    Replies echo the last user message ("echo: <text>"), streamed word by
+    word when the request asks for stream=true. Every request waits `delay`
+    seconds, and the server records how many requests it has seen and the
+    most that were in flight at once.
+    """
+
+    def __init__(self, delay=0.0, port=0):
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="llm-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _enter(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                messages = [m for m in body.get("messages", []) if m.get("role") == "user"]
+                reply = "echo: " + (messages[-1]["content"] if messages else "")
+                stub._enter()
+                try:
+                    time.sleep(stub.delay)
+                    if body.get("stream"):
+                        self._stream(body.get("model"), reply)
+                    else:
+                        self._complete(body.get("model"), reply)
+                finally:
+                    stub._leave()
+
+            def _complete(self, model, reply):
+                payload = json.dumps({
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": reply}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, model, reply):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                words = reply.split(" ")
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "finish_reason": None,
+                                     "delta": {"content": word if i == 0 else " " + word}}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def _point_llm_at(LLM, url, max_concurrency, queue_timeout):
+    """Re-target the LLM module's shared clients and concurrency cap at the stub."""
+    LLM.endpoint = url
+    LLM.token = "stub"
+    LLM._client = None
+    LLM._async_client = None
+    LLM.QUEUE_TIMEOUT = queue_timeout
+    LLM.MAX_CONCURRENCY = max_concurrency
+    LLM._slots = threading.BoundedSemaphore(max_concurrency)
+    LLM._async_slots.clear()
+
+
+def self_test():
+    """Check src/LLM.py against a stub server: python -m src.llm_stub"""
+    from src import LLM
+
+    stub = StubLLMServer(delay=0.2).start()
+    try:
+        _point_llm_at(LLM, stub.url, max_concurrency=2, queue_timeout=5)
+
+        assert LLM.ai_assistant("hi") == "echo: hi"
+        assert LLM.get_client() is LLM.get_client(), "client is not reused"
+        print("call: ok")
+
+        assert "".join(LLM.ai_assistant_stream("stream me")) == "echo: stream me"
+        print("stream: ok")
+
+        before = stub.requests
+        assert LLM.ai_assistant("cached", cache_endpoint="default") == "echo: cached"
+        assert LLM.ai_assistant("cached", cache_endpoint="default") == "echo: cached"
+        assert stub.requests == before + 1, "second call was not served from the cache"
+        print("cache: ok")
+
+        stub.max_in_flight = 0
+        threads = [threading.Thread(target=LLM.ai_assistant, args=(f"q{i}",)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert stub.max_in_flight == 2, f"{stub.max_in_flight} requests in flight, cap is 2"
+        print("concurrency cap: ok")
+
+        _point_llm_at(LLM, stub.url, max_concurrency=1, queue_timeout=0.05)
+        blocker = threading.Thread(target=LLM.ai_assistant, args=("slow",))
+        blocker.start()
+        time.sleep(0.05)
+        try:
+            LLM.ai_assistant("queued")
+            raise AssertionError("expected LLMBusyError")
+        except LLM.LLMBusyError:
+            pass
+        blocker.join()
+        print("queue timeout: ok")
+
+        _point_llm_at(LLM, stub.url, max_concurrency=2, queue_timeout=5)
+
+        async def run_async():
+            replies = await asyncio.gather(*(LLM.async_ai_assistant(f"a{i}") for i in range(4)))
+            assert replies == [f"echo: a{i}" for i in range(4)]
+            pieces = [piece async for piece in LLM.async_stream_llm_model(LLM.model, [{"role": "user", "content": "x y"}])]
+            assert "".join(pieces) == "echo: x y"
+
+        stub.max_in_flight = 0
+        asyncio.run(run_async())
+        assert stub.max_in_flight <= 2, f"{stub.max_in_flight} async requests in flight, cap is 2"
+        print("async: ok")
+    finally:
+        stub.stop()
+    print("LLM self-test passed.")
+
+
+def main():
+    """python -m src.llm_stub             run the self-test against a stub server
+    python -m src.llm_stub serve [port] serve the stub for manual runs (LLM_ENDPOINT=http://127.0.0.1:<port>/v1)"""
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        stub = StubLLMServer(port=int(sys.argv[2]) if len(sys.argv) > 2 else 8765).start()
+        print(f"Stub LLM server on {stub.url}")
+        try:
+            stub._thread.join()
+        except KeyboardInterrupt:
+            stub.stop()
+        return
+    self_test()
+
+
+if __name__ == "__main__":
+    main()
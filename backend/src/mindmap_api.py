@@ -2,6 +2,7 @@ import os
 from flask import Flask, request, jsonify, Blueprint
 from flask_cors import CORS
 from src.db_connection import get_connection, release_connection
+from src.id_generator import new_id
 
 # Create a Blueprint for mind map routes
 mindmap_bp = Blueprint('mindmap', __name__)
@@ -72,7 +73,7 @@ def create_mind_map():
         thumbnail = data.get('thumbnail', title)
 
         # Generate a unique ID for the mind map
-        mind_map_id = f"mm_{generate_unique_id()}"
+        mind_map_id = generate_unique_id()
 
         connection = get_connection()
         if not connection:
@@ -215,10 +216,8 @@ def delete_mind_map(mind_map_id):
             release_connection(connection)
 
 def generate_unique_id():
-    """Generate a unique ID for the mind map."""
-    import random
-    import string
-    return ''.join(random.choices(string.digits, k=3))
+    """Generate a unique, time-ordered ID for the mind map."""
+    return new_id("mm")
 
 # If running as standalone app (for testing)
 if __name__ == '__main__':
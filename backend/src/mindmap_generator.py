@@ -2,7 +2,7 @@ from flask import Flask, request, jsonify
 from src.LLM import ai_assistant
 from flask_caching import Cache
 from src.db_connection import get_connection, release_connection
-import uuid
+from src.id_generator import new_id
 from datetime import datetime
 
 
@@ -38,10 +38,11 @@ def generate_mindmap():
 
     try:
         # Call the AI assistant to generate the mindmap
-        mindmap = ai_assistant(prompt)
+        # Same topic -> same prompt, so repeats are served from the LLM cache (?refresh=1 bypasses it)
+        mindmap = ai_assistant(prompt, cache_endpoint="mindmap", bypass_cache=request.args.get('refresh') == '1')
         
         # Generate a unique mind_map_id
-        mind_map_id = str(uuid.uuid4())
+        mind_map_id = new_id("mm")
         
         # Store the result in database
         connection = get_connection()
@@ -1,9 +1,14 @@
+import time
 from flask import Flask, request, jsonify
-import uuid
-from src.LLM import ai_assistant
+from src.id_generator import new_id
+from src.LLM import ai_assistant, ai_assistant_stream, call_llm_model, stream_llm_model, model
+from src.sse import stream_reply
+from src.conversation_store import conversation_store
 
 app = Flask(__name__)
 
+ASSISTANT_SYSTEM_PROMPT = "You are a helpful AI assistant for teachers."
+
 @app.route('/api/ass_topic/new', methods=['POST'])
 def create_new_topic():
     """Endpoint to create a new topic."""
@@ -16,13 +21,17 @@ def create_new_topic():
         uid = data['uid']
 
         # Generate a unique chat ID
-        chat_id = str(uuid.uuid4())
+        chat_id = new_id("chat")
+        welcome_message = "Hello there, how can I assist you today?"
+
+        # Store the conversation server-side so later turns only send the new message
+        conversation_store.start(chat_id, uid, welcome_message)
 
         # Prepare the response
         response = {
             "success": True,
             "chat_id": chat_id,
-            "welcomeMessage": "Hello there, how can I assist you today?",
+            "welcomeMessage": welcome_message,
             "conversationHistory": []
         }
 
@@ -44,8 +53,13 @@ def ai_assistant_chat():
         message = data['message']
         chat_id = data['chat_id']
 
-        # Call the AI assistant to generate a response
-        content = ai_assistant(message)
+        # Call the AI assistant to generate a response, with the stored history when the chat is known
+        if chat_id:
+            messages = conversation_store.build_messages(chat_id, message, ASSISTANT_SYSTEM_PROMPT, uid)
+            content = call_llm_model(model, messages)
+            conversation_store.record_exchange(chat_id, uid, message, content)
+        else:
+            content = ai_assistant(message)
 
         # Prepare the response
         response = {
@@ -60,5 +74,27 @@ def ai_assistant_chat():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/ai_ass/chat/stream', methods=['POST'])
+def ai_assistant_chat_stream():
+    """Streaming variant of /api/ai_ass/chat: sends the reply as Server-Sent Events."""
+    started_at = time.perf_counter()
+    data = request.get_json()
+    if not data or not all(key in data for key in ['uid', 'message', 'chat_id']):
+        return jsonify({"success": False, "error": "Invalid input. Please provide 'uid', 'message', and 'chat_id' in JSON body."}), 400
+
+    uid = data['uid']
+    message = data['message']
+    chat_id = data['chat_id']
+    if not chat_id:
+        return stream_reply("ai_ass_chat", ai_assistant_stream(message), extra={"chatId": chat_id}, started_at=started_at)
+
+    messages = conversation_store.build_messages(chat_id, message, ASSISTANT_SYSTEM_PROMPT, uid)
+    return stream_reply(
+        "ai_ass_chat", stream_llm_model(model, messages),
+        on_complete=lambda reply: conversation_store.record_exchange(chat_id, uid, message, reply),
+        extra={"chatId": chat_id},
+        started_at=started_at
+    )
+
 if __name__ == '__main__':
     app.run(port=3000, debug=True)
\ No newline at end of file
@@ -0,0 +1,191 @@
+import sys
+import json
+import threading
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import insert_rows, transaction
+
+POLL_COUNTER_DDL = """
+CREATE TABLE IF NOT EXISTS poll_option_count (
+    poll_id VARCHAR(64) NOT NULL,
+    question_id VARCHAR(64) NOT NULL,
+    option_value VARCHAR(255) NOT NULL,
+    question_type VARCHAR(32),
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (poll_id, question_id, option_value)
+)
+"""
+# One row per poll whose counters were rebuilt from poll_answer: from then on
+# the submission path keeps them complete. Polls answered before the counter
+# table existed have no row yet and are rebuilt on their first read.
+POLL_COUNTER_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS poll_counter_state (
+    poll_id VARCHAR(64) NOT NULL PRIMARY KEY,
+    rebuilt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+COUNTER_COLUMNS = ["poll_id", "question_id", "option_value", "question_type", "count"]
+
+# Stored question types: the poll editor saves single/multiple/scale/text,
+# older polls use 'Single Choice', 'Multiple Choice', 'Scale', 'Text'
+SINGLE_TYPES = ('single', 'single choice', 'single_choice')
+MULTIPLE_TYPES = ('multiple', 'multiple choice', 'multiple_choice')
+SCALE_TYPES = ('scale',)
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+
+def ensure_counter_table(cursor):
+    """Create poll_option_count and poll_counter_state once per process."""
+    global _table_ready
+    if _table_ready:
+        return
+    with _table_lock:
+        if not _table_ready:
+            cursor.execute(POLL_COUNTER_DDL)
+            cursor.execute(POLL_COUNTER_STATE_DDL)
+            _table_ready = True
+
+
+def is_counted_type(question_type):
+    """Whether answers of this question type are counted per option (text answers are not)."""
+    return (question_type or "").strip().lower() in SINGLE_TYPES + MULTIPLE_TYPES + SCALE_TYPES
+
+
+def option_values(answer, question_type):
+    """The option values one stored answer counts towards.
+
+    Multi-select answers are stored as a JSON array (older rows as comma
+    separated text) and count once for every selected option.
+    """
+    if answer is None:
+        return []
+    if (question_type or "").strip().lower() in MULTIPLE_TYPES:
+        try:
+            selected = json.loads(answer) if isinstance(answer, str) else answer
+        except ValueError:
+            selected = answer.split(",")
+        if not isinstance(selected, list):
+            selected = [selected]
+        return [str(option).strip()[:255] for option in selected if str(option).strip()]
+    return [str(answer)[:255]]
+
+
+def counter_rows(poll_id, answers):
+    """Aggregate (question_id, question_type, answer) tuples into poll_option_count rows."""
+    counts = {}
+    for question_id, question_type, answer in answers:
+        if not is_counted_type(question_type):
+            continue
+        for option in option_values(answer, question_type):
+            key = (str(question_id), option)
+            if key not in counts:
+                counts[key] = [question_type, 0]
+            counts[key][1] += 1
+    return [(poll_id, question_id, option, question_type, count) for (question_id, option), (question_type, count) in counts.items()]
+
+
+def increment_counters(cursor, poll_id, answers):
+    """Add one submission's answers to the counters (same transaction as the answer insert).
+
+    Call ensure_counter_table before the transaction's first write: the
+    CREATE TABLE it may run would otherwise commit the writes early.
+    """
+    rows = counter_rows(poll_id, answers)
+    if not rows:
+        return 0
+    ensure_counter_table(cursor)
+    return insert_rows(cursor, "poll_option_count", COUNTER_COLUMNS, rows, on_duplicate="count = count + VALUES(count)")
+
+
+def read_counters(cursor, poll_id):
+    """Return {question_id: {"type": question_type, "answer_counts": {option: count}}} for the poll."""
+    ensure_counter_table(cursor)
+    cursor.execute(
+        "SELECT question_id, question_type, option_value, count FROM poll_option_count WHERE poll_id = %s",
+        (poll_id,)
+    )
+    data = {}
+    for question_id, question_type, option, count in cursor.fetchall():
+        entry = data.setdefault(question_id, {"type": question_type, "answer_counts": {}})
+        entry["answer_counts"][option] = count
+    return data
+
+
+def delete_counters(cursor, poll_id):
+    ensure_counter_table(cursor)
+    cursor.execute("DELETE FROM poll_option_count WHERE poll_id = %s", (poll_id,))
+    cursor.execute("DELETE FROM poll_counter_state WHERE poll_id = %s", (poll_id,))
+
+
+def ensure_counters(cursor, poll_id):
+    """Rebuild the poll's counters from poll_answer unless that was done before. Returns True if rebuilt.
+
+    Run it in a transaction before read_counters. The marker row is inserted
+    first, so a concurrent caller waits for this rebuild to commit and then
+    skips its own.
+    """
+    ensure_counter_table(cursor)
+    cursor.execute("SELECT 1 FROM poll_counter_state WHERE poll_id = %s", (poll_id,))
+    if cursor.fetchone():
+        return False
+    cursor.execute("INSERT IGNORE INTO poll_counter_state (poll_id) VALUES (%s)", (poll_id,))
+    if cursor.rowcount == 0:
+        return False
+    rebuild_counters(cursor, poll_id)
+    return True
+
+
+def rebuild_counters(cursor, poll_id=None):
+    """Recompute the counters of one poll (or every poll) from poll_answer and mark them rebuilt. Returns rows written."""
+    ensure_counter_table(cursor)
+    if poll_id is None:
+        cursor.execute("DELETE FROM poll_option_count")
+        cursor.execute(
+            """
+            INSERT INTO poll_counter_state (poll_id) SELECT DISTINCT poll_id FROM poll_answer
+            ON DUPLICATE KEY UPDATE rebuilt_at = CURRENT_TIMESTAMP
+            """
+        )
+        cursor.execute("SELECT poll_id, question_id, question_type, answer FROM poll_answer ORDER BY poll_id")
+    else:
+        cursor.execute("DELETE FROM poll_option_count WHERE poll_id = %s", (poll_id,))
+        cursor.execute(
+            "INSERT INTO poll_counter_state (poll_id) VALUES (%s) ON DUPLICATE KEY UPDATE rebuilt_at = CURRENT_TIMESTAMP",
+            (poll_id,)
+        )
+        cursor.execute("SELECT poll_id, question_id, question_type, answer FROM poll_answer WHERE poll_id = %s", (poll_id,))
+
+    by_poll = {}
+    for row_poll_id, question_id, question_type, answer in cursor.fetchall():
+        by_poll.setdefault(row_poll_id, []).append((question_id, question_type, answer))
+
+    written = 0
+    for row_poll_id, answers in by_poll.items():
+        rows = counter_rows(row_poll_id, answers)
+        insert_rows(cursor, "poll_option_count", COUNTER_COLUMNS, rows)
+        written += len(rows)
+    return written
+
+
+def main():
+    """Rebuild poll_option_count: python -m src.poll_counters [poll_id]
+
+    Optional after deploying the counters: polls not rebuilt yet are also
+    rebuilt on their first read (see ensure_counters).
+    """
+    poll_id = sys.argv[1] if len(sys.argv) > 1 else None
+    connection = get_connection()
+    if not connection:
+        print("Database connection failed.")
+        return
+    try:
+        with connection.cursor() as cursor, transaction(connection):
+            written = rebuild_counters(cursor, poll_id)
+        print(f"Rebuilt {written} counter rows for {'poll ' + poll_id if poll_id else 'all polls'}.")
+    finally:
+        release_connection(connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import json
 from flask import Flask, request, jsonify
 from src.db_connection import release_connection, get_connection
+from src.bulk_write import transaction
+from src.poll_counters import read_counters, ensure_counters
+from src.word_index import word_index, poll_texts, DEFAULT_TOP_K
 import matplotlib.pyplot as plt
 import os
 import re
@@ -18,102 +21,80 @@ app = Flask(__name__)
 @app.route('/api/studentpoll/<poll_id>/results', methods=['GET'])
 #@cache.cached(timeout=3600)
 def get_poll_results(poll_id):
-    """Endpoint to get poll results and return data for interactive charts."""
+    """Endpoint to get poll results and return data for interactive charts.
+
+    Counts come from poll_option_count, which submissions keep up to date
+    (see src/poll_counters.py); a poll whose counters were never rebuilt
+    (answers stored before the table existed) is rebuilt from poll_answer once.
+    """
+    connection = get_connection()
+    if not connection:
+        return jsonify({"error": "Database connection failed."}), 500
     try:
-        # Retrieve poll answers from the database
-        connection = get_connection()
-        if connection:
-            with connection.cursor() as cursor:
-                query = """
-                SELECT question_id, question_type, answer
-                FROM poll_answer
-                WHERE poll_id = %s AND question_type IN ('Single Choice', 'Multiple Choice', 'Scale')
-                """
-                cursor.execute(query, (poll_id,))
-                results = cursor.fetchall()
+        with connection.cursor() as cursor:
+            with transaction(connection):
+                ensure_counters(cursor, poll_id)
+            data = read_counters(cursor, poll_id)
 
-        if not results:
+        if not data:
             return jsonify({"error": "No results found for the given poll_id."}), 404
 
-        # Process results by question type
-        data = {}
-        for question_id, question_type, answer in results:
-            if question_id not in data:
-                data[question_id] = {"type": question_type, "answers": []}
-            data[question_id]["answers"].append(answer)
-
         # Prepare data for interactive charts
-        chart_data = []
-        for question_id, details in data.items():
-            question_type = details["type"]
-            answers = details["answers"]
-
-            # Count answer frequencies
-            answer_counts = {}
-            for ans in answers:
-                if question_type == "multiple_choice":
-                    # Split multiple choice answers into individual options
-                    options = ans.split(",")
-                    for option in options:
-                        answer_counts[option] = answer_counts.get(option, 0) + 1
-                else:
-                    answer_counts[ans] = answer_counts.get(ans, 0) + 1
-
-            # Append data for this question
-            chart_data.append({
+        chart_data = [
+            {
                 "question_id": question_id,
-                "question_type": question_type,
-                "answer_counts": answer_counts
-            })
+                "question_type": details["type"],
+                "answer_counts": details["answer_counts"]
+            }
+            for question_id, details in data.items()
+        ]
 
         return jsonify({"chart_data": chart_data}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        release_connection(connection)
 
 @app.route('/api/studentpoll/<poll_id>/text_results', methods=['GET'])
 #@cache.cached(timeout=3600)
 def get_text_poll_results(poll_id):
-    """Endpoint to get text poll results and return data for word cloud generation."""
+    """Endpoint to get text poll results and return data for word cloud generation.
+
+    Query params: top (terms returned, default 100), bigrams=1 to add two-word
+    phrases, include_answers=1 to also return every individual answer.
+    """
+    connection = None
     try:
-        # Retrieve text answers from the database
+        top = max(1, min(int(request.args.get('top', DEFAULT_TOP_K)), 1000))
         connection = get_connection()
-        if connection:
-            with connection.cursor() as cursor:
-                query = """
-                SELECT user_id, answer
-                FROM poll_answer
-                WHERE poll_id = %s AND question_type = 'Text'
-                """
-                cursor.execute(query, (poll_id,))
-                results = cursor.fetchall()
-
-        if not results:
-            return jsonify({"error": "No text answers found for the given poll_id."}), 404
-
-        # Define a list of stop words to exclude
-        stop_words = set(["the", "is", "in", "and", "to", "of", "a", "an", "it", "on", "for", "with", "as", "by", "at", "this", "that", "these", "those", "be", "are", "was", "were", "has", "have", "had", "do", "does", "did", "but", "or", "if", "then", "so", "because", "about", "from", "up", "down", "out", "over", "under", "again", "further", "here", "there", "when", "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "than", "too", "very"])
-
-        # Process results for word frequency and individual answers
-        word_frequency = {}
-        user_answers = []
-
-        for user_id, answer in results:
-            user_answers.append({"user_id": user_id, "answer": answer})
-
-            # Count word frequencies, excluding stop words
-            words = re.findall(r'\b\w+\b', answer.lower())
-            for word in words:
-                if word not in stop_words:
-                    word_frequency[word] = word_frequency.get(word, 0) + 1
-
-        return jsonify({
-            "word_frequency": word_frequency,
-            "user_answers": user_answers
-        }), 200
+        if not connection:
+            return jsonify({"error": "Database connection failed."}), 500
+        with connection.cursor() as cursor:
+            # 词频来自增量索引，首次访问时从数据库初始化
+            load_texts = poll_texts(cursor, poll_id)
+            word_frequency = word_index.top("poll", poll_id, load_texts, k=top)
+            # 有答案但全是停用词时返回空词云，而不是 404
+            if not word_frequency and load_texts.count() == 0:
+                return jsonify({"error": "No text answers found for the given poll_id."}), 404
+
+            response = {"word_frequency": word_frequency}
+            if request.args.get('bigrams') == '1':
+                response["bigram_frequency"] = word_index.top("poll", poll_id, load_texts, k=top, n=2)
+            if request.args.get('include_answers') == '1':
+                cursor.execute(
+                    "SELECT user_id, answer FROM poll_answer WHERE poll_id = %s AND question_type = 'Text'",
+                    (poll_id,)
+                )
+                response["user_answers"] = [{"user_id": user_id, "answer": answer} for user_id, answer in cursor.fetchall()]
+
+        return jsonify(response), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if connection:
+            release_connection(connection)
 
 if __name__ == '__main__':
     app.run("0.0.0.0", debug=True)
\ No newline at end of file
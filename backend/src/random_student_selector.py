@@ -1,36 +1,151 @@
+import os
+import math
+import heapq
 import random
-from src.db_connection import release_connection, get_connection
+import threading
+from collections import OrderedDict
+from src.course_cache import course_cache, roster_version
 
-def fetch_random_usernames(course_id, num_students):
-    """Fetch random usernames from the student_list_c{course_id} table."""
-    connection = get_connection()
-    if not connection:
-        
-        raise Exception("Failed to connect to the database.")
+# Rosters come from the shared course cache (which bounds their staleness).
+# Each worker keeps the Roster built from it and reuses it while the cached
+# roster version is unchanged, so a pick costs one small cache read plus
+# the O(k) draw instead of rebuilding and hashing the whole roster.
+ROSTER_CACHE_SIZE = int(os.getenv("PICKER_ROSTER_CACHE_SIZE", 256))
+# No-repeat sessions expire after this long without a pick
+SESSION_TTL_SECONDS = int(os.getenv("PICKER_SESSION_TTL", 4 * 3600))
+# No-repeat sessions live in Redis so every gunicorn worker sees the same bag;
+# without PICKER_REDIS_URL, session_id is rejected instead of silently repeating picks
+PICKER_REDIS_URL = os.getenv("PICKER_REDIS_URL")
 
-    try:
-        cursor = connection.cursor()
 
-        # Construct the table name dynamically
-        table_name = f"student_list_c{course_id}"
+class Roster:
+    """A course's usernames plus a content hash, so sessions notice when the roster changed."""
 
-        # Fetch all usernames from the table
-        cursor.execute(f"SELECT username FROM {table_name}")
-        rows = cursor.fetchall()
+    __slots__ = ("names", "version")
 
-        # Extract usernames from the query result
-        usernames = [row[0] for row in rows]
+    def __init__(self, names, version=None):
+        self.names = tuple(names)
+        self.version = version or roster_version(self.names)
 
-        # Randomly select the specified number of usernames
-        if len(usernames) < num_students:
-            print("Not enough students in the table to select from.")
-            return
 
-        selected_usernames = random.sample(usernames, num_students)
+_rosters = OrderedDict()  # course_id -> Roster
+_rosters_lock = threading.Lock()
 
-        return selected_usernames
 
-    
-    finally:
-        release_connection(connection)
+def load_roster(course_id):
+    """The course's Roster, rebuilt only when course_cache reports a new roster version."""
+    version = course_cache.roster_version(course_id)
+    with _rosters_lock:
+        roster = _rosters.get(course_id)
+        if roster is not None and roster.version == version:
+            _rosters.move_to_end(course_id)
+            return roster
+    roster = Roster(student[0] for student in course_cache.students(course_id))
+    with _rosters_lock:
+        _rosters[course_id] = roster
+        _rosters.move_to_end(course_id)
+        while len(_rosters) > ROSTER_CACHE_SIZE:
+            _rosters.popitem(last=False)
+    return roster
 
+
+class RedisSessionStore:
+    """No-repeat sessions as a shuffled bag of remaining names in a Redis list; a pick pops k names."""
+
+    def __init__(self, redis_url, ttl=SESSION_TTL_SECONDS):
+        import redis
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    def draw(self, key, roster, k):
+        bag_key, version_key = f"picker:{key}:bag", f"picker:{key}:version"
+        if self._redis.get(version_key) != roster.version:
+            self._redis.delete(bag_key)
+        picked = self._redis.lpop(bag_key, k) or []
+        if len(picked) < k:
+            refill = _shuffled(roster.names, exclude=picked)
+            pipe = self._redis.pipeline()
+            pipe.delete(bag_key)
+            if refill:
+                pipe.rpush(bag_key, *refill)
+            pipe.execute()
+            picked += self._redis.lpop(bag_key, k - len(picked)) or []
+        pipe = self._redis.pipeline()
+        pipe.set(version_key, roster.version, ex=self.ttl)
+        pipe.expire(bag_key, self.ttl)
+        pipe.execute()
+        return picked
+
+    def reset(self, key):
+        self._redis.delete(f"picker:{key}:bag", f"picker:{key}:version")
+
+
+def _shuffled(names, exclude=()):
+    """A new bag: the roster in random order, minus names just picked in this draw."""
+    exclude = set(exclude)
+    bag = [name for name in names if name not in exclude]
+    random.shuffle(bag)
+    return bag
+
+
+def weighted_sample(names, weights, k):
+    """k distinct names, each drawn with probability proportional to its weight (default 1).
+
+    Efraimidis-Spirakis: keep the k largest random()^(1/w) keys, O(n log k).
+    Names with weight <= 0 are never picked.
+    """
+    keyed = []
+    for name in names:
+        weight = float(weights.get(name, 1))
+        if weight > 0:
+            keyed.append((random.random() ** (1 / weight), name))
+    return [name for _, name in heapq.nlargest(k, keyed)]
+
+
+session_store = RedisSessionStore(PICKER_REDIS_URL) if PICKER_REDIS_URL else None
+
+
+def _session_store():
+    if session_store is None:
+        raise ValueError("No-repeat sessions are not available: PICKER_REDIS_URL is not set.")
+    return session_store
+
+
+def validate_weights(weights):
+    """Check that weights is a {username: number} dict; returns it (None when empty)."""
+    if not weights:
+        return None
+    if not isinstance(weights, dict):
+        raise ValueError("weights must be an object mapping usernames to numbers.")
+    for name, weight in weights.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not math.isfinite(weight):
+            raise ValueError(f"Weight of {name} must be a finite number.")
+    return weights
+
+
+def fetch_random_usernames(course_id, num_students=1, session_id=None, weights=None):
+    """Pick num_students distinct usernames of a course.
+
+    With session_id nobody is picked twice until everyone in the course has
+    been picked once (then a new round starts). weights ({username: weight})
+    biases the pick instead. When the course has fewer students than
+    requested, all of them are returned; an empty course returns [].
+    Raises ValueError for invalid weights, or a session_id without Redis.
+    """
+    num_students = max(1, int(num_students or 1))
+    weights = validate_weights(weights)
+    roster = load_roster(course_id)
+    k = min(num_students, len(roster.names))
+    if k == 0:
+        return []
+
+    if weights:
+        return weighted_sample(roster.names, weights, k)
+    if session_id:
+        return _session_store().draw(f"{course_id}:{session_id}", roster, k)
+    return random.sample(roster.names, k)
+
+
+def reset_session(course_id, session_id):
+    """Start a new no-repeat round for the session."""
+    _session_store().reset(f"{course_id}:{session_id}")
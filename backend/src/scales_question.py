@@ -1,10 +1,23 @@
 from flask import Blueprint, jsonify, request
 from src.db_connection import get_connection, release_connection
+from src.bulk_write import insert_rows, transaction
+from src.id_generator import new_id
+from src.live_events import publish_submission
 import json
-import uuid
 
 scales_question_bp = Blueprint('scales_question', __name__)
 
+def insert_scale_slides(cursor, scale_id, slides):
+    """Insert all slides of a scales question with one multi-row INSERT."""
+    insert_rows(
+        cursor, "scale_detail",
+        ["scale_id", "subid", "text", "scaleoption", "scalemin", "scalemax"],
+        [
+            (scale_id, slide['id'], slide['text'], json.dumps(slide['scaleOptions']), slide['scaleMin'], slide['scaleMax'])
+            for slide in slides
+        ]
+    )
+
 @scales_question_bp.route('/api/scales-questions/<id>', methods=['GET'])
 def get_scales_question(id):
     """Endpoint to retrieve a specific scales question by its ID."""
@@ -74,6 +87,7 @@ def get_scales_question(id):
 @scales_question_bp.route('/api/scales-questions/create', methods=['POST'])
 def create_scales_question():
     """Endpoint to create a new scales question activity."""
+    connection = None
     try:
         data = request.get_json()
         if not data or not all(key in data for key in ['title', 'type', 'activityType', 'thumbnail', 'slides']):
@@ -86,13 +100,13 @@ def create_scales_question():
         slides = data['slides']
 
         # Generate a unique ID for the activity
-        scale_id = f"sq_{str(uuid.uuid4())[:8]}"
+        scale_id = new_id("sq")
 
         connection = get_connection()
         if not connection:
             return jsonify({"success": False, "error": "Database connection failed."}), 500
 
-        with connection.cursor() as cursor:
+        with connection.cursor() as cursor, transaction(connection):
             # Insert into scale_questions table
             from datetime import datetime
             now = datetime.now()
@@ -103,21 +117,7 @@ def create_scales_question():
             cursor.execute(query1, (scale_id, title, q_type, activity_type, thumbnail, now))
 
             # Insert slides into scale_detail table
-            query2 = """
-                INSERT INTO scale_detail (scale_id, subid, text, scaleoption, scalemin, scalemax)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            for slide in slides:
-                cursor.execute(query2, (
-                    scale_id,
-                    slide['id'],
-                    slide['text'],
-                    json.dumps(slide['scaleOptions']),
-                    slide['scaleMin'],
-                    slide['scaleMax']
-                ))
-
-            connection.commit()
+            insert_scale_slides(cursor, scale_id, slides)
 
         # Prepare the response
         response = {
@@ -142,6 +142,7 @@ def create_scales_question():
 @scales_question_bp.route('/api/scales-questions/update/<id>', methods=['PUT'])
 def update_scales_question(id):
     """Endpoint to update an existing scales question activity."""
+    connection = None
     try:
         data = request.get_json()
         if not data or not all(key in data for key in ['title', 'slides']):
@@ -154,7 +155,7 @@ def update_scales_question(id):
         if not connection:
             return jsonify({"success": False, "error": "Database connection failed."}), 500
 
-        with connection.cursor() as cursor:
+        with connection.cursor() as cursor, transaction(connection):
             # Update the title in scale_questions table
             query1 = """
                 UPDATE scale_questions
@@ -171,21 +172,7 @@ def update_scales_question(id):
             cursor.execute(query2, (id,))
 
             # Insert updated slides into scale_detail table
-            query3 = """
-                INSERT INTO scale_detail (scale_id, subid, text, scaleoption, scalemin, scalemax)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            for slide in slides:
-                cursor.execute(query3, (
-                    id,
-                    slide['id'],
-                    slide['text'],
-                    json.dumps(slide['scaleOptions']),
-                    slide['scaleMin'],
-                    slide['scaleMax']
-                ))
-
-            connection.commit()
+            insert_scale_slides(cursor, id, slides)
 
         # Prepare the response
         from datetime import datetime
@@ -304,7 +291,7 @@ def submit_scales_question_response(id):
                 }), 404
 
             # 生成唯一的 response_id
-            response_id = f"{id}_{student_name}_{str(uuid.uuid4())[:8]}"
+            response_id = f"{id}_{student_name}_{new_id()}"
 
             # 转换时间戳为 datetime 对象
             from datetime import datetime
@@ -334,6 +321,8 @@ def submit_scales_question_response(id):
 
             connection.commit()
 
+        publish_submission("scales", id, {"answers": [{"slideId": a['slideId'], "value": a['value']} for a in answers]})
+
         return jsonify({
             "success": True,
             "message": "Response submitted successfully.",
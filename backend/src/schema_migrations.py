@@ -0,0 +1,35 @@
+import sys
+from src.db_connection import get_connection, release_connection
+from src.id_generator import migrate_id_columns
+from src.conversation_store import migrate_chat_history
+from src.studentpoll import migrate_response_columns
+
+# Schema changes that rebuild large tables. They run once per deploy (see the
+# Jenkinsfile), before gunicorn starts; request handlers only check for them.
+MIGRATIONS = [
+    ("widen ID columns", lambda cursor: migrate_id_columns(cursor)),
+    ("chat_history sequence and index", migrate_chat_history),
+    ("poll_answer sequence and response_id", migrate_response_columns),
+]
+
+
+def main():
+    """Apply every schema migration (safe to re-run): python -m src.schema_migrations"""
+    connection = get_connection()
+    if not connection:
+        print("Database connection failed.")
+        sys.exit(1)
+    try:
+        with connection.cursor() as cursor:
+            for name, migrate in MIGRATIONS:
+                changes = migrate(cursor)
+                print(f"{name}: {len(changes)} change(s)" if changes else f"{name}: up to date")
+                for change in changes:
+                    print(f"  {change}")
+        connection.commit()
+    finally:
+        release_connection(connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
-import os
-import random
-import string
 import re
 import json
 from flask import Flask, request, jsonify, url_for
 from src.db_connection import release_connection, get_connection
-from src.generate_qr_code import generate_qr_code
+from src.generate_qr_code import qr_code_url
+from src.bulk_write import insert_rows, transaction
+from src.id_generator import public_id
+from src.live_events import publish_submission
+from src.word_index import word_index, index_answers, share_texts, DEFAULT_TOP_K
 from flask_caching import Cache
 
 app = Flask(__name__)
@@ -18,8 +19,16 @@ app = Flask(__name__)
 #})
 
 def generate_share_id():
-    """Generate a unique share ID."""
-    return ''.join(random.choices(string.ascii_letters + string.digits, k=8))
+    """Generate a unique, time-ordered share ID that cannot be guessed from another one."""
+    return public_id()
+
+def insert_open_question_slides(cursor, share_id, slides):
+    """Insert all slides of an open-ended question with one multi-row INSERT."""
+    insert_rows(
+        cursor, "openend_question",
+        ["share_id", "subid", "text"],
+        [(share_id, slide['id'], slide['text']) for slide in slides]
+    )
 
 @app.route('/share', methods=['POST'])
 def create_share_link():
@@ -61,9 +70,8 @@ def create_share_link():
         # Generate the shareable link
         share_url = url_for('view_shared_content', share_id=share_id, _external=True)
 
-        # Generate a QR code for the link
-        qr_code_path = os.path.join('static', f'{share_id}.png')
-        generate_qr_code(share_url, qr_code_path)
+        # QR code is served (and cached) by /api/qr, rendered off the request path
+        qr_code_path = qr_code_url(share_url)
 
         return jsonify({"share_id": share_id,"share_url": share_url,"qr_code": qr_code_path}), 200
     except Exception as e:
@@ -130,6 +138,7 @@ def insert_shared_content(share_id):
                 query = "INSERT INTO openend_question (share_id, content) VALUES (%s, %s)"
                 cursor.execute(query, (share_id, content))
                 connection.commit()
+                index_answers("share", share_id, [content])
 
         return jsonify({"message": "Content inserted successfully."}), 200
     except Exception as e:
@@ -138,41 +147,38 @@ def insert_shared_content(share_id):
 @app.route('/share/show/<share_id>/answers', methods=['GET'])
 #@cache.cached(timeout=1800)
 def get_shared_answers(share_id):
-    """Endpoint to get all answers for a share_id and provide word frequency data."""
+    """Endpoint to get word frequency data (and optionally all answers) for a share_id.
+
+    Query params: top (terms returned, default 100), bigrams=1 to add two-word
+    phrases, include_answers=1 to also return every answer.
+    """
+    connection = None
     try:
-        # Retrieve all answers for the given share_id
+        top = max(1, min(int(request.args.get('top', DEFAULT_TOP_K)), 1000))
         connection = get_connection()
-        if connection:
-            with connection.cursor() as cursor:
-                query = "SELECT content FROM openend_question WHERE share_id = %s"
-                cursor.execute(query, (share_id,))
-                results = cursor.fetchall()
-
-        if not results:
-            return jsonify({"error": "No answers found for the given share_id."}), 404
-
-        # Define a list of stop words to exclude
-        stop_words = set(["the", "is", "in", "and", "to", "of", "a", "an", "it", "on", "for", "with", "as", "by", "at", "this", "that", "these", "those", "be", "are", "was", "were", "has", "have", "had", "do", "does", "did", "but", "or", "if", "then", "so", "because", "about", "from", "up", "down", "out", "over", "under", "again", "further", "here", "there", "when", "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "than", "too", "very"])
-
-        # Process results for word frequency and individual answers
-        word_frequency = {}
-        answers = [row[0] for row in results]
-
-        for answer in answers:
-            # Count word frequencies, excluding stop words
-            words = re.findall(r'\b\w+\b', answer.lower())
-            for word in words:
-                if word not in stop_words:
-                    word_frequency[word] = word_frequency.get(word, 0) + 1
+        if not connection:
+            return jsonify({"error": "Database connection failed."}), 500
+        with connection.cursor() as cursor:
+            # 词频来自增量索引，首次访问时从数据库初始化
+            load_texts = share_texts(cursor, share_id)
+            word_frequency = word_index.top("share", share_id, load_texts, k=top)
+            # 有答案但全是停用词时返回空词云，而不是 404
+            if not word_frequency and load_texts.count() == 0:
+                return jsonify({"error": "No answers found for the given share_id."}), 404
+
+            response = {"share_id": share_id, "word_frequency": word_frequency}
+            if request.args.get('bigrams') == '1':
+                response["bigram_frequency"] = word_index.top("share", share_id, load_texts, k=top, n=2)
+            if request.args.get('include_answers') == '1':
+                response["answers"] = load_texts()
 
-        return jsonify({
-            "share_id": share_id,
-            "word_frequency": word_frequency,
-            "answers": answers
-        }), 200
+        return jsonify(response), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if connection:
+            release_connection(connection)
 
 @app.route('/share/<share_id>', methods=['DELETE'])
 def delete_shared_content(share_id):
@@ -217,6 +223,7 @@ def delete_shared_content(share_id):
 
         # Clear the cache for the deleted share_id
         #cache.delete(f'/share/show/{share_id}/answers')
+        word_index.invalidate("share", share_id)
 
         return jsonify({"message": f"Content with share_id {share_id} deleted successfully."}), 200
     except Exception as e:
@@ -288,6 +295,7 @@ def get_open_question(share_id):
 @app.route('/api/open-questions/create', methods=['POST'])
 def create_open_question():
     """Endpoint to create a new open-ended question activity."""
+    connection = None
     try:
         data = request.get_json()
         if not data or not all(key in data for key in ['title', 'slides']):
@@ -304,7 +312,7 @@ def create_open_question():
         if not connection:
             return jsonify({"success": False, "error": "Database connection failed."}), 500
 
-        with connection.cursor() as cursor:
+        with connection.cursor() as cursor, transaction(connection):
             # Insert into openend_question_list table
             from datetime import datetime
             #created_at = int(datetime.now().timestamp() * 1000)
@@ -317,13 +325,7 @@ def create_open_question():
             
             cursor.execute(query1, (share_id, title, now))
             # Insert slides into openend_question table
-            query2 = """
-                INSERT INTO openend_question (share_id, subid, text)
-                VALUES (%s, %s, %s)
-            """
-            for slide in slides:
-                cursor.execute(query2, (share_id, slide['id'], slide['text']))
-            connection.commit()
+            insert_open_question_slides(cursor, share_id, slides)
 
         # Prepare the response
         #from datetime import datetime
@@ -350,6 +352,7 @@ def create_open_question():
 @app.route('/api/open-questions/update/<share_id>', methods=['PUT'])
 def update_open_question(share_id):
     """Endpoint to update an existing open-ended question activity."""
+    connection = None
     try:
         data = request.get_json()
         if not data or not all(key in data for key in ['title', 'slides']):
@@ -362,7 +365,7 @@ def update_open_question(share_id):
         if not connection:
             return jsonify({"success": False, "error": "Database connection failed."}), 500
 
-        with connection.cursor() as cursor:
+        with connection.cursor() as cursor, transaction(connection):
             # Update the title in openend_question_list table
             query1 = """
                 UPDATE openend_question_list
@@ -379,14 +382,7 @@ def update_open_question(share_id):
             cursor.execute(query2, (share_id,))
 
             # Insert updated slides into openend_question table
-            query3 = """
-                INSERT INTO openend_question (share_id, subid, text)
-                VALUES (%s, %s, %s)
-            """
-            for slide in slides:
-                cursor.execute(query3, (share_id, slide['id'], slide['text']))
-
-            connection.commit()
+            insert_open_question_slides(cursor, share_id, slides)
 
         # Prepare the response
         from datetime import datetime
@@ -465,6 +461,7 @@ def submit_open_question_response(share_id):
             INSERT INTO openend_question_response (share_id, subid, text)
             VALUES (%s, %s, %s)
             """
+            published = []
             
             for answer_item in answers:
                 if not isinstance(answer_item, dict) or 'slideId' not in answer_item or 'answer' not in answer_item:
@@ -490,9 +487,12 @@ def submit_open_question_response(share_id):
                     insert_query,
                     (share_id, slide_id, answer_str)
                 )
+                published.append({"slideId": slide_id, "answer": answer_str})
 
             connection.commit()
 
+        publish_submission("open_question", share_id, {"answers": published})
+
         return jsonify({
             "success": True,
             "message": "Response submitted successfully.",
@@ -0,0 +1,100 @@
+import json
+import time
+import threading
+from flask import Response, stream_with_context
+
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Event frame carrying a JSON payload."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class StreamMetrics:
+    """Time-to-first-token, duration and outcome counters for streamed replies.
+
+    outcome is "completed" (the final event was handed to the server),
+    "failed" (an error event was sent) or "disconnected".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, ttft_ms, total_ms, outcome):
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                "streams": 0, "completed": 0, "failed": 0, "disconnected": 0,
+                "ttft_ms_total": 0.0, "ttft_samples": 0, "ttft_ms_max": 0.0, "duration_ms_total": 0.0
+            })
+            stats["streams"] += 1
+            stats[outcome] += 1
+            stats["duration_ms_total"] += total_ms
+            if ttft_ms is not None:
+                stats["ttft_ms_total"] += ttft_ms
+                stats["ttft_samples"] += 1
+                stats["ttft_ms_max"] = max(stats["ttft_ms_max"], ttft_ms)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                result[name] = {
+                    "streams": stats["streams"],
+                    "completed": stats["completed"],
+                    "failed": stats["failed"],
+                    "disconnected": stats["disconnected"],
+                    "avg_ttft_ms": round(stats["ttft_ms_total"] / stats["ttft_samples"], 2) if stats["ttft_samples"] else None,
+                    "max_ttft_ms": round(stats["ttft_ms_max"], 2),
+                    "avg_duration_ms": round(stats["duration_ms_total"] / stats["streams"], 2),
+                }
+            return result
+
+
+stream_metrics = StreamMetrics()
+
+
+def stream_reply(name, chunks, on_complete=None, extra=None, started_at=None):
+    """Relay LLM text chunks to the client as SSE and return the Flask response.
+
+    Emits one "token" event per chunk and a final "done" event with the full
+    reply (plus the extra fields). The WSGI server pulls frames one at a time,
+    so a slow client throttles how fast chunks are read from the model; if
+    the client disconnects the generator is closed, which closes the upstream
+    LLM stream. on_complete(reply) runs only when the reply finished.
+
+    started_at is the time.perf_counter() value taken when the view started
+    handling the request; time to first token and duration are measured from
+    it, so they include the work done before streaming (defaults to now).
+    """
+    start = time.perf_counter() if started_at is None else started_at
+
+    def generate():
+        ttft_ms = None
+        parts = []
+        outcome = "disconnected"
+        try:
+            for chunk in chunks:
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                parts.append(chunk)
+                yield sse_event({"delta": chunk}, event="token")
+            reply = "".join(parts)
+            if on_complete:
+                on_complete(reply)
+            yield sse_event({"success": True, "reply": reply, "ttftMs": round(ttft_ms or 0, 2), **(extra or {})}, event="done")
+            # 生成器在最后一帧写出后才会被再次推进，断开的连接不会走到这里
+            outcome = "completed"
+        except Exception as e:
+            yield sse_event({"success": False, "error": str(e)}, event="error")
+            outcome = "failed"
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            stream_metrics.record(name, ttft_ms, (time.perf_counter() - start) * 1000, outcome)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
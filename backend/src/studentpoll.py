@@ -1,9 +1,11 @@
 import os
-import random
-import string
 from flask import Flask, request, jsonify, url_for
 from src.db_connection import release_connection, get_connection
-from src.generate_qr_code import generate_qr_code
+from src.bulk_write import insert_rows, transaction, row_sequence, column_exists, SchemaNotMigrated
+from src.id_generator import public_id, new_id
+from src.live_events import publish_submission
+from src.poll_counters import ensure_counter_table, increment_counters, delete_counters
+from src.word_index import word_index, index_answers, is_text_type
 import json
 from flask_caching import Cache
 import datetime
@@ -19,8 +21,103 @@ CORS(app)
 #    'CACHE_DEFAULT_TIMEOUT': 3600  # Default timeout: 1 hour
 #})
 def generate_poll_id():
-    """Generate a unique poll ID."""
-    return ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+    """Generate a unique, time-ordered poll ID that cannot be guessed from another one."""
+    return public_id()
+
+# poll_answer rows carry the response_id of their submission; rows stored
+# before the column existed are told apart by their AUTO_INCREMENT id.
+# migrate_response_columns adds both; request paths only check for them.
+_response_sequence = None
+
+
+def response_columns(cursor):
+    """Return poll_answer's row id column once response_id is known to exist (SchemaNotMigrated otherwise)."""
+    global _response_sequence
+    if _response_sequence:
+        return _response_sequence
+    sequence = row_sequence(cursor, "poll_answer")
+    if not column_exists(cursor, "poll_answer", "response_id"):
+        raise SchemaNotMigrated("poll_answer.response_id is missing: run python -m src.schema_migrations")
+    _response_sequence = sequence
+    return sequence
+
+
+def migrate_response_columns(cursor):
+    """Add poll_answer's sequence and response_id columns if missing. Returns the changes made."""
+    changes = []
+    sequence, added = add_row_sequence(cursor, "poll_answer")
+    if added:
+        changes.append(f"added poll_answer.{sequence}")
+    if not column_exists(cursor, "poll_answer", "response_id"):
+        cursor.execute("ALTER TABLE poll_answer ADD COLUMN response_id VARCHAR(64) NULL")
+        changes.append("added poll_answer.response_id")
+    return changes
+
+
+def _parse_poll_answer(answer, question_type):
+    """Parse a stored poll answer based on its question type."""
+    if question_type == 'multiple':
+        try:
+            return json.loads(answer) if isinstance(answer, str) else answer
+        except Exception:
+            return [answer]
+    return answer
+
+def group_poll_responses(answer_rows, poll_id, allow_anonymous):
+    """Group poll_answer rows of one poll into one response per respondent.
+
+    answer_rows are (uid, question_id, answer, question_type, created_at,
+    response_id, row_id) tuples ordered by created_at and row id. Answers
+    without a uid are grouped by the response_id of their submission; older
+    rows that have neither are one response each, keyed by their row id.
+    """
+    responses = {}
+    for user_id, question_id, answer, question_type, created_at, response_id, row_id in answer_rows:
+        respondent_key = user_id or response_id or f"row{row_id}"
+        response = responses.get(respondent_key)
+        if response is None:
+            response = responses[respondent_key] = {
+                "id": f"{poll_id}_{respondent_key}",
+                "respondentId": user_id,
+                "respondentName": user_id,  # Use user_id as name if not available
+                "answers": [],
+                "submittedAt": None,
+                "isAnonymous": allow_anonymous
+            }
+        response["answers"].append({
+            "questionId": question_id,
+            "answer": _parse_poll_answer(answer, question_type)
+        })
+        # Rows are ordered by created_at, so the last one is the latest timestamp
+        if created_at:
+            response["submittedAt"] = int(created_at.timestamp() * 1000)
+
+    now_ms = int(datetime.datetime.now().timestamp() * 1000)
+    for response in responses.values():
+        if response["submittedAt"] is None:
+            response["submittedAt"] = now_ms
+    return list(responses.values())
+
+def _poll_status(open_time, close_time):
+    """Determine a poll's status from its open and close times."""
+    now = datetime.datetime.now()
+    if close_time and close_time < now:
+        return "closed"
+    elif open_time and open_time > now:
+        return "draft"
+    return "open"
+
+def insert_poll_questions(cursor, poll_id, questions):
+    """Insert all questions of a poll with one multi-row INSERT."""
+    insert_rows(
+        cursor, "poll_questions",
+        ["poll_id", "question_id", "question_text", "question_type", "is_required", "options"],
+        [
+            (poll_id, question['id'], question['question'], question['type'], question['required'],
+             json.dumps(question['options']) if 'options' in question else None)
+            for question in questions
+        ]
+    )
 
 @app.route('/api/polls/create', methods=['POST'])
 ##@login_required
@@ -41,10 +138,11 @@ def create_student_poll():
     created_at = datetime.datetime.fromtimestamp(data['createdAt'] / 1000)
     poll_id = generate_poll_id()
 
+    connection = None
     try:
         connection = get_connection()
         if connection:
-            with connection.cursor() as cursor:
+            with connection.cursor() as cursor, transaction(connection):
                 # Insert poll details
                 query = """
                 INSERT INTO student_poll (poll_id, title, description, open_time, close_time, allow_anonymous, uid, created_at)
@@ -53,19 +151,7 @@ def create_student_poll():
                 cursor.execute(query, (poll_id, title, description, open_time, close_time, allow_anonymous, created_by, created_at))
 
                 # Insert questions
-                question_query = """
-                INSERT INTO poll_questions (poll_id, question_id, question_text, question_type, is_required, options)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """
-                for question in questions:
-                    question_id = question['id']
-                    question_text = question['question']
-                    question_type = question['type']
-                    is_required = question['required']
-                    options = json.dumps(question['options']) if 'options' in question else None
-                    cursor.execute(question_query, (poll_id, question_id, question_text, question_type, is_required, options))
-
-                connection.commit()
+                insert_poll_questions(cursor, poll_id, questions)
 
         return jsonify({
             "success": True,
@@ -132,75 +218,19 @@ def view_student_poll(poll_id):
                         "required": is_required
                     })
 
-                # Fetch responses for the poll
+                # Fetch every answer of the poll once and group by respondent
+                sequence = response_columns(cursor)
                 cursor.execute(
-                    """
-                    SELECT uid
+                    f"""
+                    SELECT uid, question_id, answer, question_type, created_at, response_id, {sequence}
                     FROM poll_answer
                     WHERE poll_id = %s
+                    ORDER BY created_at, {sequence}
                     """,
                     (poll_id,)
                 )
-                respondents = cursor.fetchall()
-
-                formatted_responses = []
-                for respondent in respondents:
-                    user_id = respondent[0]
-                    
-                    # Fetch all answers for this respondent
-                    cursor.execute(
-                        """
-                        SELECT question_id, answer, question_type, created_at
-                        FROM poll_answer
-                        WHERE poll_id = %s 
-                        ORDER BY created_at
-                        """,
-                        (poll_id)
-                    )
-                    answers_data = cursor.fetchall()
-                    
-                    if answers_data:
-                        formatted_answers = []
-                        submitted_at = None
-                        
-                        for answer_row in answers_data:
-                            question_id, answer, question_type, created_at = answer_row
-                            
-                            # Parse answer based on question type
-                            if question_type == 'multiple':
-                                try:
-                                    parsed_answer = json.loads(answer) if isinstance(answer, str) else answer
-                                except:
-                                    parsed_answer = [answer]
-                            else:
-                                parsed_answer = answer
-                            
-                            formatted_answers.append({
-                                "questionId": question_id,
-                                "answer": parsed_answer
-                            })
-                            
-                            # Use the latest timestamp as submitted_at
-                            if submitted_at is None or (created_at and created_at > submitted_at):
-                                submitted_at = created_at
-                        
-                        formatted_responses.append({
-                            "id": f"{poll_id}_{user_id}",
-                            "respondentId": user_id,
-                            "respondentName": user_id,  # Use user_id as name if not available
-                            "answers": formatted_answers,
-                            "submittedAt": int(submitted_at.timestamp() * 1000) if submitted_at else int(datetime.datetime.now().timestamp() * 1000),
-                            "isAnonymous": allow_anonymous
-                        })
-
-                # Determine status
-                now = datetime.datetime.now()
-                if close_time and close_time < now:
-                    status = "closed"
-                elif open_time and open_time > now:
-                    status = "draft"
-                else:
-                    status = "open"
+                formatted_responses = group_poll_responses(cursor.fetchall(), poll_id, allow_anonymous)
+                status = _poll_status(open_time, close_time)
 
                 # Return complete poll object
                 return jsonify({
@@ -244,7 +274,10 @@ def submit_poll_answers(poll_id):
         connection = get_connection()
         if connection:
             with connection.cursor() as cursor:
-                query = "INSERT INTO poll_answer (poll_id, question_id, answer, question_type) VALUES (%s, %s, %s, %s)"
+                ensure_counter_table(cursor)
+                response_columns(cursor)
+                response_id = new_id("resp")
+                query = "INSERT INTO poll_answer (poll_id, question_id, answer, question_type, response_id) VALUES (%s, %s, %s, %s, %s)"
                 for answer in answers:
                     question_id = answer.get('question_id')
                     user_answer = answer.get('answer')
@@ -253,8 +286,12 @@ def submit_poll_answers(poll_id):
                     if not all([poll_id, question_id, user_answer]):
                         return jsonify({"error": "Each answer must include 'poll_id', 'question_id', and 'answer'."}), 400
 
-                    cursor.execute(query, (poll_id, question_id, user_answer, question_type))
+                    cursor.execute(query, (poll_id, question_id, user_answer, question_type, response_id))
+                # 同一事务内更新选项计数
+                increment_counters(cursor, poll_id, [(a.get('question_id'), a.get('question_type'), a.get('answer')) for a in answers])
                 connection.commit()
+                # 词云索引只加本次的文本答案
+                index_answers("poll", poll_id, [a.get('answer') for a in answers if is_text_type(a.get('question_type'))])
 
         #cache.delete(f"/api/studentpoll/{poll_id}/results")
         #cache.delete(f"/api/studentpoll/{poll_id}/text_results")
@@ -300,6 +337,8 @@ def submit_poll_response(poll_id):
             }), 500
 
         with connection.cursor() as cursor:
+            ensure_counter_table(cursor)
+            response_columns(cursor)
             # 检查 poll 是否存在
             cursor.execute("SELECT poll_id FROM student_poll WHERE poll_id = %s", (poll_id,))
             poll_result = cursor.fetchone()
@@ -310,14 +349,15 @@ def submit_poll_response(poll_id):
                     "message": f"Poll with ID {poll_id} not found."
                 }), 404
 
-            # 生成唯一的 response_id
-            response_id = f"{poll_id}_{respondent_id}_{int(submitted_at.timestamp())}"
+            # 生成唯一的 response_id（同一秒内的多份匿名提交也能区分）
+            response_id = new_id("resp")
 
             # 插入每个答案到数据库
             insert_query = """
-            INSERT INTO poll_answer (poll_id, question_id, answer, question_type, created_at)
-            VALUES (%s, %s, %s, %s, %s)
+            INSERT INTO poll_answer (poll_id, question_id, answer, question_type, created_at, response_id)
+            VALUES (%s, %s, %s, %s, %s, %s)
             """
+            published = []
             
             for answer_item in answers:
                 if not isinstance(answer_item, dict) or 'questionId' not in answer_item or 'answer' not in answer_item:
@@ -373,10 +413,17 @@ def submit_poll_response(poll_id):
                 # 插入答案
                 cursor.execute(
                     insert_query,
-                    (poll_id, question_num, answer_str, question_type, submitted_at)
+                    (poll_id, question_num, answer_str, question_type, submitted_at, response_id)
                 )
+                published.append({"questionId": question_num, "type": question_type, "answer": answer_str})
 
+            # 同一事务内更新选项计数
+            increment_counters(cursor, poll_id, [(a["questionId"], a["type"], a["answer"]) for a in published])
             connection.commit()
+            # 词云索引只加本次的文本答案
+            index_answers("poll", poll_id, [a["answer"] for a in published if is_text_type(a["type"])])
+
+        publish_submission("poll", poll_id, {"answers": published})
 
         return jsonify({
             "success": True,
@@ -441,140 +488,93 @@ def delete_student_poll(poll_id):
 @app.route('/api/polls', methods=['GET'])
 #@login_required
 def get_polls():
-    """Endpoint to retrieve all polls with their details."""
+    """Endpoint to retrieve all polls with their details.
+
+    Polls, questions and answers are loaded with three set-based queries and
+    grouped in memory. Optional query parameters responses_limit and
+    responses_offset paginate the responses returned for each poll;
+    responseCount always reports the poll's total number of respondents.
+    """
     #user_id = request.user_id  # 从装饰器中获取     
+    connection = None
     try:
+        responses_limit = request.args.get('responses_limit', type=int)
+        responses_offset = max(request.args.get('responses_offset', 0, type=int), 0)
+        if responses_limit is not None and responses_limit < 0:
+            responses_limit = None
+
         connection = get_connection()
         if not connection:
             return jsonify({"error": "Database connection failed."}), 500
 
         with connection.cursor() as cursor:
             # Query to fetch all polls
-            query = """
-            SELECT p.poll_id, p.title, p.description, p.open_time, p.close_time, p.allow_anonymous, 
-                   p.uid, p.created_at
-            FROM student_poll p
-            """
-            cursor.execute(query)
+            cursor.execute(
+                """
+                SELECT poll_id, title, description, open_time, close_time, allow_anonymous, uid, created_at
+                FROM student_poll
+                """
+            )
             polls = cursor.fetchall()
 
-            # Format the response
-            result = []
-            for poll in polls:
-                poll_id, title, description, open_time, close_time, allow_anonymous, created_by, created_at = poll
-
-                # Fetch questions for the poll
-                cursor.execute(
-                    """
-                    SELECT question_id, question_text, question_type, is_required, options
-                    FROM poll_questions
-                    WHERE poll_id = %s
-                    """,
-                    (poll_id,)
-                )
-                questions = cursor.fetchall()
-
-                formatted_questions = []
-                for question in questions:
-                    question_id, question_text, question_type, is_required, options = question
-                    formatted_questions.append({
-                        "id": question_id,
-                        "question": question_text,
-                        "type": question_type,
-                        "options": json.loads(options) if options else [],
-                        "required": is_required
-                    })
-
-                # Fetch responses for the poll
-                cursor.execute(
-                    """
-                    SELECT uid, poll_id,question_id, answer,answer_time, question_type, created_at
-                    FROM poll_answer
-                    WHERE poll_id = %s
-                    """,
-                    (poll_id,)
-                )
-                respondents = cursor.fetchall()
-
-                formatted_responses = []
-                for respondent in respondents:
-                    user_id = respondent[0]
-                    poll_id = respondent[1]
-                    question_id = respondent[2]
-                    answer = respondent[3]
-                    question_type = respondent[5]
-                    created_at = respondent[6]
-                    # Fetch all answers for this respondent
-                    cursor.execute(
-                        """
-                        SELECT question_id, answer, question_type, created_at
-                        FROM poll_answer
-                        WHERE poll_id = %s 
-                        ORDER BY created_at
-                        """,
-                        (poll_id)
-                    )
-                    answers_data = cursor.fetchall()
-                    
-                    if answers_data:
-                        formatted_answers = []
-                        submitted_at = None
-                        
-                        for answer_row in answers_data:
-                            question_id, answer, question_type, created_at = answer_row
-                            
-                            # Parse answer based on question type
-                            if question_type == 'multiple':
-                                try:
-                                    parsed_answer = json.loads(answer) if isinstance(answer, str) else answer
-                                except:
-                                    parsed_answer = [answer]
-                            else:
-                                parsed_answer = answer
-                            
-                            formatted_answers.append({
-                                "questionId": question_id,
-                                "answer": parsed_answer
-                            })
-                            
-                            # Use the latest timestamp as submitted_at
-                            if submitted_at is None or (created_at and created_at > submitted_at):
-                                submitted_at = created_at
-                        
-                        formatted_responses.append({
-                            "id": f"{poll_id}_{user_id}",
-                            "respondentId": user_id,
-                            "respondentName": user_id,  # Use user_id as name if not available
-                            "answers": formatted_answers,
-                            "submittedAt": int(submitted_at.timestamp() * 1000) if submitted_at else int(datetime.datetime.now().timestamp() * 1000),
-                            "isAnonymous": allow_anonymous
-                        })
-
-                # Determine status
-                now = datetime.datetime.now()
-                if close_time and close_time < now:
-                    status = "closed"
-                elif open_time and open_time > now:
-                    status = "draft"
-                else:
-                    status = "open"
-
-                result.append({
-                    "id": poll_id,
-                    "title": title,
-                    "description": description,
-                    "status": status,
-                    "createdBy": created_by,
-                    "createdAt": int(created_at.timestamp() * 1000) if created_at else None,
-                    "openTime": int(open_time.timestamp() * 1000) if open_time else None,
-                    "closeTime": int(close_time.timestamp() * 1000) if close_time else None,
-                    "allowAnonymous": allow_anonymous,
-                    "shareLink": f"/api/studentpoll/{poll_id}",
-                    "questions": formatted_questions,
-                    "responses": formatted_responses,
-                    "responseCount": len(formatted_responses)
+            # Fetch the questions of every poll in one query
+            cursor.execute(
+                """
+                SELECT poll_id, question_id, question_text, question_type, is_required, options
+                FROM poll_questions
+                """
+            )
+            questions_by_poll = {}
+            for poll_id, question_id, question_text, question_type, is_required, options in cursor.fetchall():
+                questions_by_poll.setdefault(poll_id, []).append({
+                    "id": question_id,
+                    "question": question_text,
+                    "type": question_type,
+                    "options": json.loads(options) if options else [],
+                    "required": is_required
                 })
 
+            # Fetch the answers of every poll in one query, grouped per poll below
+            sequence = response_columns(cursor)
+            cursor.execute(
+                f"""
+                SELECT poll_id, uid, question_id, answer, question_type, created_at, response_id, {sequence}
+                FROM poll_answer
+                ORDER BY poll_id, created_at, {sequence}
+                """
+            )
+            answers_by_poll = {}
+            for row in cursor.fetchall():
+                answers_by_poll.setdefault(row[0], []).append(row[1:])
+
+        # Format the response
+        result = []
+        for poll in polls:
+            poll_id, title, description, open_time, close_time, allow_anonymous, created_by, created_at = poll
+
+            responses = group_poll_responses(answers_by_poll.get(poll_id, []), poll_id, allow_anonymous)
+            response_count = len(responses)
+            if responses_limit is not None:
+                responses = responses[responses_offset:responses_offset + responses_limit]
+            elif responses_offset:
+                responses = responses[responses_offset:]
+
+            result.append({
+                "id": poll_id,
+                "title": title,
+                "description": description,
+                "status": _poll_status(open_time, close_time),
+                "createdBy": created_by,
+                "createdAt": int(created_at.timestamp() * 1000) if created_at else None,
+                "openTime": int(open_time.timestamp() * 1000) if open_time else None,
+                "closeTime": int(close_time.timestamp() * 1000) if close_time else None,
+                "allowAnonymous": allow_anonymous,
+                "shareLink": f"/api/studentpoll/{poll_id}",
+                "questions": questions_by_poll.get(poll_id, []),
+                "responses": responses,
+                "responseCount": response_count
+            })
+
         return jsonify({"success": True, "polls": result}), 200
 
     except Exception as e:
@@ -601,10 +601,11 @@ def update_student_poll(poll_id):
     created_by = data['createdBy']
     created_at = datetime.datetime.fromtimestamp(data['createdAt'] / 1000)
 
+    connection = None
     try:
         connection = get_connection()
         if connection:
-            with connection.cursor() as cursor:
+            with connection.cursor() as cursor, transaction(connection):
                 # Update poll details
                 update_query = """
                 UPDATE student_poll
@@ -618,19 +619,7 @@ def update_student_poll(poll_id):
                 cursor.execute(delete_questions_query, (poll_id,))
 
                 # Insert updated questions
-                insert_questions_query = """
-                INSERT INTO poll_questions (poll_id, question_id, question_text, question_type, is_required, options)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """
-                for question in questions:
-                    question_id = question['id']
-                    question_text = question['question']
-                    question_type = question['type']
-                    is_required = question['required']
-                    options = json.dumps(question['options']) if 'options' in question else None
-                    cursor.execute(insert_questions_query, (poll_id, question_id, question_text, question_type, is_required, options))
-
-                connection.commit()
+                insert_poll_questions(cursor, poll_id, questions)
 
         return jsonify({
             "success": True,
@@ -668,6 +657,8 @@ def delete_poll(poll_id):
             # Delete from poll_answer
             delete_answers_query = "DELETE FROM poll_answer WHERE poll_id = %s"
             cursor.execute(delete_answers_query, (poll_id,))
+            delete_counters(cursor, poll_id)
+            word_index.invalidate("poll", poll_id)
 
             # Delete from poll_questions
             delete_questions_query = "DELETE FROM poll_questions WHERE poll_id = %s"
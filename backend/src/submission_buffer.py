@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+import pymysql
+from src.db_connection import get_connection, release_connection
+from src.bulk_write import insert_rows, transaction
+
+# Rows that could not be written after max_attempts are appended here (JSON lines)
+DEAD_LETTER_DIR = os.getenv("SUBMISSION_DEAD_LETTER_DIR", "./dead_letter")
+
+
+class _Submission:
+    """Rows of one submit() call; on_written runs once all of them are stored."""
+
+    __slots__ = ("remaining", "on_written", "failed")
+
+    def __init__(self, rows, on_written):
+        self.remaining = rows
+        self.on_written = on_written
+        self.failed = False
+
+
+class _Entry:
+    __slots__ = ("row", "submission", "attempts")
+
+    def __init__(self, row, submission):
+        self.row = row
+        self.submission = submission
+        self.attempts = 0
+
+
+class SubmissionBuffer:
+    """Coalesce rows from many concurrent requests into periodic batch inserts.
+
+    Request handlers call submit() and return immediately; a background thread
+    writes everything queued during the last flush_interval seconds with one
+    multi-row INSERT, so a burst of submissions uses one pooled connection
+    instead of one per request.
+
+    When the database is unreachable the unwritten rows are put back and
+    retried on the next flush (submit() keeps rejecting once max_rows are
+    queued). Any other error is narrowed down by splitting the batch in
+    halves, so one bad row cannot hold back the others; a row that fails on
+    max_attempts flushes is moved to the dead-letter file and dropped.
+    """
+
+    def __init__(self, table, columns, row_template=None, flush_interval=1.0, max_rows=10000, batch_rows=2000,
+                 max_attempts=5, dead_letter_dir=DEAD_LETTER_DIR):
+        self.table = table
+        self.columns = columns
+        self.row_template = row_template
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.max_attempts = max_attempts
+        self.dead_letter_path = os.path.join(dead_letter_dir, f"{table}.jsonl")
+
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self.metrics = {
+            "submissions_accepted": 0,
+            "submissions_rejected": 0,
+            "rows_flushed": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "rows_dead_lettered": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": 0.0,
+            "last_flush_at": None,
+            "last_error": None,
+        }
+
+    def start(self):
+        """Start the flush thread (idempotent)."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"{self.table}-buffer", daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, rows, on_written=None):
+        """Queue the rows of one submission. Returns False when the buffer is full.
+
+        on_written() is called from the flush thread once every row of the
+        submission is stored (never if one of them is dead-lettered).
+        """
+        rows = [tuple(row) for row in rows]
+        submission = _Submission(len(rows), on_written)
+        with self._lock:
+            if len(self._pending) + len(rows) > self.max_rows:
+                self.metrics["submissions_rejected"] += 1
+                return False
+            self._pending.extend(_Entry(row, submission) for row in rows)
+            self.metrics["submissions_accepted"] += 1
+            if len(self._pending) >= self.batch_rows:
+                self._wakeup.set()
+        return True
+
+    def queue_depth(self):
+        """Number of rows waiting to be written."""
+        with self._lock:
+            return len(self._pending)
+
+    def get_metrics(self):
+        """Snapshot of the buffer counters, including the current queue depth."""
+        with self._lock:
+            snapshot = dict(self.metrics)
+            snapshot["queue_depth"] = len(self._pending)
+        snapshot["flush_interval"] = self.flush_interval
+        snapshot["max_rows"] = self.max_rows
+        return snapshot
+
+    def flush(self):
+        """Write every row queued so far (see the class docstring for failures)."""
+        with self._lock:
+            remaining = len(self._pending)  # rows put back by this flush wait for the next one
+        while remaining > 0:
+            with self._lock:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_rows, remaining, len(self._pending)))]
+            if not batch:
+                return
+            remaining -= len(batch)
+
+            start = time.perf_counter()
+            written, available = self._write(batch)
+            with self._lock:
+                self.metrics["flushes"] += 1
+                self.metrics["rows_flushed"] += written
+                self.metrics["last_flush_rows"] = written
+                self.metrics["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                self.metrics["last_flush_at"] = int(time.time() * 1000)
+            if not available:
+                return
+
+    def _insert(self, entries):
+        connection = get_connection()
+        if not connection:
+            raise ConnectionError("Database connection failed.")
+        try:
+            with connection.cursor() as cursor, transaction(connection):
+                insert_rows(cursor, self.table, self.columns, [entry.row for entry in entries], row_template=self.row_template)
+        finally:
+            release_connection(connection)
+
+    def _write(self, batch):
+        """Insert a batch, bisecting on row errors. Returns (rows stored, database available)."""
+        parts = [batch]
+        written = 0
+        while parts:
+            part = parts.pop()
+            try:
+                self._insert(part)
+            except (ConnectionError, pymysql.err.OperationalError) as e:
+                # 数据库不可用：未写入的行放回队首，下次再试（不计入重试次数）
+                self._record_failure(e)
+                unwritten = part + [entry for rest in reversed(parts) for entry in rest]
+                with self._lock:
+                    self._pending.extendleft(reversed(unwritten))
+                return written, False
+            except Exception as e:
+                self._record_failure(e)
+                if len(part) > 1:
+                    middle = len(part) // 2
+                    parts += [part[middle:], part[:middle]]
+                else:
+                    retry = self._count_attempt(part)
+                    with self._lock:
+                        self._pending.extend(retry)
+                continue
+            for entry in part:
+                self._row_done(entry, stored=True)
+            written += len(part)
+        return written, True
+
+    def _count_attempt(self, entries):
+        """Count a failed attempt; dead-letter entries past max_attempts and return the rest."""
+        retry = []
+        for entry in entries:
+            entry.attempts += 1
+            if entry.attempts < self.max_attempts:
+                retry.append(entry)
+            else:
+                self._dead_letter(entry)
+        return retry
+
+    def _dead_letter(self, entry):
+        with self._lock:
+            self.metrics["rows_dead_lettered"] += 1
+            error = self.metrics["last_error"]
+        print(f"Dropping {self.table} row after {entry.attempts} failed attempts: {entry.row}")
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"columns": self.columns, "row": entry.row, "error": error, "at": int(time.time() * 1000)},
+                                   ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            print(f"Error writing {self.dead_letter_path}: {e}")
+        self._row_done(entry, stored=False)
+
+    def _row_done(self, entry, stored):
+        submission = entry.submission
+        with self._lock:
+            submission.remaining -= 1
+            submission.failed = submission.failed or not stored
+            ready = submission.remaining == 0 and not submission.failed and submission.on_written
+        if ready:
+            try:
+                submission.on_written()
+            except Exception as e:
+                print(f"Error in {self.table} buffer callback: {e}")
+
+    def _record_failure(self, error):
+        with self._lock:
+            self.metrics["flush_failures"] += 1
+            self.metrics["last_error"] = str(error)
+        print(f"Error flushing {self.table} buffer: {error}")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+# Row layout of the answers table written by submit_responses
+ANSWER_COLUMNS = ["quiz_id", "question_id", "student_name", "answer_content", "submitted_at", "question_type"]
+ANSWER_ROW_TEMPLATE = "(%s, %s, %s, %s, FROM_UNIXTIME(%s), %s)"
+
+# Buffered ingestion for /api/classroom_quiz/<id>/responses, off unless
+# SUBMISSION_BUFFER_ENABLED=1. Each gunicorn worker keeps its own buffer.
+answer_buffer = None
+if os.getenv("SUBMISSION_BUFFER_ENABLED", "0") == "1":
+    answer_buffer = SubmissionBuffer(
+        table="answers",
+        columns=ANSWER_COLUMNS,
+        row_template=ANSWER_ROW_TEMPLATE,
+        flush_interval=float(os.getenv("SUBMISSION_FLUSH_INTERVAL", 1.0)),
+        max_rows=int(os.getenv("SUBMISSION_BUFFER_MAX_ROWS", 10000)),
+        max_attempts=int(os.getenv("SUBMISSION_MAX_ATTEMPTS", 5)),
+    )
+    answer_buffer.start()
@@ -0,0 +1,113 @@
+import io
+import os
+import csv
+import pandas as pd
+
+# Uploads are parsed straight from the request stream: .xlsx with openpyxl in
+# read-only mode (rows are read lazily), .csv line by line. Nothing is saved
+# under ./uploads, so concurrent uploads of the same filename cannot collide.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+UPLOAD_MAX_ROWS = int(os.getenv("UPLOAD_MAX_ROWS", 50000))
+DEFAULT_CHUNK_ROWS = 5000
+SUPPORTED_EXTENSIONS = {'xlsx', 'csv'}
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeds UPLOAD_MAX_BYTES or UPLOAD_MAX_ROWS."""
+
+
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+
+
+def _stream_size(stream):
+    position = stream.tell()
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def _xlsx_rows(stream):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        for row in csv.reader(text):
+            yield [value if value != '' else None for value in row]
+    finally:
+        text.detach()  # leave the upload stream open for its owner
+
+
+def iter_rows(file, max_rows=UPLOAD_MAX_ROWS, max_bytes=UPLOAD_MAX_BYTES):
+    """Return (header, rows): the column names and a lazy iterator of (position, row tuple).
+
+    position is the row's 0-based place below the header, so position + 2 is
+    its spreadsheet row number. Blank rows are skipped. Raises ValueError for an unsupported file type
+    and UploadTooLarge past max_bytes (checked up front) or max_rows
+    (checked while reading).
+    """
+    extension = file_extension(file.filename)
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError("Invalid file type. Only .xlsx and .csv files are allowed.")
+    stream = file.stream
+    if _stream_size(stream) > max_bytes:
+        raise UploadTooLarge(f"File is larger than {max_bytes // (1024 * 1024)} MB.")
+    stream.seek(0)
+
+    rows = _xlsx_rows(stream) if extension == 'xlsx' else _csv_rows(stream)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("The uploaded file is empty.")
+    header = [str(name).strip() if name is not None else '' for name in header]
+
+    def data_rows():
+        count = 0
+        for position, row in enumerate(rows):
+            if all(value is None for value in row):
+                continue
+            count += 1
+            if count > max_rows:
+                raise UploadTooLarge(f"File has more than {max_rows} rows.")
+            yield position, tuple(row[:len(header)]) + (None,) * (len(header) - len(row))
+
+    return header, data_rows()
+
+
+def iter_frames(file, chunk_rows=DEFAULT_CHUNK_ROWS, **limits):
+    """Yield the upload as DataFrames of up to chunk_rows rows, indexed by row position (see iter_rows)."""
+    header, rows = iter_rows(file, **limits)
+    positions, chunk = [], []
+    emitted = False
+    for position, row in rows:
+        positions.append(position)
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield pd.DataFrame(chunk, columns=header, index=positions)
+            emitted = True
+            positions, chunk = [], []
+    if chunk or not emitted:
+        yield pd.DataFrame(chunk, columns=header, index=pd.Index(positions, dtype='int64'))
+
+
+def read_numeric_columns(file, select, **limits):
+    """DataFrame of only the columns whose name passes select(name), as numbers (NaN if not numeric).
+
+    Only the selected columns are collected, so wide sheets are not held in memory.
+    """
+    header, rows = iter_rows(file, **limits)
+    positions = [i for i, name in enumerate(header) if select(name)]
+    values = {header[i]: [] for i in positions}
+    for _, row in rows:
+        for i in positions:
+            values[header[i]].append(row[i])
+    return pd.DataFrame({name: pd.to_numeric(pd.Series(column, dtype=object), errors='coerce') for name, column in values.items()})
@@ -0,0 +1,317 @@
+import os
+import re
+import bisect
+import threading
+from collections import OrderedDict
+
+# Term counts live in Redis sorted sets when WORD_INDEX_REDIS_URL is set
+# (shared by every gunicorn worker), otherwise in this process. Either way
+# each scope records how many answers it has counted; a read compares that
+# with the stored answer count and re-seeds on a mismatch, which covers
+# answers counted by another worker and seed/add races.
+WORD_INDEX_REDIS_URL = os.getenv("WORD_INDEX_REDIS_URL")
+# Idle scopes expire from Redis after this many seconds
+WORD_INDEX_TTL = int(os.getenv("WORD_INDEX_TTL", 7 * 24 * 3600))
+# Scopes kept per process by the in-memory store (least recently used are evicted)
+WORD_INDEX_MAX_SCOPES = int(os.getenv("WORD_INDEX_MAX_SCOPES", 512))
+DEFAULT_TOP_K = int(os.getenv("WORD_CLOUD_TOP_K", 100))
+
+DEFAULT_STOPWORDS = {
+    # English
+    "the", "is", "in", "and", "to", "of", "a", "an", "it", "on", "for", "with", "as", "by", "at", "this", "that",
+    "these", "those", "be", "are", "was", "were", "has", "have", "had", "do", "does", "did", "but", "or", "if",
+    "then", "so", "because", "about", "from", "up", "down", "out", "over", "under", "again", "further", "here",
+    "there", "when", "where", "why", "how", "all", "any", "both", "each", "few", "more", "most", "other", "some",
+    "such", "no", "nor", "not", "only", "own", "same", "than", "too", "very",
+    # 中文
+    "的", "了", "是", "在", "我", "有", "和", "就", "不", "人", "都", "一", "一个", "也", "很", "到", "说", "要",
+    "去", "你", "会", "着", "没有", "看", "好", "自己", "这", "那", "他", "她", "它", "们", "吗", "呢", "吧", "啊",
+}
+
+
+def load_stopwords():
+    """DEFAULT_STOPWORDS plus WORD_CLOUD_STOPWORDS (comma separated) and WORD_CLOUD_STOPWORDS_FILE (one per line)."""
+    words = set(DEFAULT_STOPWORDS)
+    words.update(w.strip().lower() for w in os.getenv("WORD_CLOUD_STOPWORDS", "").split(",") if w.strip())
+    path = os.getenv("WORD_CLOUD_STOPWORDS_FILE")
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            words.update(line.strip().lower() for line in f if line.strip())
+    return words
+
+
+STOPWORDS = load_stopwords()
+
+# CJK runs are segmented separately; everything else splits on non-word characters
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+TOKEN_PATTERN = re.compile(f"([{_CJK}]+)|([^\\W_{_CJK}]+)")
+
+try:
+    import jieba  # optional: proper Chinese word segmentation
+except ImportError:
+    jieba = None
+
+
+def _cjk_terms(run, stopwords):
+    """Split a run of CJK characters into terms: jieba words if installed, else overlapping character bigrams."""
+    if jieba is not None:
+        return [word for word in jieba.lcut(run) if word.strip()]
+    # 单字停用词（的、了、是…）作为分隔，避免产生 "习的" 这类二元组
+    segments, current = [], ""
+    for char in run:
+        if char in stopwords:
+            segments.append(current)
+            current = ""
+        else:
+            current += char
+    segments.append(current)
+    terms = []
+    for segment in segments:
+        if len(segment) == 1:
+            terms.append(segment)
+        else:
+            terms.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return terms
+
+
+def tokenize(text, stopwords=STOPWORDS):
+    """Lower-cased terms of one answer with stopwords removed, in order of appearance."""
+    terms = []
+    for cjk, word in TOKEN_PATTERN.findall((text or "").lower()):
+        for term in (_cjk_terms(cjk, stopwords) if cjk else [word]):
+            if term not in stopwords:
+                terms.append(term)
+    return terms
+
+
+def bigrams(terms):
+    """Adjacent term pairs of one answer, e.g. ["machine", "learning"] -> ["machine learning"]."""
+    return [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+
+
+class MemoryTermStore:
+    """Term counts per scope, bucketed by count so top-K walks only the K largest terms."""
+
+    def __init__(self, max_scopes=WORD_INDEX_MAX_SCOPES):
+        self.max_scopes = max_scopes
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def answer_count(self, scope):
+        """Answers counted in the scope, or None if it is not seeded."""
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None:
+                return None
+            self._scopes.move_to_end(scope)
+            return index["answers"]
+
+    def load(self, scope, counts, answers):
+        with self._lock:
+            index = self._scopes[scope] = {"counts": {}, "buckets": {}, "levels": [], "answers": answers}
+            self._scopes.move_to_end(scope)
+            for term, count in counts.items():
+                self._move(index, term, 0, count)
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+
+    @staticmethod
+    def _move(index, term, old, new):
+        buckets, levels = index["buckets"], index["levels"]
+        if old:
+            bucket = buckets[old]
+            bucket.discard(term)
+            if not bucket:
+                del buckets[old]
+                del levels[bisect.bisect_left(levels, old)]
+        if new:
+            if new not in buckets:
+                buckets[new] = set()
+                bisect.insort(levels, new)
+            buckets[new].add(term)
+            index["counts"][term] = new
+        else:
+            index["counts"].pop(term, None)
+
+    def add(self, scope, terms, answers):
+        """Add terms of `answers` new answers to a seeded scope (an evicted scope is left to re-seed)."""
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None:
+                return
+            index["answers"] += answers
+            for term in terms:
+                old = index["counts"].get(term, 0)
+                self._move(index, term, old, old + 1)
+
+    def top(self, scope, k):
+        with self._lock:
+            index = self._scopes.get(scope)
+            if not index:
+                return []
+            result = []
+            for count in reversed(index["levels"]):
+                for term in sorted(index["buckets"][count]):
+                    result.append((term, count))
+                    if len(result) >= k:
+                        return result
+            return result
+
+    def reset(self, scope):
+        with self._lock:
+            self._scopes.pop(scope, None)
+
+
+class RedisTermStore:
+    """The same counts as Redis sorted sets: ZINCRBY per term, ZREVRANGE for top-K."""
+
+    def __init__(self, redis_url, ttl=WORD_INDEX_TTL):
+        import redis
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    @staticmethod
+    def _keys(scope):
+        return f"word_index:{scope}", f"word_index:{scope}:answers"
+
+    def answer_count(self, scope):
+        value = self._redis.get(self._keys(scope)[1])
+        return int(value) if value is not None else None
+
+    def load(self, scope, counts, answers):
+        key, answers_key = self._keys(scope)
+        pipe = self._redis.pipeline()
+        pipe.delete(key)
+        if counts:
+            pipe.zadd(key, counts)
+            pipe.expire(key, self.ttl)
+        pipe.set(answers_key, answers, ex=self.ttl)
+        pipe.execute()
+
+    def add(self, scope, terms, answers):
+        key, answers_key = self._keys(scope)
+        pipe = self._redis.pipeline()
+        for term in terms:
+            pipe.zincrby(key, 1, term)
+        pipe.incrby(answers_key, answers)
+        pipe.expire(key, self.ttl)
+        pipe.expire(answers_key, self.ttl)
+        pipe.execute()
+
+    def top(self, scope, k):
+        rows = self._redis.zrevrange(self._keys(scope)[0], 0, k - 1, withscores=True)
+        return [(term, int(count)) for term, count in rows]
+
+    def reset(self, scope):
+        self._redis.delete(*self._keys(scope))
+
+
+class WordIndex:
+    """Incremental word-cloud counts (unigrams and bigrams) per poll / open question.
+
+    A scope is seeded from MySQL the first time it is read, after which each
+    submitted answer only adds its own terms, so a word-cloud refresh costs
+    O(K) plus one COUNT query rather than re-tokenising every answer. When
+    the count of stored answers differs from the answers the scope has
+    counted, the scope is re-seeded.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._seed_lock = threading.Lock()
+
+    @staticmethod
+    def _scope(kind, activity_id, n):
+        return f"{kind}:{activity_id}:{n}"
+
+    def _seed(self, kind, activity_id, source):
+        unigram_counts, bigram_counts = {}, {}
+        texts = source()
+        for text in texts:
+            terms = tokenize(text)
+            for term in terms:
+                unigram_counts[term] = unigram_counts.get(term, 0) + 1
+            for pair in bigrams(terms):
+                bigram_counts[pair] = bigram_counts.get(pair, 0) + 1
+        self.store.load(self._scope(kind, activity_id, 2), bigram_counts, len(texts))
+        self.store.load(self._scope(kind, activity_id, 1), unigram_counts, len(texts))
+
+    def _ensure(self, kind, activity_id, source):
+        """Re-seed the scope unless both n-gram indexes counted exactly the stored answers."""
+        expected = source.count()
+        for _ in range(2):
+            if all(self.store.answer_count(self._scope(kind, activity_id, n)) == expected for n in (1, 2)):
+                return
+            with self._seed_lock:
+                if all(self.store.answer_count(self._scope(kind, activity_id, n)) == expected for n in (1, 2)):
+                    return
+                self._seed(kind, activity_id, source)
+            # An answer committed during the seed may have been added twice; check once more
+            expected = source.count()
+
+    def add_answers(self, kind, activity_id, texts):
+        """Count newly stored (non-empty) answers; scopes not seeded yet are left to the next read."""
+        unigram_terms, bigram_terms = [], []
+        for text in texts:
+            terms = tokenize(text)
+            unigram_terms.extend(terms)
+            bigram_terms.extend(bigrams(terms))
+        self.store.add(self._scope(kind, activity_id, 1), unigram_terms, len(texts))
+        self.store.add(self._scope(kind, activity_id, 2), bigram_terms, len(texts))
+
+    def top(self, kind, activity_id, source, k=DEFAULT_TOP_K, n=1):
+        """The k most frequent terms (n=1) or bigrams (n=2) as {term: count}."""
+        self._ensure(kind, activity_id, source)
+        return dict(self.store.top(self._scope(kind, activity_id, n), k))
+
+    def invalidate(self, kind, activity_id):
+        self.store.reset(self._scope(kind, activity_id, 1))
+        self.store.reset(self._scope(kind, activity_id, 2))
+
+
+word_index = WordIndex(RedisTermStore(WORD_INDEX_REDIS_URL) if WORD_INDEX_REDIS_URL else MemoryTermStore())
+
+
+def is_text_type(question_type):
+    """Whether poll answers of this type feed the word cloud."""
+    return (question_type or "").strip().lower() == "text"
+
+
+class TextSource:
+    """The stored non-empty answers of one activity: call it for the texts, count() for how many."""
+
+    def __init__(self, cursor, column, table, where, params):
+        self.cursor = cursor
+        self.column = column
+        self.clause = f"FROM {table} WHERE {where} AND {column} <> ''"
+        self.params = params
+
+    def __call__(self):
+        self.cursor.execute(f"SELECT {self.column} {self.clause}", self.params)
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def count(self):
+        self.cursor.execute(f"SELECT COUNT(*) {self.clause}", self.params)
+        return self.cursor.fetchone()[0]
+
+
+def poll_texts(cursor, poll_id):
+    """Source of a poll's stored text answers."""
+    return TextSource(cursor, "answer", "poll_answer", "poll_id = %s AND question_type = 'Text'", (poll_id,))
+
+
+def share_texts(cursor, share_id):
+    """Source of an open-ended share's stored answers."""
+    return TextSource(cursor, "content", "openend_question", "share_id = %s", (share_id,))
+
+
+def index_answers(kind, activity_id, texts):
+    """Add committed answers to the word index; never raises (the cloud reseeds on the next read)."""
+    texts = [text for text in texts if text]
+    if not texts:
+        return
+    try:
+        word_index.add_answers(kind, activity_id, texts)
+    except Exception as e:
+        print(f"Word index: update of {kind}:{activity_id} failed ({e})")
+        word_index.invalidate(kind, activity_id)
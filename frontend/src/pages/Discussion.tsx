@@ -54,6 +54,7 @@ interface DiscussionPost {
   likes: number;
   likedBy: string[];
   replies: DiscussionReply[];
+  replyCount: number;
 }
 
 interface DiscussionState {
@@ -61,6 +62,10 @@ interface DiscussionState {
   questions: DiscussionPost[];
 }
 
+// Feed page size and replies previewed per post; the rest load when a post is opened
+const PAGE_SIZE = 20;
+const REPLY_PREVIEW = 3;
+
 const Discussion = () => {
 
   const [activeTab, setActiveTab] = useState<"public" | "question">("public");
@@ -74,6 +79,11 @@ const Discussion = () => {
   const [replyContent, setReplyContent] = useState("");
   const [expandedPosts, setExpandedPosts] = useState<Set<string>>(new Set());
   const [expandedReplies, setExpandedReplies] = useState<Set<string>>(new Set());
+  // Each tab pages its own feed (?type=), so one tab never waits on the other's posts
+  const [nextCursors, setNextCursors] = useState<Record<"public" | "question", string | null>>({
+    public: null,
+    question: null,
+  });
   
   // TODO: Backend integration - replace these with actual user data from authentication
   // Backend API should be: GET /api/auth/current-user - get current logged-in user info
@@ -82,84 +92,135 @@ const Discussion = () => {
   const [currentUserName] = useState("John");
   const [currentUserRole] = useState<UserRole>("teacher"); // Default to teacher as per requirement
 
-  // Load discussions from backend API
+  // Helper function to normalize timestamp
+  const normalizeTimestamp = (timestamp: any): number => {
+    if (typeof timestamp === "number") {
+      // If already a number, check if it's in seconds (< 10 billion) or milliseconds
+      return timestamp < 10000000000 ? timestamp * 1000 : timestamp;
+    }
+    if (typeof timestamp === "string") {
+      // Parse ISO 8601 string or other date formats
+      const parsed = new Date(timestamp).getTime();
+      return isNaN(parsed) ? Date.now() : parsed;
+    }
+    // Fallback to current time
+    return Date.now();
+  };
+
+  // Helper functions to normalize post and reply data from backend
+  const normalizeReply = (reply: any): DiscussionReply => ({
+    id: reply.id,
+    authorName: reply.authorName,
+    authorId: reply.authorId,
+    userRole: reply.userRole || "student",
+    isAnonymous: reply.isAnonymous || false,
+    content: reply.content,
+    createdAt: normalizeTimestamp(reply.createdAt),
+    likes: reply.likes || 0,
+    likedBy: reply.likedBy || [],
+  });
+
+  const normalizePost = (post: any): DiscussionPost => ({
+    id: post.id,
+    authorName: post.authorName,
+    authorId: post.authorId,
+    userRole: post.userRole || "student",
+    isAnonymous: post.isAnonymous || false,
+    type: post.type,
+    title: post.title,
+    content: post.content,
+    createdAt: normalizeTimestamp(post.createdAt),
+    likes: post.likes || 0,
+    likedBy: post.likedBy || [],
+    replies: (post.replies || []).map(normalizeReply),
+    replyCount: post.replyCount ?? (post.replies || []).length,
+  });
+
+  // Load one page of a tab's feed (newest first); a cursor appends the next page
+  const loadDiscussions = async (type: "public" | "question", cursor?: string) => {
+    try {
+      // userId lets the backend mark what the current user liked (likedBy)
+      const params = new URLSearchParams({
+        type,
+        limit: String(PAGE_SIZE),
+        include_replies: String(REPLY_PREVIEW),
+        userId: currentUserId,
+      });
+      if (cursor) {
+        params.set("cursor", cursor);
+      }
+      const response = await fetch(`${API_BASE_URL}/discussions?${params}`, {
+        method: "GET",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${token}`,
+        },
+      });
+
+      if (!response.ok) {
+        throw new Error(`API Error: ${response.statusText}`);
+      }
+
+      const data = await response.json();
+
+      if (data.success) {
+        const posts: DiscussionPost[] = (data.posts || []).map(normalizePost);
+        const key: keyof DiscussionState = type === "public" ? "publicDiscussions" : "questions";
+
+        setDiscussions((prev) => ({
+          ...prev,
+          [key]: cursor ? [...prev[key], ...posts] : posts,
+        }));
+        setNextCursors((prev) => ({ ...prev, [type]: data.nextCursor || null }));
+      }
+    } catch (error) {
+      console.error("Error loading discussions:", error);
+      // 如果后端请求失败，保持空列表
+    }
+  };
+
   useEffect(() => {
-    const loadDiscussions = async () => {
-      try {
-        const response = await fetch(`${API_BASE_URL}/discussions`, {
+    loadDiscussions("public");
+    loadDiscussions("question");
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [currentUserId]);
+
+  // Open a post's reply dialog, loading the replies not included in the feed preview
+  const openPost = async (post: DiscussionPost) => {
+    setSelectedPost(post);
+    if (post.replies.length >= post.replyCount) {
+      return;
+    }
+    try {
+      const replies: DiscussionReply[] = [];
+      let cursor: string | null = null;
+      do {
+        const params = new URLSearchParams({ limit: "200", userId: currentUserId });
+        if (cursor) {
+          params.set("cursor", cursor);
+        }
+        const response = await fetch(`${API_BASE_URL}/discussions/${post.id}/replies?${params}`, {
           method: "GET",
           headers: {
             "Content-Type": "application/json",
             Authorization: `Bearer ${token}`,
           },
         });
-
         if (!response.ok) {
           throw new Error(`API Error: ${response.statusText}`);
         }
-
         const data = await response.json();
-        
-        if (data.success) {
-          // Helper function to normalize timestamp
-          const normalizeTimestamp = (timestamp: any): number => {
-            if (typeof timestamp === "number") {
-              // If already a number, check if it's in seconds (< 10 billion) or milliseconds
-              return timestamp < 10000000000 ? timestamp * 1000 : timestamp;
-            }
-            if (typeof timestamp === "string") {
-              // Parse ISO 8601 string or other date formats
-              const parsed = new Date(timestamp).getTime();
-              return isNaN(parsed) ? Date.now() : parsed;
-            }
-            // Fallback to current time
-            return Date.now();
-          };
-
-          // Helper function to normalize post data from backend
-          const normalizePost = (post: any): DiscussionPost => ({
-            id: post.id,
-            authorName: post.authorName,
-            authorId: post.authorId,
-            userRole: post.userRole || "student",
-            isAnonymous: post.isAnonymous || false,
-            type: post.type,
-            title: post.title,
-            content: post.content,
-            createdAt: normalizeTimestamp(post.createdAt),
-            likes: post.likes || 0,
-            likedBy: post.likedBy || [],
-            replies: (post.replies || []).map((reply: any) => ({
-              id: reply.id,
-              authorName: reply.authorName,
-              authorId: reply.authorId,
-              userRole: reply.userRole || "student",
-              isAnonymous: reply.isAnonymous || false,
-              content: reply.content,
-              createdAt: normalizeTimestamp(reply.createdAt),
-              likes: reply.likes || 0,
-              likedBy: reply.likedBy || [],
-            })),
-          });
-
-          // Separate posts by type correctly
-          const allPosts = [...(data.publicDiscussions || []), ...(data.questions || [])];
-          const publicPosts = allPosts.filter((post: any) => post.type === "public").map(normalizePost);
-          const questionPosts = allPosts.filter((post: any) => post.type === "question").map(normalizePost);
-
-          setDiscussions({
-            publicDiscussions: publicPosts,
-            questions: questionPosts,
-          });
-        }
-      } catch (error) {
-        console.error("Error loading discussions:", error);
-        // 如果后端请求失败，保持空列表
-      }
-    };
+        replies.push(...(data.replies || []).map(normalizeReply));
+        cursor = data.nextCursor || null;
+      } while (cursor);
 
-    loadDiscussions();
-  }, []);
+      setSelectedPost((current) =>
+        current && current.id === post.id ? { ...current, replies, replyCount: replies.length } : current
+      );
+    } catch (error) {
+      console.error("Error loading replies:", error);
+    }
+  };
 
   // No longer need to sync to localStorage - data is managed by backend
 
@@ -226,6 +287,7 @@ const Discussion = () => {
           likes: data.post.likes || 0,
           likedBy: data.post.likedBy || [],
           replies: data.post.replies || [],
+          replyCount: 0,
         };
 
         setDiscussions((prev) => {
@@ -236,7 +298,7 @@ const Discussion = () => {
           const key = typeMap[activeTab] as keyof DiscussionState;
           return {
             ...prev,
-            [key]: [...prev[key], newDiscussionPost],
+            [key]: [newDiscussionPost, ...prev[key]],
           };
         });
 
@@ -352,6 +414,7 @@ const Discussion = () => {
               return {
                 ...post,
                 replies: [...post.replies, newReply],
+                replyCount: post.replyCount + 1,
               };
             }
             return post;
@@ -364,6 +427,7 @@ const Discussion = () => {
           setSelectedPost({
             ...selectedPost,
             replies: [...selectedPost.replies, newReply],
+            replyCount: selectedPost.replyCount + 1,
           });
         }
       } else {
@@ -613,11 +677,11 @@ const Discussion = () => {
                 <Button
                   variant="ghost"
                   size="sm"
-                  onClick={() => setSelectedPost(post)}
+                  onClick={() => openPost(post)}
                   className="flex items-center gap-2"
                 >
                   <Reply className="h-4 w-4" />
-                  Reply ({post.replies.length})
+                  Reply ({post.replyCount})
                 </Button>
               </div>
 
@@ -683,6 +747,13 @@ const Discussion = () => {
             <p className="text-muted-foreground">No discussions yet. Be the first to post one!</p>
           </Card>
         )}
+        {nextCursors[activeTab] && (
+          <div className="flex justify-center">
+            <Button variant="outline" onClick={() => loadDiscussions(activeTab, nextCursors[activeTab] ?? undefined)}>
+              Load more
+            </Button>
+          </div>
+        )}
       </div>
 
       {/* Post new discussion dialog */}
@@ -774,7 +845,7 @@ const Discussion = () => {
             {/* Existing replies */}
             {selectedPost.replies.length > 0 && (
               <div className="space-y-3 max-h-64 overflow-y-auto mb-4">
-                <h4 className="font-semibold text-sm">Replies ({selectedPost.replies.length})</h4>
+                <h4 className="font-semibold text-sm">Replies ({selectedPost.replyCount})</h4>
                 {selectedPost.replies.map((reply) => (
                   <div key={reply.id} className="bg-gray-50 p-3 rounded text-sm">
                     <div className="flex items-center justify-between mb-2">